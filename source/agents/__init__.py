@@ -1,4 +1,11 @@
-from .agent_factory import FRA, SCA, SPA, MDA, LDA
+from .agent_factory import FRA, SCA, SPA, MDA, LDA, SMA, open_llm_clients, close_llm_clients
+from .clients import llm_clients
+from .limiter import llm_limits, LLMOverloaded, INTERACTIVE, BATCH
+from .router import llm_router, Endpoint, CircuitOpen
+from .retry import RetryPolicy, default_retry_policy, LLMDeadlineExceeded
+from .response_cache import response_cache
 
 
-__all__ = ["FRA", "SCA", "SPA", "MDA", "LDA"]
\ No newline at end of file
+__all__ = ["FRA", "SCA", "SPA", "MDA", "LDA", "SMA", "open_llm_clients", "close_llm_clients", "llm_clients",
+           "llm_limits", "LLMOverloaded", "INTERACTIVE", "BATCH", "llm_router", "Endpoint", "CircuitOpen",
+           "RetryPolicy", "default_retry_policy", "LLMDeadlineExceeded", "response_cache"]
\ No newline at end of file
@@ -1,13 +1,38 @@
 from .sealion_convs import SealionConvs
+from .context_window import ConversationWindow
+from .clients import llm_clients
+from .limiter import INTERACTIVE
+from .response_cache import OFF, EXACT
 from prompts import (
     FINAL_REPORT_PROMPT,
     PARSER_INTAKE_PROMPT,
     DOCTOR_SYSTEM_PROMPT,
     TANDLANG_DETECTOR_PROMPT,
+    HISTORY_SUMMARY_PROMPT,
     INTAKE_PROMPT as SYSTEM_PROMPT_LLM_CONVS
 )
 from config import settings
 
+SMA = SealionConvs(
+    system_prompt=HISTORY_SUMMARY_PROMPT,
+    multiagent_name="summary_agent",
+    human_prompt="previous summary:\n{summary}\n\nnew conversation segment:\n{content}",
+    provider="openai",
+    temperature=0.1,
+    output_type="str",
+    max_retries=2,
+    api_key=settings.SEALION_API_KEY,
+    model_name=settings.SEALION_MODEL_NAME,
+    base_url=settings.SEALION_BASE_URL,
+    extra_body={
+        "chat_template_kwargs": {
+            "thinking_mode": "off"
+        }
+    },
+    priority=INTERACTIVE,
+    max_tokens=1024,
+)
+
 SCA = SealionConvs(
     system_prompt=SYSTEM_PROMPT_LLM_CONVS,
     multiagent_name="intake_agent",
@@ -18,7 +43,17 @@ SCA = SealionConvs(
     api_key=settings.SEALION_API_KEY,
     model_name=settings.SEALION_MODEL_NAME,
     base_url=settings.SEALION_BASE_URL,
+    priority=INTERACTIVE,
+    # Only an identical transcript (same profile, same turns) is served from cache
+    cache=EXACT,
     max_tokens=8092,
+    context_window=ConversationWindow(
+        summarizer=SMA,
+        recent_turns=settings.INTAKE_RECENT_TURNS,
+        token_budget=settings.INTAKE_HISTORY_TOKEN_BUDGET,
+        fold_chunk=settings.INTAKE_SUMMARY_FOLD_CHUNK,
+        chars_per_token=settings.CHARS_PER_TOKEN,
+    ),
 )
 
 SPA = SealionConvs(
@@ -67,6 +102,7 @@ FRA = SealionConvs(
     api_key=settings.SEALION_API_KEY,
     model_name=settings.SEALION_MODEL_NAME,
     base_url=settings.SEALION_BASE_URL,
+    cache=OFF,  # one report per chat; a cached copy would never be read
     max_tokens=8192,
 )
 
@@ -81,3 +117,17 @@ LDA = SealionConvs(
     base_url=settings.SEALION_BASE_URL,
     max_tokens=8192,
 )
+
+AGENTS = [SCA, SPA, MDA, FRA, LDA, SMA]
+
+
+def open_llm_clients():
+    """Create the shared client for every endpoint an agent (or its fallback) may call."""
+    for agent in AGENTS:
+        llm_clients.get_async(agent.base_url, agent.api_key)
+        if agent.fallback_base_url:
+            llm_clients.get_async(agent.fallback_base_url, agent.api_key)
+
+
+async def close_llm_clients():
+    await llm_clients.aclose()
@@ -1,10 +1,20 @@
 
 import time
 import asyncio
-from typing import Dict, Any, List, Literal
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Literal, AsyncIterator, Optional, Tuple
 from openai import OpenAI, AsyncOpenAI
 from loguru import logger
 
+from .clients import llm_clients
+from .limiter import llm_limits, LLMOverloaded, BATCH
+from .router import llm_router, Endpoint, CircuitOpen
+from .retry import (
+    RetryPolicy, RetryBudget, default_retry_policy, request_budget, current_budget,
+    is_retryable, FinishReasonError, LLMDeadlineExceeded,
+)
+from .response_cache import response_cache, OFF, EXACT
+
 
 class BaseAgent:
     def __init__(
@@ -15,6 +25,9 @@ class BaseAgent:
         agent_name: str = "",
         max_retries: int = 3,
         multiagent_name: str = "",
+        priority: int = BATCH,
+        retry_policy: Optional[RetryPolicy] = None,
+        cache: Literal["off", "exact"] = EXACT,
         **model_kwargs: Any,
     ):
         self.system_prompt : str = system_prompt
@@ -23,12 +36,18 @@ class BaseAgent:
         self.agent_name : str = agent_name
         self.max_retries : int = max_retries
         self.multiagent_name : str = multiagent_name
+        self.priority : int = priority  # admission order at the endpoint's limiter
+        self.retry_policy : RetryPolicy = retry_policy or default_retry_policy
+        self.cache : str = cache  # response_cache tier this agent may be answered from
 
         self.model_name : str = model_kwargs.get("model_name", "gemini-1.5-flash")
         self.base_url : str = model_kwargs.get(
             "base_url", "https://generativelanguage.sealionapis.com/v1beta/openai/"
         )
         self.api_key : str = model_kwargs.get("api_key") or ""
+        # Smoothed seconds per output token of successful calls per base_url, and when it
+        # was last observed (monotonic), for the router
+        self.latency : Dict[str, Tuple[float, float]] = {}
 
         self._validate_model_kwargs(model_kwargs)
 
@@ -61,19 +80,40 @@ class BaseAgent:
             {"role": "user", "content": user_content},
         ]
 
-    def _llm(self):
-        return OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
-
-    def _allm(self):
-        return AsyncOpenAI(
-
-            api_key=self.api_key,
-            base_url=self.base_url,
-
-        )
+    def _llm(self) -> OpenAI:
+        return llm_clients.get_sync(self.base_url, self.api_key)
+
+    def _allm(self, base_url: Optional[str] = None) -> AsyncOpenAI:
+        # Shared per endpoint; must not be closed by the caller
+        return llm_clients.get_async(base_url or self.base_url, self.api_key)
+
+    def endpoint(self) -> Endpoint:
+        return Endpoint(self.base_url, self.model_name)
+
+    @asynccontextmanager
+    async def _admitted(self, endpoint: Endpoint) -> AsyncIterator[None]:
+        """One request to ``endpoint``: circuit breaker check, then a slot in its limiter."""
+        breaker = llm_router.breaker(endpoint.base_url)
+        if not breaker.allow():
+            raise CircuitOpen(endpoint.base_url, breaker.retry_after())
+        try:
+            async with llm_limits.slot(endpoint.base_url, self.priority):
+                yield
+        except (LLMOverloaded, asyncio.CancelledError, GeneratorExit):
+            # Never reached (or was abandoned by) the caller; says nothing about the endpoint
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False)
+            raise
+        breaker.record(True)
+
+    def _observe_latency(self, base_url: str, seconds: float, tokens: int, alpha: float = 0.2):
+        # Per output token, so a long answer does not make its endpoint look slow
+        per_token = seconds / max(1, tokens)
+        previous = self.latency.get(base_url)
+        value = per_token if previous is None else (1 - alpha) * previous[0] + alpha * per_token
+        self.latency[base_url] = (value, time.monotonic())
 
     def analyze(self, **kwargs: Any) -> str:
         """
@@ -84,12 +124,11 @@ class BaseAgent:
         logger.debug(self.model_kwargs)
         while tries < self.max_retries:
             try:
-                with self._llm() as llm:
-                    response: Any = llm.chat.completions.create(
-                        model=self.model_name,
-                        messages=self.chat_prompt(**kwargs),
-                        **self.model_kwargs,
-                    ) # type: ignore
+                response: Any = self._llm().chat.completions.create(
+                    model=self.model_name,
+                    messages=self.chat_prompt(**kwargs),
+                    **self.model_kwargs,
+                ) # type: ignore
 
                 if response.choices[0].finish_reason == "stop":
                     process_time = time.time() - start_time
@@ -104,46 +143,136 @@ class BaseAgent:
             except Exception as e:
                 tries += 1
                 logger.error(f"Attempt {tries} failed with error: {str(e)}")
-                if tries >= self.max_retries:
+                if tries >= self.max_retries or not is_retryable(e):
                     raise e
-                time.sleep(1)
+                time.sleep(self.retry_policy.backoff(tries))
 
         raise Exception(f"Max retries exceeded after {self.max_retries} attempts")
 
-    async def aanalyze(self, **kwargs: Any) -> str:
+    def _attempt_kwargs(self, timeout: float) -> Dict[str, Any]:
+        return {**self.model_kwargs, "timeout": timeout}
+
+    async def _cached(self, endpoint: Endpoint, messages: List[Dict[str, str]]) -> Tuple[Optional[str], Optional[str]]:
+        """A cached completion for this exact call, and where to store one on a miss."""
+        if self.cache == OFF or not response_cache.enabled:
+            return None, None
+        key = response_cache.key(endpoint.model_name, messages, self.model_kwargs)
+        return response_cache.get(key), key
+
+    async def _cacheable(self, content: str) -> bool:
+        """Whether a completion may be served to later calls; agents that parse their output check it here."""
+        return True
+
+    async def _remember(self, key: Optional[str], content: str):
+        if key is not None and await self._cacheable(content):
+            response_cache.put(key, content)
+
+    async def aanalyze(self, endpoint: Optional[Endpoint] = None, **kwargs: Any) -> str:
         """
-        Asynchronous analysis method.
+        Asynchronous analysis method. ``endpoint`` overrides the agent's own for this call only.
+
+        Retries follow ``retry_policy``, sharing attempts and the deadline
+        with any enclosing call (e.g. ``SealionConvs.arun``).
         """
+        endpoint = endpoint or self.endpoint()
         start_time = time.time()
-        tries = 0
         logger.debug(self.model_kwargs)
-        while tries < self.max_retries:
+        messages = self.chat_prompt(**kwargs)
+        cached, cache_key = await self._cached(endpoint, messages)
+        if cached is not None:
+            logger.success(f"Async analysis served from cache in {time.time() - start_time:.2f}s")
+            return cached
+        with request_budget(self.retry_policy) as budget:
+            while True:
+                timeout = budget.begin(endpoint.base_url, self.max_retries, self.model_kwargs["timeout"])
+                try:
+                    async with self._admitted(endpoint):
+                        call_start = time.monotonic()
+                        response = await self._allm(endpoint.base_url).chat.completions.create(
+                            model=endpoint.model_name,
+                            messages=messages,
+                            **self._attempt_kwargs(timeout),
+                        ) # type: ignore
+                    finish_reason = response.choices[0].finish_reason
+                    if finish_reason == "stop":
+                        usage = getattr(response, "usage", None)
+                        tokens = getattr(usage, "completion_tokens", None) or len(response.choices[0].message.content or "") // 4
+                        self._observe_latency(endpoint.base_url, time.monotonic() - call_start, tokens)
+                        process_time = time.time() - start_time
+                        logger.success(f"Async analysis completed in {process_time:.2f}s")
+                        content = response.choices[0].message.content
+                        await self._remember(cache_key, content)
+                        return content
+                    raise FinishReasonError(finish_reason)
+
+                except Exception as e:
+                    logger.error(f"Attempt {budget.attempts} failed with error: {str(e)}")
+                    if not is_retryable(e) or not budget.can_attempt(endpoint.base_url, self.max_retries):
+                        raise
+                    if not await budget.wait(e):
+                        raise LLMDeadlineExceeded("No time left to retry before the request deadline") from e
+
+    async def astream(self, endpoint: Optional[Endpoint] = None, **kwargs: Any) -> AsyncIterator[str]:
+        """
+        Asynchronous streaming analysis method, yields content deltas as they arrive.
+
+        Attempts are only retried while nothing has been yielded yet; once
+        the caller has seen part of a completion a failure is raised.
+        """
+        endpoint = endpoint or self.endpoint()
+        start_time = time.time()
+        messages = self.chat_prompt(**kwargs)
+        cached, cache_key = await self._cached(endpoint, messages)
+        if cached is not None:
+            logger.success(f"Async stream served from cache in {time.time() - start_time:.2f}s")
+            yield cached
+            return
+        # Generators must not install context: use the caller's budget, or a private one
+        budget = current_budget() or RetryBudget(self.retry_policy)
+        while True:
+            emitted: List[str] = []
+            timeout = budget.begin(endpoint.base_url, self.max_retries, self.model_kwargs["timeout"])
             try:
-                async with self._allm() as llm:
-                    response = await llm.chat.completions.create(
-                        model=self.model_name,
-                        messages=self.chat_prompt(**kwargs),
-                        **self.model_kwargs,
+                finish_reason = None
+                # The slot is held until the stream is fully read
+                async with self._admitted(endpoint):
+                    call_start = time.monotonic()
+                    stream = await self._allm(endpoint.base_url).chat.completions.create(
+                        model=endpoint.model_name,
+                        messages=messages,
+                        stream=True,
+                        **self._attempt_kwargs(timeout),
                     ) # type: ignore
-
-                if response.choices[0].finish_reason == "stop":
+                    # closing the stream returns the connection to the shared pool
+                    async with stream:
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            choice = chunk.choices[0]
+                            delta = choice.delta.content if choice.delta else None
+                            if delta:
+                                if not emitted:
+                                    logger.debug(f"First token after {time.time() - start_time:.2f}s")
+                                emitted.append(delta)
+                                yield delta
+                            if choice.finish_reason:
+                                finish_reason = choice.finish_reason
+
+                if finish_reason in (None, "stop"):
+                    # One content delta is about one token
+                    self._observe_latency(endpoint.base_url, time.monotonic() - call_start, len(emitted))
                     process_time = time.time() - start_time
-                    logger.success(f"Async analysis completed in {process_time:.2f}s")
-                    return response.choices[0].message.content
-
-                tries += 1
-                logger.warning(
-                    f"Attempt {tries} failed, finish_reason: {response.choices[0].finish_reason}"
-                )
+                    logger.success(f"Async stream completed in {process_time:.2f}s")
+                    await self._remember(cache_key, "".join(emitted))
+                    return
+                raise FinishReasonError(finish_reason)
 
             except Exception as e:
-                tries += 1
-                logger.error(f"Attempt {tries} failed with error: {str(e)}")
-                if tries >= self.max_retries:
-                    raise e
-                await asyncio.sleep(1)  # Brief delay before retry
-
-        raise Exception(f"Max retries exceeded after {self.max_retries} attempts")
+                logger.error(f"Attempt {budget.attempts} failed with error: {str(e)}")
+                if emitted or not is_retryable(e) or not budget.can_attempt(endpoint.base_url, self.max_retries):
+                    raise
+                if not await budget.wait(e):
+                    raise LLMDeadlineExceeded("No time left to retry before the request deadline") from e
 
 
 async def main():
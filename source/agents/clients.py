@@ -0,0 +1,82 @@
+from typing import Dict, Optional, Tuple
+
+import httpx
+from loguru import logger
+from openai import AsyncOpenAI, OpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
+from config import settings
+
+
+class LLMClientRegistry:
+    """Long-lived OpenAI-compatible clients, one per (base_url, api_key).
+
+    Every agent pointing at the same endpoint shares one keep-alive
+    connection pool (HTTP/2 where the server negotiates it), instead of
+    paying TCP/TLS setup for a fresh client on every call.
+    """
+
+    def __init__(
+        self,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+    ):
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._async: Dict[Tuple[str, str], AsyncOpenAI] = {}
+        self._sync: Dict[Tuple[str, str], OpenAI] = {}
+
+    def get_async(self, base_url: Optional[str], api_key: Optional[str]) -> AsyncOpenAI:
+        key = (base_url or "", api_key or "")
+        client = self._async.get(key)
+        if client is None or client.is_closed():
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=DefaultAsyncHttpxClient(http2=self.http2, limits=self.limits),
+                max_retries=0,  # retries are owned by RetryPolicy
+            )
+            self._async[key] = client
+            logger.info(f"Opened shared async LLM client for {base_url}")
+        return client
+
+    def get_sync(self, base_url: Optional[str], api_key: Optional[str]) -> OpenAI:
+        key = (base_url or "", api_key or "")
+        client = self._sync.get(key)
+        if client is None or client.is_closed():
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=DefaultHttpxClient(http2=self.http2, limits=self.limits),
+                max_retries=0,  # retries are owned by RetryPolicy
+            )
+            self._sync[key] = client
+        return client
+
+    async def aclose(self):
+        for client in self._async.values():
+            await client.close()
+        for client in self._sync.values():
+            client.close()
+        self._async.clear()
+        self._sync.clear()
+        logger.info("Closed shared LLM clients")
+
+    def stats(self) -> dict:
+        return {
+            "http2": self.http2,
+            "async_clients": [url for url, _ in self._async],
+            "sync_clients": [url for url, _ in self._sync],
+        }
+
+
+llm_clients = LLMClientRegistry(
+    http2=settings.LLM_HTTP2,
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+)
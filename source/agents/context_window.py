@@ -0,0 +1,147 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, List
+
+from loguru import logger
+
+
+class _SummaryState:
+    __slots__ = ("summary", "folded", "fingerprint")
+
+    def __init__(self):
+        self.summary: str = ""
+        self.folded: int = 0          # number of leading lines merged into ``summary``
+        self.fingerprint: str = ""    # hash of the last folded line, detects rewritten history
+
+
+class ConversationWindow:
+    """Token-budgeted view of a conversation for an agent prompt.
+
+    Up to ``recent_turns`` latest lines are sent verbatim. Once the transcript
+    no longer fits ``token_budget``, older lines are folded into a rolling
+    summary produced by ``summarizer`` and cached per chat, so each fold only
+    summarises the lines that fell out of the window since the previous one.
+    Folding happens in chunks of ``fold_chunk`` lines to avoid an extra LLM
+    call on every turn.
+    """
+
+    SUMMARY_HEADER = "Ringkasan percakapan sebelumnya:\n"
+
+    def __init__(
+        self,
+        summarizer: Any,
+        recent_turns: int = 12,
+        token_budget: int = 3000,
+        fold_chunk: int = 6,
+        chars_per_token: float = 4.0,
+        max_chats: int = 1000,
+    ):
+        self.summarizer = summarizer
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.fold_chunk = fold_chunk
+        self.chars_per_token = chars_per_token
+        self.max_chats = max_chats
+        self._states: "OrderedDict[str, _SummaryState]" = OrderedDict()
+
+        self.requests = 0
+        self.windowed_requests = 0
+        self.summary_calls = 0
+        self.summary_failures = 0
+        self.tokens_full_total = 0
+        self.tokens_sent_total = 0
+        self.last_tokens_saved = 0
+
+    def estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1 if text else 0
+
+    @staticmethod
+    def _fingerprint(line: str) -> str:
+        return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+    def _state(self, chat_id: str, lines: List[str]) -> _SummaryState:
+        state = self._states.get(chat_id)
+        if state is None or state.folded > len(lines) or (
+            state.folded and self._fingerprint(lines[state.folded - 1]) != state.fingerprint
+        ):
+            state = _SummaryState()
+        self._states[chat_id] = state
+        self._states.move_to_end(chat_id)
+        while len(self._states) > self.max_chats:
+            self._states.popitem(last=False)
+        return state
+
+    def _render(self, summary: str, lines: List[str]) -> str:
+        body = "".join(lines)
+        if not summary:
+            return body
+        return f"{self.SUMMARY_HEADER}{summary.strip()}\n\n{body}"
+
+    async def _fold(self, state: _SummaryState, lines: List[str], upto: int) -> bool:
+        segment = "".join(lines[state.folded:upto])
+        self.summary_calls += 1
+        try:
+            summary = await self.summarizer.arun(summary=state.summary or "-", content=segment)
+        except Exception as e:
+            summary = None
+            logger.error(f"[context] summarizer failed: {e}")
+        if not summary:
+            self.summary_failures += 1
+            return False
+        state.summary = summary
+        state.folded = upto
+        state.fingerprint = self._fingerprint(lines[upto - 1])
+        return True
+
+    async def build(self, chat_id: str, lines: List[str]) -> str:
+        """Return the prompt content for ``lines``, folding older lines if over budget."""
+        self.requests += 1
+        full_text = "".join(lines)
+        full_tokens = self.estimate_tokens(full_text)
+        self.tokens_full_total += full_tokens
+
+        state = self._state(chat_id, lines)
+        text = self._render(state.summary, lines[state.folded:])
+        tokens = self.estimate_tokens(text)
+        verbatim = len(lines) - state.folded
+
+        if tokens > self.token_budget or (state.folded and verbatim > self.recent_turns + self.fold_chunk):
+            # Fold everything except the recent window, shrinking the window further
+            # if the recent lines alone would still exceed the budget.
+            cut = max(state.folded, len(lines) - self.recent_turns)
+            reserve = self.estimate_tokens(state.summary) or self.token_budget // 8
+            while cut < len(lines) - 1 and reserve + self.estimate_tokens("".join(lines[cut:])) > self.token_budget:
+                cut += 1
+            if cut > state.folded and await self._fold(state, lines, cut):
+                text = self._render(state.summary, lines[state.folded:])
+            elif tokens > self.token_budget:
+                # Summariser unavailable: degrade to a plain truncated window
+                text = self._render(state.summary, lines[cut:])
+            tokens = self.estimate_tokens(text)
+
+        if text != full_text:
+            self.windowed_requests += 1
+        self.tokens_sent_total += tokens
+        self.last_tokens_saved = max(0, full_tokens - tokens)
+        return text
+
+    def invalidate(self, chat_id: str):
+        self._states.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self._states),
+            "recent_turns": self.recent_turns,
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "windowed_requests": self.windowed_requests,
+            "summary_calls": self.summary_calls,
+            "summary_failures": self.summary_failures,
+            "prompt_tokens_full": self.tokens_full_total,
+            "prompt_tokens_sent": self.tokens_sent_total,
+            "prompt_tokens_saved": max(0, self.tokens_full_total - self.tokens_sent_total),
+            "avg_tokens_saved_per_request": round(
+                (self.tokens_full_total - self.tokens_sent_total) / self.requests, 1
+            ) if self.requests else 0.0,
+            "last_tokens_saved": self.last_tokens_saved,
+        }
@@ -0,0 +1,172 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from loguru import logger
+from config import settings
+
+# Lower runs first
+INTERACTIVE = 0  # a user is waiting on the reply (intake turns, their summaries)
+BATCH = 1        # report pipeline and other background work
+
+
+class LLMOverloaded(RuntimeError):
+    """Raised instead of queueing when an endpoint's wait queue is full."""
+
+    def __init__(self, endpoint: str, retry_after: float = 5.0):
+        super().__init__(f"LLM endpoint {endpoint} is overloaded")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    """Caps in-flight requests to one endpoint, admitting waiters by priority.
+
+    Waiters are served lowest ``priority`` first, FIFO within a priority.
+    At most ``max_queue`` callers wait; when the queue is full a newcomer
+    displaces the newest waiter of a strictly lower priority, otherwise it
+    is rejected with ``LLMOverloaded`` so the caller can shed load fast.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, retry_after: float = 5.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.shed = 0
+        self.displaced = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = BATCH) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _overloaded(self) -> LLMOverloaded:
+        return LLMOverloaded(self.name, self.retry_after)
+
+    def _prune(self):
+        # A waiter cancelled while queued keeps its entry until its task runs its cleanup
+        if any(entry[2].done() for entry in self._waiters):
+            self._waiters = [entry for entry in self._waiters if not entry[2].done()]
+            heapq.heapify(self._waiters)
+
+    async def _acquire(self, priority: int):
+        self._prune()
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                self.shed += 1
+                raise self._overloaded()
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            if not worst[2].done():
+                worst[2].set_exception(self._overloaded())
+                self.displaced += 1
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), fut]
+        heapq.heappush(self._waiters, entry)
+        self.max_depth = max(self.max_depth, len(self._waiters))
+        start = time.monotonic()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                # The slot was handed to us just as we were cancelled: pass it on
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        except LLMOverloaded:
+            self.shed += 1
+            raise
+        self.admitted += 1
+        self.wait_total += time.monotonic() - start
+
+    def _release(self):
+        while self._waiters:
+            fut = heapq.heappop(self._waiters)[2]
+            if not fut.done():
+                fut.set_result(None)  # hand the slot over; _active is unchanged
+                return
+        self._active -= 1
+
+    def stats(self) -> dict:
+        queued: Dict[int, int] = {}
+        for priority, _, _ in self._waiters:
+            queued[priority] = queued.get(priority, 0) + 1
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self._active,
+            "queued": len(self._waiters),
+            "queued_by_priority": queued,
+            "max_queue": self.max_queue,
+            "max_depth": self.max_depth,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "displaced": self.displaced,
+            "avg_wait_s": round(self.wait_total / self.admitted, 4) if self.admitted else 0.0,
+        }
+
+
+class EndpointLimiters:
+    """One ``PriorityLimiter`` per ``base_url``, shared by every agent calling it."""
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        max_queue: int = 64,
+        limits: Optional[Dict[str, int]] = None,
+        retry_after: float = 5.0,
+    ):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.limits = limits or {}
+        self.retry_after = retry_after
+        self._limiters: Dict[str, PriorityLimiter] = {}
+
+    def get(self, base_url: Optional[str]) -> PriorityLimiter:
+        key = base_url or ""
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = PriorityLimiter(
+                key,
+                concurrency=self.limits.get(key, self.concurrency),
+                max_queue=self.max_queue,
+                retry_after=self.retry_after,
+            )
+            logger.info(f"LLM limiter for {key}: {limiter.concurrency} in flight, {self.max_queue} queued")
+        return limiter
+
+    def slot(self, base_url: Optional[str], priority: int = BATCH):
+        return self.get(base_url).slot(priority)
+
+    def stats(self) -> dict:
+        return {url: limiter.stats() for url, limiter in self._limiters.items()}
+
+
+llm_limits = EndpointLimiters(
+    concurrency=settings.LLM_ENDPOINT_CONCURRENCY,
+    max_queue=settings.LLM_QUEUE_LIMIT,
+    limits=settings.LLM_ENDPOINT_LIMITS,
+    retry_after=settings.LLM_SHED_RETRY_AFTER,
+)
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+
+# Agent settings that never change what the model says
+_TRANSPORT_KWARGS = ("timeout", "stream")
+
+OFF, EXACT = "off", "exact"
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Completions already paid for, reused when the same request comes again.
+
+    An LRU with TTL keyed by model, messages and sampling parameters, so an
+    identical transcript sent to ``SPA`` or ``LDA`` again (retries, report
+    runs) is answered without a model call. Agents opt out with
+    ``cache="off"``.
+    """
+
+    def __init__(self, enabled: bool = True, max_size: int = 2000, ttl: float = 3600.0):
+        self.enabled = enabled and max_size > 0 and ttl > 0
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def key(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        params = {k: v for k, v in params.items() if k not in _TRANSPORT_KWARGS}
+        return _digest([model, messages, params])
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, value: str):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        self.stores += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+response_cache = ResponseCache(
+    enabled=settings.LLM_CACHE_ENABLED,
+    max_size=settings.LLM_CACHE_MAX_SIZE,
+    ttl=settings.LLM_CACHE_TTL,
+)
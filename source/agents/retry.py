@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Optional
+
+import httpx
+import openai
+from config import settings
+from .limiter import LLMOverloaded
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """The request's overall deadline passed before an attempt could succeed."""
+
+
+class FinishReasonError(Exception):
+    """The model stopped for a reason other than ``stop`` (e.g. ``length``)."""
+
+    def __init__(self, finish_reason: Optional[str]):
+        super().__init__(f"Completion ended with finish_reason: {finish_reason}")
+        self.finish_reason = finish_reason
+
+
+# Retrying these with the same request gives the same answer
+_NON_RETRYABLE = (
+    LLMOverloaded,
+    FinishReasonError,
+    LLMDeadlineExceeded,
+    openai.BadRequestError,
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError,
+)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, _NON_RETRYABLE):
+        return False
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    # Timeouts, connection errors, malformed output from a sampled completion
+    return isinstance(exc, Exception)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (``retry-after-ms`` / ``retry-after``), if any."""
+    response = getattr(exc, "response", None)
+    if not isinstance(response, httpx.Response):
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """How one logical LLM request may retry, across transport errors, bad output and fallbacks.
+
+    ``max_attempts`` caps model calls for the whole request and
+    ``per_endpoint`` (the agent's ``max_retries``) caps them per endpoint,
+    so a fallback still gets a turn. Waits are exponential with full jitter,
+    or what the server's Retry-After asks for; every attempt's timeout is
+    cut to what is left of ``deadline``.
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0, deadline: float = 300.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """Attempts and time left for one logical request; shared by nested agent calls."""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.attempts = 0
+        self.per_endpoint: Dict[str, int] = {}
+        self.expires_at = time.monotonic() + policy.deadline
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def can_attempt(self, base_url: Optional[str] = None, limit: Optional[int] = None) -> bool:
+        if self.attempts >= self.policy.max_attempts or self.remaining() <= 0:
+            return False
+        if limit is not None and self.per_endpoint.get(base_url or "", 0) >= limit:
+            return False
+        return True
+
+    def begin(self, base_url: Optional[str], limit: Optional[int], timeout: float) -> float:
+        """Count an attempt and return its timeout; raises if the budget is spent."""
+        if self.remaining() <= 0:
+            raise LLMDeadlineExceeded(f"LLM request deadline of {self.policy.deadline:.0f}s exceeded")
+        if not self.can_attempt(base_url, limit):
+            raise RuntimeError("LLM retry budget exhausted")
+        self.attempts += 1
+        key = base_url or ""
+        self.per_endpoint[key] = self.per_endpoint.get(key, 0) + 1
+        return max(0.1, min(timeout, self.remaining()))
+
+    async def wait(self, exc: Optional[BaseException] = None) -> bool:
+        """Sleep before the next attempt; False if that would overrun the deadline."""
+        delay = retry_after(exc) if exc is not None else None
+        if delay is None:
+            delay = self.policy.backoff(self.attempts)
+        if delay >= self.remaining():
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+
+_budget: ContextVar[Optional[RetryBudget]] = ContextVar("llm_retry_budget", default=None)
+
+
+def current_budget() -> Optional[RetryBudget]:
+    return _budget.get()
+
+
+@contextmanager
+def request_budget(policy: RetryPolicy) -> Iterator[RetryBudget]:
+    """The current request's budget, or a new one if this is the outermost call."""
+    budget = _budget.get()
+    if budget is not None:
+        yield budget
+        return
+    budget = RetryBudget(policy)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+default_retry_policy = RetryPolicy(
+    max_attempts=settings.LLM_RETRY_MAX_ATTEMPTS,
+    base_delay=settings.LLM_RETRY_BASE_DELAY,
+    max_delay=settings.LLM_RETRY_MAX_DELAY,
+    deadline=settings.LLM_REQUEST_DEADLINE,
+)
@@ -0,0 +1,192 @@
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+from config import settings
+from .limiter import LLMOverloaded
+
+
+class Endpoint(NamedTuple):
+    base_url: str
+    model_name: str
+
+
+class CircuitOpen(LLMOverloaded):
+    """The endpoint's breaker is open; try another endpoint or come back after ``retry_after``."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(endpoint, retry_after)
+        self.args = (f"LLM endpoint {endpoint} circuit is open",)
+
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Failure-rate breaker for one endpoint.
+
+    Closed: outcomes of the last ``window`` calls are kept, and once at least
+    ``min_calls`` are recorded a failure rate of ``failure_rate`` or more
+    opens the circuit. Open: calls fail fast for ``cooldown`` seconds.
+    Half-open: up to ``probes`` calls go through; that many successes close
+    the circuit again, any failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        cooldown: float = 30.0,
+        probes: int = 1,
+    ):
+        self.endpoint = endpoint
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.probes = probes
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = 0
+        self._probe_successes = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def available(self) -> bool:
+        """Whether a call could be admitted now (without taking a probe permit)."""
+        if self.state == OPEN:
+            return self.retry_after() <= 0
+        if self.state == HALF_OPEN:
+            return self._probing < self.probes
+        return True
+
+    def allow(self) -> bool:
+        """Admit a call; in half-open state this takes one of the probe permits."""
+        if self.state == OPEN and self.retry_after() <= 0:
+            self.state = HALF_OPEN
+            self._probing = 0
+            self._probe_successes = 0
+            logger.info(f"[router] {self.endpoint} half-open, probing")
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probing >= self.probes):
+            self.rejected += 1
+            return False
+        if self.state == HALF_OPEN:
+            self._probing += 1
+        return True
+
+    def release(self):
+        """Give back an admitted call that never reached the endpoint."""
+        if self.state == HALF_OPEN and self._probing > 0:
+            self._probing -= 1
+
+    def record(self, ok: bool):
+        if self.state == HALF_OPEN:
+            self._probing = max(0, self._probing - 1)
+            if not ok:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self.state = CLOSED
+                self._outcomes.clear()
+                logger.info(f"[router] {self.endpoint} recovered, circuit closed")
+            return
+        if self.state == OPEN:
+            return  # a call admitted before the circuit opened
+        self._outcomes.append(ok)
+        if len(self._outcomes) >= self.min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+        logger.warning(f"[router] {self.endpoint} circuit opened for {self.cooldown:.0f}s")
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": self._outcomes.count(False),
+            "retry_after": round(self.retry_after(), 1) if self.state == OPEN else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class EndpointRouter:
+    """Chooses, per call, which of an agent's endpoints to try and in what order.
+
+    Nothing here changes an agent's configuration: each call gets its own
+    ordered plan. Endpoints with an open circuit are skipped until their
+    cooldown ends. Among available endpoints the agent's preferred one goes
+    first unless its recent per-token latency for that agent is more than
+    ``latency_ratio`` times an alternative's (0 disables the comparison).
+    Latency samples older than ``latency_max_age`` seconds are ignored, so
+    a preferred endpoint that lost once is tried again after that long
+    instead of being avoided on the strength of a stale number.
+    """
+
+    def __init__(self, latency_ratio: float = 2.0, latency_max_age: float = 120.0, **breaker_kwargs):
+        self.latency_ratio = latency_ratio
+        self.latency_max_age = latency_max_age
+        self.breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.reordered = 0
+
+    def breaker(self, base_url: Optional[str]) -> CircuitBreaker:
+        key = base_url or ""
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key, **self.breaker_kwargs)
+        return breaker
+
+    def plan(
+        self, candidates: List[Endpoint], latency: Optional[Dict[str, Tuple[float, float]]] = None
+    ) -> List[Endpoint]:
+        """Candidates in the order to try them; open circuits go last so callers can fail fast on them.
+
+        ``latency`` maps base_url to (seconds per output token, monotonic time observed).
+        """
+        ready = [e for e in candidates if self.breaker(e.base_url).available()]
+        blocked = [e for e in candidates if e not in ready]
+        if self.latency_ratio > 0 and latency and len(ready) > 1:
+            now = time.monotonic()
+            latency = {url: v for url, (v, at) in latency.items() if now - at <= self.latency_max_age}
+            preferred = latency.get(ready[0].base_url)
+            best = min(ready[1:], key=lambda e: latency.get(e.base_url, float("inf")))
+            other = latency.get(best.base_url)
+            if preferred is not None and other is not None and preferred > other * self.latency_ratio:
+                ready.remove(best)
+                ready.insert(0, best)
+                self.reordered += 1
+        return ready + blocked
+
+    def stats(self) -> dict:
+        return {
+            "latency_ratio": self.latency_ratio,
+            "latency_max_age": self.latency_max_age,
+            "reordered": self.reordered,
+            "breakers": {url: b.stats() for url, b in self._breakers.items()},
+        }
+
+
+llm_router = EndpointRouter(
+    latency_ratio=settings.LLM_ROUTER_LATENCY_RATIO,
+    latency_max_age=settings.LLM_ROUTER_LATENCY_MAX_AGE,
+    window=settings.LLM_BREAKER_WINDOW,
+    min_calls=settings.LLM_BREAKER_MIN_CALLS,
+    failure_rate=settings.LLM_BREAKER_FAILURE_RATE,
+    cooldown=settings.LLM_BREAKER_COOLDOWN,
+    probes=settings.LLM_BREAKER_PROBES,
+)
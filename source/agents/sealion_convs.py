@@ -6,7 +6,7 @@ import re
 import json_repair
 from loguru import logger
 from pydantic import BaseModel, Field, ValidationError
-from typing import Dict, Any, List, Literal
+from typing import Dict, Any, List, Literal, Optional, Callable, Awaitable
 
 # path_this = os.path.dirname(os.path.abspath(__file__))
 # path_project = os.path.dirname(os.path.join(path_this, ".."))
@@ -16,7 +16,13 @@ from typing import Dict, Any, List, Literal
 # sys.path.append(path_this)
 
 from .base_agent import BaseAgent
+from .limiter import LLMOverloaded
+from .router import llm_router, Endpoint, CircuitOpen
+from .retry import request_budget
+from .context_window import ConversationWindow
+from .stream_parser import JsonFieldStream, VisibleTextStream
 from config import settings
+from utils import run_blocking
 
 class SealionConvs(BaseAgent):
 
@@ -36,6 +42,7 @@ class SealionConvs(BaseAgent):
         max_tokens: int=2048,
         output_type: str = "json",
         extra_body: Dict[str, Any] = {},
+        context_window: Optional[ConversationWindow] = None,
         **kwargs,
     ) -> None:
         super().__init__(
@@ -58,53 +65,129 @@ class SealionConvs(BaseAgent):
         self.muliagent_name = multiagent_name
         self.fallback_base_url = settings.MEDGEMMA_BASE_URL
         self.fallback_model_name = settings.MEDGEMMA_MODEL_NAME
+        self.context_window = context_window
 
-    async def arun(self, **kwargs):
-        logger.debug(f"Running agent {self.muliagent_name}")
-        retries = 0
-        logger.debug(kwargs.get("content"))
-        while retries < self.max_retries:
-            try:
-                main = await super().aanalyze(**kwargs)
-                logger.debug(main)
-                if self.output_type == "str":
-                    if "</think>" in main:
-                        main = main.split("</think>")[-1].strip()
-                    return main
+    @staticmethod
+    def _parse_json(raw: str):
+        # json_repair is pure Python and slow on long generations, keep it off the loop
+        return json.loads(json_repair.repair_json(raw))
 
-                main = json_repair.repair_json(main)
-                main = json.loads(main)
-                if "</think>" in main.get("answer", ""):
-                    main = main.split("</think>")[-1].strip()
-                return main
+    async def _finalize(self, main: str):
+        if self.output_type == "str":
+            if "</think>" in main:
+                main = main.split("</think>")[-1].strip()
+            return main
 
-            except (json.JSONDecodeError, ValidationError) as e:
-                logger.warning(f"[Retry {retries+1}] Invalid format: {str(e)}")
-                retries += 1
-            except Exception as e:
-                logger.exception(f"Unexpected error in SealionConvs.arun: {str(e)}")
-                break
+        main = await run_blocking(self._parse_json, main)
+        if "</think>" in main.get("answer", ""):
+            main["answer"] = main["answer"].split("</think>")[-1].strip()
+        return main
+
+    async def _cacheable(self, content: str) -> bool:
+        # Never keep a completion that would fail _finalize: format retries would hit it again
+        if self.output_type != "json":
+            return True
+        try:
+            parsed = await run_blocking(self._parse_json, content)
+        except Exception:
+            return False
+        # json_repair turns unparseable text into {}; that is a miss, not an answer
+        return isinstance(parsed, dict) and bool(parsed)
 
+    def endpoints(self) -> List[Endpoint]:
+        """This agent's endpoint, then the MedGEMMA fallback when it is a different one."""
+        endpoints = [self.endpoint()]
         if self.fallback_base_url and self.fallback_model_name:
-            logger.warning("Primary failed. Falling back to MedGEMMA...")
-            self.base_url = self.fallback_base_url
-            self.model_name = self.fallback_model_name
-            try:
-                main = await super().aanalyze(**kwargs)
+            fallback = Endpoint(self.fallback_base_url, self.fallback_model_name)
+            if fallback != endpoints[0]:
+                endpoints.append(fallback)
+        return endpoints
 
-                if self.output_type == "str":
-                    if "</think>" in main:
-                        main = main.split("</think>")[-1].strip()
-                    return main
+    async def arun(self, **kwargs):
+        logger.debug(f"Running agent {self.muliagent_name}")
+        logger.debug(kwargs.get("content"))
+        # Routed per call: a failure never repoints the shared agent
+        plan = llm_router.plan(self.endpoints(), self.latency)
+        circuit_open = None
+        with request_budget(self.retry_policy) as budget:
+            for i, endpoint in enumerate(plan):
+                if not budget.can_attempt():
+                    break
+                if i:
+                    logger.warning(f"{self.muliagent_name}: falling back to {endpoint.model_name}")
+                # Format errors are retried on the first endpoint only
+                limit = self.max_retries if i == 0 else 1
+                while budget.can_attempt(endpoint.base_url, limit):
+                    try:
+                        main = await super().aanalyze(endpoint=endpoint, **kwargs)
+                        logger.debug(main)
+                        return await self._finalize(main)
 
-                main = json_repair.repair_json(main)
-                main = json.loads(main)
+                    except (json.JSONDecodeError, ValidationError) as e:
+                        logger.warning(f"[Retry {budget.attempts}] Invalid format: {str(e)}")
+                        if not await budget.wait():
+                            break
+                    except CircuitOpen as e:
+                        circuit_open = e
+                        break
+                    except LLMOverloaded:
+                        # Shed by admission control; falling back would just move the load
+                        raise
+                    except Exception as e:
+                        logger.exception(f"Unexpected error in SealionConvs.arun: {str(e)}")
+                        break
 
-                return main
+        if circuit_open is not None and all(
+            not llm_router.breaker(e.base_url).available() for e in plan
+        ):
+            # Every endpoint is known to be down: report it as unavailable rather than a bad answer
+            raise circuit_open
+        return None
+
+    async def arun_stream(self, on_delta: Callable[[str], Awaitable[None]], **kwargs):
+        """Like ``arun`` but pushes the user-visible text to ``on_delta`` while it generates.
+
+        For JSON agents only the ``answer`` field is streamed. If streaming
+        fails or the final output does not parse, the call is redone through
+        ``arun`` so the caller still gets a complete result.
+        """
+        logger.debug(f"Streaming agent {self.muliagent_name}")
+        visible = JsonFieldStream("answer") if self.output_type == "json" else VisibleTextStream()
+        chunks: List[str] = []
+        # One budget covers the stream and a non-streamed redo
+        with request_budget(self.retry_policy):
+            try:
+                endpoint = llm_router.plan(self.endpoints(), self.latency)[0]
+                async for delta in super().astream(endpoint=endpoint, **kwargs):
+                    chunks.append(delta)
+                    text = visible.feed(delta)
+                    if text:
+                        await on_delta(text)
+                return await self._finalize("".join(chunks))
+            except LLMOverloaded as e:
+                if not isinstance(e, CircuitOpen) or chunks:
+                    raise
+                # Preferred endpoint is down before anything streamed: let arun route around it
+                return await self.arun(**kwargs)
             except Exception as e:
-                logger.error(f"Fallback to MedGEMMA failed: {e}")
+                logger.warning(f"Streaming {self.muliagent_name} failed, retrying without stream: {e}")
+                return await self.arun(**kwargs)
 
-        return None
+    async def arun_history(
+        self,
+        chat_id: str,
+        lines: List[str],
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        **kwargs,
+    ):
+        """Run the agent over a conversation, windowed by ``context_window`` when configured."""
+        if self.context_window is not None:
+            content = await self.context_window.build(chat_id, lines)
+        else:
+            content = "".join(lines)
+        if on_delta is not None:
+            return await self.arun_stream(on_delta, content=content, **kwargs)
+        return await self.arun(content=content, **kwargs)
 
     def run(self, content: str):
         retries = 0
@@ -0,0 +1,122 @@
+import re
+from typing import List
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+
+class VisibleTextStream:
+    """Filters streamed deltas down to the text a user should see.
+
+    A leading ``<think>...</think>`` block is held back entirely, matching
+    what ``SealionConvs.arun`` strips from a finished completion.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._decided = False
+        self._strip = False  # drop whitespace the model puts right after the think block
+
+    def _body_start(self) -> int:
+        """Index where visible text starts, or -1 while it cannot be known yet."""
+        head = self._buf.lstrip()
+        if _THINK_OPEN.startswith(head[: len(_THINK_OPEN)]) and len(head) < len(_THINK_OPEN):
+            return -1
+        if not head.startswith(_THINK_OPEN):
+            return 0
+        end = self._buf.find(_THINK_CLOSE)
+        return -1 if end == -1 else end + len(_THINK_CLOSE)
+
+    def feed(self, delta: str) -> str:
+        self._buf += delta
+        if not self._decided:
+            start = self._body_start()
+            if start == -1:
+                return ""
+            self._decided = True
+            self._pos = start
+            self._strip = start > 0
+        out = self._buf[self._pos:]
+        self._pos = len(self._buf)
+        if self._strip:
+            out = out.lstrip()
+            self._strip = not out
+        return out
+
+
+class JsonFieldStream:
+    """Incrementally decodes one string field of a JSON object as it streams in.
+
+    ``feed`` returns the newly decoded characters of ``field`` (e.g. the
+    intake agent's ``"answer"``), so the reply can be shown while the rest
+    of the object is still being generated.
+    """
+
+    def __init__(self, field: str = "answer"):
+        self._pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buf = ""
+        self._pos = -1
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        self._buf += delta
+        if self.done:
+            return ""
+        if self._pos == -1:
+            search_from = 0
+            if _THINK_OPEN in self._buf:
+                end = self._buf.find(_THINK_CLOSE)
+                if end == -1:
+                    return ""
+                search_from = end + len(_THINK_CLOSE)
+            match = self._pattern.search(self._buf, search_from)
+            if not match:
+                return ""
+            self._pos = match.end()
+        return self._decode()
+
+    def _decode(self) -> str:
+        buf, i = self._buf, self._pos
+        out: List[str] = []
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self.done = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break  # escape split across deltas
+            esc = buf[i + 1]
+            if esc != "u":
+                out.append(_ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            if i + 6 > len(buf):
+                break
+            try:
+                code = int(buf[i + 2:i + 6], 16)
+            except ValueError:
+                i += 6
+                continue
+            if 0xD800 <= code <= 0xDBFF:
+                # surrogate pair: wait for the low half
+                if i + 12 > len(buf):
+                    break
+                try:
+                    low = int(buf[i + 8:i + 12], 16) if buf[i + 6:i + 8] == "\\u" else -1
+                except ValueError:
+                    low = -1
+                if 0xDC00 <= low <= 0xDFFF:
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+            out.append(chr(code))
+            i += 6
+        self._pos = i
+        return "".join(out)
@@ -1,6 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend import auth, chat, users
+from backend.history import history_cache
+from backend.profiles import profile_cache
+from backend.intake import intake_state
+from backend.jobs import report_worker
+from backend.janitor import session_janitor
+from backend.wsocket import ws_manager
+from backend.tasks import geo_cache, nearest_place, facility_index
+from config import settings
+from agents import SCA, open_llm_clients, close_llm_clients, llm_clients, llm_limits, llm_router, response_cache
+import asyncio
+from utils import open_pool, close_pool, get_pool_stats, blocking_executor, loop_monitor, token_cache
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 security = HTTPBearer()
@@ -23,11 +34,57 @@ app.include_router(users.router, prefix="/users", tags=["users"])
 def root():
     return {"msg": "Nusantara CaRas API running!"}
 
+@app.get("/stats")
+def stats():
+    return {
+        "db_pool": get_pool_stats(),
+        "blocking_executor": blocking_executor.stats(),
+        "event_loop": loop_monitor.stats(),
+        "token_cache": token_cache.stats(),
+        "history_cache": history_cache.stats(),
+        "profile_cache": profile_cache.stats(),
+        "intake_state": intake_state.stats(),
+        "intake_context": SCA.context_window.stats(),
+        "llm_clients": llm_clients.stats(),
+        "llm_limits": llm_limits.stats(),
+        "llm_router": llm_router.stats(),
+        "llm_response_cache": response_cache.stats(),
+        "geo_cache": geo_cache.stats(),
+        "facility_index": facility_index.stats() if facility_index is not None else None,
+        "websockets": ws_manager.get_stats(),
+        "chat_locks": chat.chat_locks.stats(),
+        "session_janitor": session_janitor.stats(),
+        "report_worker": report_worker.stats() if settings.REPORT_WORKER_IN_PROCESS else None,
+    }
+
 # Debug: Print all routes when server starts
 @app.on_event("startup")
 async def startup_event():
+    # asyncio.to_thread / run_in_executor(None, ...) share the bounded pool too
+    asyncio.get_running_loop().set_default_executor(blocking_executor.pool)
+    loop_monitor.start()
+    await open_pool()
+    open_llm_clients()
+    await ws_manager.start()
+    if settings.REPORT_WORKER_IN_PROCESS:
+        report_worker.start()
+    if settings.JANITOR_ENABLED:
+        session_janitor.start()
     print("=== Registered Routes ===")
     for route in app.routes:
         if hasattr(route, 'methods') and hasattr(route, 'path'):
             print(f"{route.methods} {route.path}")
     print("========================")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await report_worker.stop()
+    await session_janitor.stop()
+    await ws_manager.stop()
+    await chat.chat_locks.close()
+    await close_pool()
+    await close_llm_clients()
+    await nearest_place.close()
+    geo_cache.close()
+    await loop_monitor.stop()
+    blocking_executor.shutdown()
@@ -3,7 +3,7 @@ from pydantic import BaseModel, EmailStr
 from passlib.hash import bcrypt
 from datetime import datetime, timedelta, date
 import uuid
-from utils import get_conn
+from utils import get_conn, run_blocking, token_cache
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from utils import require_user
 from schemas import Signup, Login
@@ -15,108 +15,108 @@ router = APIRouter()
 def _norm_email(s: str) -> str:
     return s.strip().lower()
 
-def _create_session(user_id: str) -> str:
-    conn = get_conn(); cur = conn.cursor()
-    try:
-        token = str(uuid.uuid4())
-        expires_at = datetime.now() + timedelta(days=7)
-        cur.execute(
+async def _create_session(user_id: str) -> str:
+    token = str(uuid.uuid4())
+    expires_at = datetime.now() + timedelta(days=7)
+    async with get_conn() as conn:
+        await conn.execute(
             "INSERT INTO user_sessions (user_id, session_token_hash, expires_at) "
             "VALUES (%s, digest(%s, 'sha256'), %s)",
             (user_id, token, expires_at)
         )
-        conn.commit()
-        return token
-    finally:
-        cur.close(); conn.close()
+    return token
 
 @router.post("/login")
-def login(data: Login):
+async def login(data: Login):
     email = _norm_email(data.email)
-    conn = get_conn(); cur = conn.cursor()
-    try:
+    async with get_conn() as conn:
         # find user
-        cur.execute("SELECT id, password_hash, status FROM users WHERE email=%s", (email,))
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=401, detail="Invalid email or password")
+        cur = await conn.execute("SELECT id, password_hash, status FROM users WHERE email=%s", (email,))
+        row = await cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
 
-        user_id, pwd_hash, status = row
-        if status != "active":
-            raise HTTPException(status_code=403, detail="Account is not active")
+    user_id, pwd_hash, status = row
+    if status != "active":
+        raise HTTPException(status_code=403, detail="Account is not active")
 
-        # verify password
-        if not bcrypt.verify(data.password, pwd_hash):
-            raise HTTPException(status_code=401, detail="Invalid email or password")
+    # verify password
+    if not await run_blocking(bcrypt.verify, data.password, pwd_hash):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
 
-        # create session
-        token = _create_session(user_id)
-        return {"session_token": token}
-    finally:
-        cur.close(); conn.close()
+    # create session
+    token = await _create_session(user_id)
+    return {"session_token": token}
 
 
 @router.post("/signup")
-def signup(data: Signup):
+async def signup(data: Signup):
     email = _norm_email(data.email)
-    conn = get_conn(); cur = conn.cursor()
+    # hash before borrowing a connection so the pool isn't held during bcrypt
+    pwd_hash = await run_blocking(bcrypt.hash, data.password)
     try:
-        # unique email
-        cur.execute("SELECT 1 FROM users WHERE email=%s", (email,))
-        if cur.fetchone():
-            raise HTTPException(status_code=400, detail="Email already exists")
-
-        # create user with profile fields
-        pwd_hash = bcrypt.hash(data.password)
-        cur.execute(
-            """
-            INSERT INTO users (
-              email, display_name, password_hash, status, locale,
-              date_of_birth, address_line1, address_line2, city, province, postal_code, gender
-            )
-            VALUES (%s, %s, %s, 'active', 'id-ID',
-                    %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (
-                email, data.display_name, pwd_hash,
-                data.date_of_birth, data.address_line1, data.address_line2,
-                data.city, data.province, data.postal_code, data.gender
+        async with get_conn() as conn:
+            # unique email
+            cur = await conn.execute("SELECT 1 FROM users WHERE email=%s", (email,))
+            if await cur.fetchone():
+                raise HTTPException(status_code=400, detail="Email already exists")
+
+            # create user with profile fields
+            cur = await conn.execute(
+                """
+                INSERT INTO users (
+                  email, display_name, password_hash, status, locale,
+                  date_of_birth, address_line1, address_line2, city, province, postal_code, gender
+                )
+                VALUES (%s, %s, %s, 'active', 'id-ID',
+                        %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+                """,
+                (
+                    email, data.display_name, pwd_hash,
+                    data.date_of_birth, data.address_line1, data.address_line2,
+                    data.city, data.province, data.postal_code, data.gender
+                )
             )
-        )
-        user_id = cur.fetchone()[0]
-        conn.commit()
-        return {"session_token": _create_session(user_id)}
+            user_id = (await cur.fetchone())[0]
     except HTTPException:
         raise
     except Exception:
-        conn.rollback()
         raise HTTPException(status_code=500, detail="Failed to create account")
-    finally:
-        cur.close(); conn.close()
+    return {"session_token": await _create_session(user_id)}
+
+
+@router.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    async with get_conn() as conn:
+        await conn.execute(
+            "UPDATE user_sessions SET revoked_at = now() "
+            "WHERE session_token_hash = digest(%s, 'sha256') AND revoked_at IS NULL",
+            (token,)
+        )
+    token_cache.invalidate(token)
+    return {"status": "ok"}
 
 
 @router.get("/me")
-def me(user_id: str = Depends(require_user)):
-    conn = get_conn(); cur = conn.cursor()
-    try:
-        cur.execute(
+async def me(user_id: str = Depends(require_user)):
+    async with get_conn() as conn:
+        cur = await conn.execute(
             """SELECT id, email, display_name, date_of_birth, city, province, gender
                FROM users WHERE id=%s""",
             (user_id,)
         )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        return {
-            "id": str(row[0]),
-            "email": row[1],
-            "display_name": row[2],
-            "date_of_birth": row[3],
-            "city": row[4],
-            "province": row[5],
-            "gender": row[6],
-        }
-    finally:
-        cur.close(); conn.close()
+        row = await cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return {
+        "id": str(row[0]),
+        "email": row[1],
+        "display_name": row[2],
+        "date_of_birth": row[3],
+        "city": row[4],
+        "province": row[5],
+        "gender": row[6],
+    }
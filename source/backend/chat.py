@@ -1,21 +1,23 @@
 import os
-from typing import Optional
-import asyncio
+from typing import Optional, Callable, Awaitable
 import json
 from loguru import logger
-from datetime import date
 
-from .tasks import process_doctor_report
-from .wsocket import ws_manager
+from .jobs import enqueue_report_job, get_report_job
+from .wsocket import ws_manager, BotStreamPublisher
+from .history import history_cache
+from .profiles import profile_cache, Profile, ANONYMOUS
+from .intake import intake_state
 import re
-from agents import SCA, SPA
-from utils import get_conn, require_user, validate_uuid, decode_jwt_token
+from agents import SCA, LLMOverloaded
+from utils import get_conn, require_user, validate_uuid, decode_jwt_token, KeyedLock, encode_cursor, decode_cursor
+from config import settings
 from schemas import StartChat, SendMessage
 
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import (
-    APIRouter, HTTPException, Header, Depends, status,
-    WebSocket, WebSocketDisconnect, BackgroundTasks
+    APIRouter, HTTPException, Header, Depends, Query, status,
+    WebSocket, WebSocketDisconnect
 )
 
 
@@ -23,6 +25,20 @@ security = HTTPBearer()
 router = APIRouter()
 
 
+class ChatAccessDenied(ValueError):
+    """The chat does not exist or belongs to another user."""
+
+
+def _busy(e: LLMOverloaded) -> HTTPException:
+    """Intake turn shed by LLM admission control: tell the client to retry shortly."""
+    logger.warning(f"Shedding chat request: {e}")
+    return HTTPException(
+        status_code=503,
+        detail="The assistant is busy, please try again in a moment",
+        headers={"Retry-After": str(int(e.retry_after))},
+    )
+
+
 @router.post("/start-with-message")
 async def start_chat_with_message(
     body: dict,  # {"content": "user message"}
@@ -32,53 +48,45 @@ async def start_chat_with_message(
     if not content:
         raise HTTPException(status_code=400, detail="Message content is required")
 
-    conn = get_conn()
-    cur = conn.cursor()
     try:
-        conn.autocommit = False
-        cur.execute(
-            """
-            INSERT INTO chat_sessions (user_id, topic, started_at)
-            VALUES (%s::uuid, %s, NOW())
-            RETURNING id
-            """,
-            (user_id, "New Chat"),
-        )
-        chat_id = cur.fetchone()[0]
-        chat_uuid = str(chat_id)
-        logger.info(f"Created chat session {chat_uuid} for user {user_id}")
-
-        # Insert user message
-        cur.execute(
-            """INSERT INTO chat_messages (chat_id, sender, content)
-               VALUES (%s,'user',%s) RETURNING id, created_at""",
-            (chat_uuid, content),
-        )
-        user_msg_id, user_msg_ts = cur.fetchone()
-        logger.debug(f"Saved user_msg_id={user_msg_id}")
-
-        # Get user profile data
-        cur.execute(
-            "SELECT display_name, gender, date_of_birth, province FROM users WHERE id = %s::uuid",
-            (user_id,),
-        )
-        user_row = cur.fetchone()
-        display_name, gender, dob, province = user_row if user_row else ("User", None, None, None)
+        # Session and first message in one statement, committed before any LLM call
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """
+                WITH chat AS (
+                    INSERT INTO chat_sessions (user_id, topic, started_at)
+                    VALUES (%s::uuid, %s, NOW())
+                    RETURNING id
+                )
+                INSERT INTO chat_messages (chat_id, sender, content)
+                SELECT id, 'user', %s FROM chat
+                RETURNING chat_id, id, created_at
+                """,
+                (user_id, "New Chat", content),
+            )
+            chat_id, user_msg_id, user_msg_ts = await cur.fetchone()
+            chat_uuid = str(chat_id)
+            logger.info(f"Created chat session {chat_uuid} for user {user_id}")
+            logger.debug(f"Saved user_msg_id={user_msg_id}")
 
-        age = None
-        if dob:
-            today = date.today()
-            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+            # Get user profile data
+            profile = await profile_cache.load(conn, user_id)
 
-        history_text = f"{display_name}: {content}\nAssistant:"
+        history_text = f"{profile.display_name}: {content}\nAssistant:"
 
+        # The parser only matters if intake decides the report is due, but it
+        # needs nothing from the reply, so start it alongside instead of after.
+        parse_task = (
+            intake_state.advance_in_background(chat_uuid, history_text, profile.display_name)
+            if intake_state.enabled else None
+        )
         try:
             sca_output = await SCA.arun(
                 content=history_text,
-                display_name=display_name,
-                age=age,
-                gender=gender,
-                province=province,
+                display_name=profile.display_name,
+                age=profile.age,
+                gender=profile.gender,
+                province=profile.province,
             )
             reply = sca_output["answer"]
             report = sca_output["report_done"]
@@ -89,33 +97,33 @@ async def start_chat_with_message(
             else:
                 reply = re.sub(r"\([^)]*\)", "", reply).strip()
 
-
+        except LLMOverloaded as e:
+            intake_state.cancel(parse_task)
+            raise _busy(e)
         except Exception as e:
+            intake_state.cancel(parse_task)
             logger.error(f"LLM Intake: {str(e)}")
-            conn.rollback()
             raise HTTPException(status_code=500, detail="Failed to get response from Intake LLM")
 
-        # If parser/doctor report is needed
-        if report:
-            try:
-                parsed = await SPA.arun(content=history_text)
-                parsed["gender"] = gender
-                parsed["age"] = age
-                parsed["province"] = province
-                logger.debug(f"Parsed output: {parsed}")
-            except Exception as e:
-                logger.error(f"LLM intake Parser: {str(e)}")
-                raise HTTPException(status_code=500, detail="Failed to get response from Parser intake LLM")
+        parsed = None
+        if report and parse_task:
+            parsed = await parse_task
+            logger.debug(f"Parsed output: {parsed}")
+        else:
+            intake_state.cancel(parse_task)
 
         # Insert bot message
-        cur.execute(
-            """INSERT INTO chat_messages (chat_id, sender, content)
-               VALUES (%s,'bot',%s) RETURNING id, created_at""",
-            (chat_uuid, reply),
-        )
-        bot_msg_id, bot_msg_ts = cur.fetchone()
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """INSERT INTO chat_messages (chat_id, sender, content)
+                   VALUES (%s,'bot',%s) RETURNING id, created_at""",
+                (chat_uuid, reply),
+            )
+            bot_msg_id, bot_msg_ts = await cur.fetchone()
 
-        conn.commit()
+        # The report pipeline reuses the parse (and stored language) instead of running SPA/LDA again
+        if report:
+            await enqueue_report_job(user_id, chat_uuid, history_text, parsed=parsed)
 
         # Construct response
         messages = [
@@ -123,45 +131,37 @@ async def start_chat_with_message(
             {"id": str(bot_msg_id), "sender": "bot", "content": reply, "created_at": bot_msg_ts},
         ]
 
-        return {"chat_id": chat_uuid, "messages": messages}
+        return {"chat_id": chat_uuid, "messages": messages, "needs_doctor_report": bool(report)}
 
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error in start_chat_with_message: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create chat and send message")
-    finally:
-        cur.close()
-        conn.close()
 
 @router.post("/start")
 async def start_chat(user_id: str = Depends(require_user)):
-    conn = get_conn()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """
-            INSERT INTO chat_sessions (user_id, topic, started_at)
-            VALUES (%s::uuid, %s, NOW())
-            RETURNING id
-            """,
-            (user_id, "New Chat"),
-        )
-        chat_id = cur.fetchone()[0]
-        conn.commit()
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """
+                INSERT INTO chat_sessions (user_id, topic, started_at)
+                VALUES (%s::uuid, %s, NOW())
+                RETURNING id
+                """,
+                (user_id, "New Chat"),
+            )
+            chat_id = (await cur.fetchone())[0]
         logger.info(f"New empty chat session {chat_id} created for user {user_id}")
         return {"chat_id": str(chat_id), "messages": []}
     except Exception as e:
         logger.error(f"Error creating empty chat session: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create chat session")
-    finally:
-        cur.close()
-        conn.close()
 
 
 @router.post("/send")
 async def send_message(
     body: SendMessage,
-    background_tasks: BackgroundTasks,
     user_id: str = Depends(require_user),
 ):
     chat_uuid = str(body.chat_id)
@@ -170,42 +170,31 @@ async def send_message(
     try:
         result = await process_chat_message_logic(user_id, chat_uuid, body.content)
 
-        if ws_manager.has_connections(chat_uuid):
-            await ws_manager.broadcast_to_chat(chat_uuid, {
-                "type": "new_message",
-                "message": {
-                    "id": result["user_message"]["id"],
-                    "sender": "user",
-                    "content": result["user_message"]["content"],
-                    "created_at": result["user_message"]["created_at"].isoformat()
-                }
-            })
+        # Subscribers may be connected to another worker, so always go through the manager
+        await ws_manager.broadcast_to_chat(chat_uuid, {
+            "type": "new_message",
+            "message": {
+                "id": result["user_message"]["id"],
+                "sender": "user",
+                "content": result["user_message"]["content"],
+                "created_at": result["user_message"]["created_at"].isoformat()
+            }
+        })
 
-            await ws_manager.broadcast_to_chat(chat_uuid, {
-                "type": "new_message",
-                "message": {
-                    "id": result["bot_message"]["id"],
-                    "sender": "bot",
-                    "content": result["bot_message"]["content"],
-                    "created_at": result["bot_message"]["created_at"].isoformat()
-                }
-            })
+        await ws_manager.broadcast_to_chat(chat_uuid, {
+            "type": "new_message",
+            "message": {
+                "id": result["bot_message"]["id"],
+                "sender": "bot",
+                "content": result["bot_message"]["content"],
+                "created_at": result["bot_message"]["created_at"].isoformat()
+            }
+        })
 
-        # Handle doctor report
+        # Handle doctor report (durable job; WebSocket clients are notified when it finishes)
         if result["needs_doctor_report"]:
-            if ws_manager.has_connections(chat_uuid):
-                # WebSocket clients get real-time processing
-                background_tasks.add_task(
-                    process_doctor_report_with_websocket_notification,
-                    user_id, chat_uuid, result["history_text"]
-                )
-                reply = result["bot_message"]["content"]  # Keep original response
-            else:
-                # REST-only clients get the old behavior
-                background_tasks.add_task(process_doctor_report, user_id, chat_uuid, result["history_text"])
-                reply = result["bot_message"]["content"]
-        else:
-            reply = result["bot_message"]["content"]
+            await enqueue_report_job(user_id, chat_uuid, result["history_text"], parsed=result["parsed"])
+        reply = result["bot_message"]["content"]
 
         return {
             "reply": reply,
@@ -213,6 +202,10 @@ async def send_message(
             "bot_msg_id": result["bot_message"]["id"]
         }
 
+    except ChatAccessDenied:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    except LLMOverloaded as e:
+        raise _busy(e)
     except Exception as e:
         logger.error(f"[SEND] Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -220,28 +213,57 @@ async def send_message(
 
 
 @router.get("/list")
-def list_chats(user_id: str = Depends(require_user)):
-    conn = get_conn(); cur = conn.cursor()
-    try:
-        cur.execute("""
-            DELETE FROM chat_sessions
-            WHERE user_id=%s::uuid
-              AND id NOT IN (SELECT DISTINCT chat_id FROM chat_messages)
-              AND started_at < NOW() - INTERVAL '5 minutes'
-        """, (user_id,))
-
-        logger.debug(f"[LIST] Deleted {cur.rowcount} old empty sessions for user_id={user_id}")
-        conn.commit()
-
-        # fetch sessions
-        cur.execute("""
-            SELECT id, topic, started_at, ended_at
-            FROM chat_sessions
-            WHERE user_id=%s::uuid
-            ORDER BY started_at DESC
-        """, (user_id,))
-        rows = cur.fetchall()
-        return {"chats": [
+async def list_chats(
+    user_id: str = Depends(require_user),
+    limit: int = Query(settings.CHAT_LIST_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """Newest sessions first.
+
+    ``before`` pages towards older sessions (``next_cursor`` is the
+    ``before`` cursor of the next older page) and ``after`` towards newer
+    ones, e.g. sessions started since the list was loaded; ``cursors``
+    continues in either direction.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    older = decode_cursor(before)
+    newer = decode_cursor(after)
+    # Empty sessions are reaped by backend.janitor; listing is read-only
+    async with get_conn() as conn:
+        if newer:
+            cur = await conn.execute("""
+                SELECT id, topic, started_at, ended_at
+                FROM chat_sessions
+                WHERE user_id=%s::uuid AND (started_at, id) > (%s, %s::uuid)
+                ORDER BY started_at ASC, id ASC
+                LIMIT %s
+            """, (user_id, newer[0], newer[1], limit + 1))
+        elif older:
+            cur = await conn.execute("""
+                SELECT id, topic, started_at, ended_at
+                FROM chat_sessions
+                WHERE user_id=%s::uuid AND (started_at, id) < (%s, %s::uuid)
+                ORDER BY started_at DESC, id DESC
+                LIMIT %s
+            """, (user_id, older[0], older[1], limit + 1))
+        else:
+            cur = await conn.execute("""
+                SELECT id, topic, started_at, ended_at
+                FROM chat_sessions
+                WHERE user_id=%s::uuid
+                ORDER BY started_at DESC, id DESC
+                LIMIT %s
+            """, (user_id, limit + 1))
+        rows = await cur.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newer:
+        rows.reverse()
+    return {
+        "chats": [
             {
                 "chat_id": str(r[0]),
                 "topic": r[1] or "Untitled chat",
@@ -249,53 +271,104 @@ def list_chats(user_id: str = Depends(require_user)):
                 "updated_at": r[3]
             }
             for r in rows
-        ]}
-    finally:
-        cur.close(); conn.close()
+        ],
+        "has_more": has_more,  # in the direction requested (older unless ``after`` was given)
+        "next_cursor": encode_cursor(rows[-1][2], rows[-1][0]) if has_more and not newer else None,
+        "cursors": {
+            "before": encode_cursor(rows[-1][2], rows[-1][0]) if rows else None,
+            "after": encode_cursor(rows[0][2], rows[0][0]) if rows else None,
+        },
+    }
 
 @router.get("/{chat_id}")
-def get_messages(chat_id: str, user_id: str = Depends(require_user)):
+async def get_messages(
+    chat_id: str,
+    user_id: str = Depends(require_user),
+    limit: int = Query(settings.CHAT_MESSAGES_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """Page through a chat in chronological order.
+
+    Without a cursor the latest ``limit`` messages are returned. ``before``
+    pages towards older messages and ``after`` towards newer ones; use the
+    returned ``cursors`` to continue in either direction.
+    """
     validate_uuid(chat_id)
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
     logger.debug(f"[GET] user_id={user_id} requesting chat_id={chat_id}")
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute(
+    older = decode_cursor(before)
+    newer = decode_cursor(after)
+    async with get_conn() as conn:
+        cur = await conn.execute(
             "SELECT 1 FROM chat_sessions WHERE id=%s::uuid AND user_id=%s::uuid",
             (chat_id, user_id),
         )
-        if not cur.fetchone():
+        if not await cur.fetchone():
             logger.warning(f"[GET] Forbidden or Not Found: User {user_id} tried to access chat {chat_id}")
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        cur.execute("""SELECT id, sender, content, created_at
-                       FROM chat_messages
-                       WHERE chat_id=%s ORDER BY created_at ASC""",
-                    (chat_id,))
-
-        messages = []
-        for row in cur.fetchall():
-            messages.append({
-                "id": str(row[0]),
-                "sender": row[1],
-                "content": row[2],
-                "created_at": row[3]
-            })
+        if newer:
+            cur = await conn.execute("""SELECT id, sender, content, created_at
+                           FROM chat_messages
+                           WHERE chat_id=%s AND (created_at, id) > (%s, %s::uuid)
+                           ORDER BY created_at ASC, id ASC
+                           LIMIT %s""",
+                        (chat_id, newer[0], newer[1], limit + 1))
+        elif older:
+            cur = await conn.execute("""SELECT id, sender, content, created_at
+                           FROM chat_messages
+                           WHERE chat_id=%s AND (created_at, id) < (%s, %s::uuid)
+                           ORDER BY created_at DESC, id DESC
+                           LIMIT %s""",
+                        (chat_id, older[0], older[1], limit + 1))
+        else:
+            cur = await conn.execute("""SELECT id, sender, content, created_at
+                           FROM chat_messages
+                           WHERE chat_id=%s
+                           ORDER BY created_at DESC, id DESC
+                           LIMIT %s""",
+                        (chat_id, limit + 1))
+        rows = await cur.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not newer:
+        rows.reverse()
+
+    messages = []
+    for row in rows:
+        messages.append({
+            "id": str(row[0]),
+            "sender": row[1],
+            "content": row[2],
+            "created_at": row[3]
+        })
 
-        logger.debug(f"[GET] Retrieved and processed {len(messages)} messages for chat_id={chat_id}")
-        return {"messages": messages}
-    finally:
-        cur.close()
-        conn.close()
+    logger.debug(f"[GET] Retrieved and processed {len(messages)} messages for chat_id={chat_id}")
+    return {
+        "messages": messages,
+        "has_more": has_more,  # in the direction requested (older unless ``after`` was given)
+        "cursors": {
+            "before": encode_cursor(rows[0][3], rows[0][0]) if rows else None,
+            "after": encode_cursor(rows[-1][3], rows[-1][0]) if rows else None,
+        },
+    }
+
+@router.get("/{chat_id}/report")
+async def get_report_status(chat_id: str, user_id: str = Depends(require_user)):
+    validate_uuid(chat_id)
+    job = await get_report_job(chat_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No doctor report for this chat")
+    return job
 
 @router.delete("/clear")
-def clear_user_chats(user_id: str = Depends(require_user)):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        logger.debug(f"[CLEAR] user_id={user_id} requested chat reset")
-
-        cur.execute("""
+async def clear_user_chats(user_id: str = Depends(require_user)):
+    logger.debug(f"[CLEAR] user_id={user_id} requested chat reset")
+    async with get_conn() as conn:
+        cur = await conn.execute("""
             DELETE FROM chat_messages
             WHERE chat_id IN (
                 SELECT id FROM chat_sessions WHERE user_id = %s::uuid
@@ -303,31 +376,25 @@ def clear_user_chats(user_id: str = Depends(require_user)):
         """, (user_id,))
         logger.debug(f"[CLEAR] Deleted {cur.rowcount} messages for user_id={user_id}")
 
-        cur.execute("DELETE FROM chat_sessions WHERE user_id = %s::uuid", (user_id,))
+        cur = await conn.execute("DELETE FROM chat_sessions WHERE user_id = %s::uuid RETURNING id", (user_id,))
         logger.debug(f"[CLEAR] Deleted {cur.rowcount} chats for user_id={user_id}")
+        for (chat_id,) in await cur.fetchall():
+            history_cache.invalidate(str(chat_id))
 
-        conn.commit()
-        return {"status": "ok", "msg": "Chat history cleared for this user"}
-    finally:
-        cur.close()
-        conn.close()
+    return {"status": "ok", "msg": "Chat history cleared for this user"}
 
 async def verify_chat_access(user_id: str, chat_id: str) -> bool:
     """Verify that user has access to the specified chat"""
-    conn = get_conn()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "SELECT 1 FROM chat_sessions WHERE id=%s::uuid AND user_id=%s::uuid",
-            (chat_id, user_id),
-        )
-        return bool(cur.fetchone())
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                "SELECT 1 FROM chat_sessions WHERE id=%s::uuid AND user_id=%s::uuid",
+                (chat_id, user_id),
+            )
+            return bool(await cur.fetchone())
     except Exception as e:
         logger.error(f"Error verifying chat access: {str(e)}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
 @router.websocket("/ws/{chat_id}")
 async def websocket_endpoint(websocket: WebSocket, chat_id: str):
@@ -343,7 +410,7 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: str):
     # If no authentication, inform client they need to authenticate
     if not user_id:
         try:
-            await websocket.send_json({
+            await ws_manager.send_json(websocket, {
                 "type": "auth_required",
                 "message": "Please authenticate by sending your token"
             })
@@ -357,7 +424,7 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: str):
                 raw_data = await websocket.receive_text()
                 data = json.loads(raw_data)
             except json.JSONDecodeError:
-                await websocket.send_json({
+                await ws_manager.send_json(websocket, {
                     "type": "error",
                     "message": "Invalid JSON format"
                 })
@@ -372,25 +439,24 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: str):
             if message_type == "auth":
                 new_user_id = await handle_websocket_auth(data)
                 if new_user_id:
-                    # Update connection with authenticated user
-                    ws_manager.disconnect(chat_id, websocket, user_id)
+                    # Update connection with authenticated user (socket is already accepted)
                     user_id = new_user_id
-                    await ws_manager.connect(chat_id, websocket, user_id)
+                    ws_manager.identify(websocket, user_id)
 
                     # Verify user has access to this chat
                     if await verify_chat_access(user_id, chat_id):
-                        await websocket.send_json({
+                        await ws_manager.send_json(websocket, {
                             "type": "auth_success",
                             "message": "Authentication successful"
                         })
                     else:
-                        await websocket.send_json({
+                        await ws_manager.send_json(websocket, {
                             "type": "auth_error",
                             "message": "You don't have access to this chat"
                         })
                         break
                 else:
-                    await websocket.send_json({
+                    await ws_manager.send_json(websocket, {
                         "type": "auth_error",
                         "message": "Authentication failed - invalid token"
                     })
@@ -398,7 +464,7 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: str):
 
             # All other message types require authentication
             if not user_id:
-                await websocket.send_json({
+                await ws_manager.send_json(websocket, {
                     "type": "auth_required",
                     "message": "Please authenticate first"
                 })
@@ -410,9 +476,9 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: str):
             elif message_type == "typing":
                 await handle_typing_indicator(chat_id, data, user_id)
             elif message_type == "ping":
-                await websocket.send_json({"type": "pong"})
+                await ws_manager.send_json(websocket, {"type": "pong"})
             else:
-                await websocket.send_json({
+                await ws_manager.send_json(websocket, {
                     "type": "error",
                     "message": f"Unknown message type: {message_type}"
                 })
@@ -424,119 +490,148 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: str):
     finally:
         ws_manager.disconnect(chat_id, websocket, user_id)
 
-locks = {}
-
-# define this once, outside the function
-locks: dict[str, asyncio.Lock] = {}
+# One message per chat at a time (across workers when CHAT_LOCK_DISTRIBUTED is on)
+chat_locks = KeyedLock(
+    "chat",
+    distributed=settings.CHAT_LOCK_DISTRIBUTED,
+    acquire_timeout=settings.CHAT_LOCK_TIMEOUT,
+    pool_size=settings.CHAT_LOCK_POOL_SIZE,
+)
 
-async def process_chat_message_logic(user_id: str, chat_uuid: str, content: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    lock = locks.setdefault(chat_uuid, asyncio.Lock())
+# One round-trip per turn before the LLM call: ownership check, user message
+# insert, profile (skipped when cached) and the transcript delta. The inserted
+# row is not visible to the other CTEs, so it is appended via UNION ALL and is
+# the only row carrying profile columns. No rows back means no access.
+_TURN_SQL = """
+WITH owned AS (
+    SELECT id FROM chat_sessions WHERE id = %(chat_id)s::uuid AND user_id = %(user_id)s::uuid
+), ins AS (
+    INSERT INTO chat_messages (chat_id, sender, content)
+    SELECT id, 'user', %(content)s FROM owned
+    RETURNING id, sender, content, created_at
+), profile AS (
+    SELECT display_name, gender, date_of_birth, province
+    FROM users WHERE %(want_profile)s AND id = %(user_id)s::uuid
+)
+SELECT * FROM (
+    SELECT m.id, m.sender, m.content, m.created_at,
+           false AS is_new, NULL::text AS display_name, NULL::text AS gender,
+           NULL::date AS date_of_birth, NULL::text AS province
+    FROM chat_messages m
+    WHERE m.chat_id = %(chat_id)s::uuid
+      AND m.created_at >= COALESCE(%(since)s::timestamptz, '-infinity')
+      AND EXISTS (SELECT 1 FROM owned)
+    UNION ALL
+    SELECT ins.id, ins.sender, ins.content, ins.created_at,
+           true, p.display_name, p.gender, p.date_of_birth, p.province
+    FROM ins LEFT JOIN profile p ON true
+) t
+ORDER BY created_at ASC, id ASC
+"""
+
+async def process_chat_message_logic(
+    user_id: str,
+    chat_uuid: str,
+    content: str,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+):
+    async with chat_locks.hold(chat_uuid):
+        profile = profile_cache.get(user_id)
+        since = history_cache.since(chat_uuid)
+        # Commits on exit, so the user message is durable and no transaction spans the LLM call
+        async with get_conn() as conn:
+            cur = await conn.execute(_TURN_SQL, {
+                "chat_id": chat_uuid,
+                "user_id": user_id,
+                "content": content,
+                "want_profile": profile is None,
+                "since": since,
+            })
+            rows = await cur.fetchall()
+            if not rows:
+                raise ChatAccessDenied("Chat not found or access denied")
+
+            new_row = next(r for r in rows if r[4])
+            user_msg_id, user_msg_ts = new_row[0], new_row[3]
+            if profile is None:
+                if new_row[5] is not None:
+                    profile = Profile(*new_row[5:9])
+                    profile_cache.put(user_id, profile)
+                else:
+                    profile = ANONYMOUS
+
+            # Bring the cached transcript up to date (now includes the latest user message)
+            history = history_cache.merge(chat_uuid, profile.display_name, since, [r[:4] for r in rows])
+            if history is None:
+                history = await history_cache.sync(conn, chat_uuid, profile.display_name)
+            history_text = history.text
+
+        # On some turns, parse the transcript alongside the reply in case it makes the report due
+        intake_task = (
+            intake_state.advance_in_background(chat_uuid, history_text, profile.display_name)
+            if intake_state.should_speculate(history.user_turns) else None
+        )
 
-    async with lock:
+        # Get LLM response (recent turns verbatim, older ones summarised)
         try:
-            # Ownership check
-            cur.execute(
-                "SELECT 1 FROM chat_sessions WHERE id=%s::uuid AND user_id=%s::uuid",
-                (chat_uuid, user_id),
-            )
-            if not cur.fetchone():
-                raise ValueError("Chat not found or access denied")
-
-            # Insert user message + commit early
-            cur.execute(
-                """INSERT INTO chat_messages (chat_id, sender, content)
-                   VALUES (%s,'user',%s) RETURNING id, created_at""",
-                (chat_uuid, content),
-            )
-            user_msg_id, user_msg_ts = cur.fetchone()
-            conn.commit()
-
-            # Fetch chat history (now includes the latest user message)
-            cur.execute("""
-                SELECT cm.sender, cm.content, u.display_name
-                FROM chat_messages cm
-                JOIN chat_sessions cs ON cm.chat_id = cs.id
-                JOIN users u ON cs.user_id = u.id
-                WHERE cm.chat_id = %s
-                ORDER BY cm.created_at ASC
-            """, (chat_uuid,))
-            history = cur.fetchall()
-            history_text = ""
-            for sender, msg_content, display_name in history:
-                prefix = display_name if sender == "user" else "Assistant"
-                history_text += f"{prefix}: {msg_content}\n"
-
-            # Fetch user profile
-            cur.execute(
-                "SELECT display_name, gender, date_of_birth, province FROM users WHERE id=%s::uuid",
-                (user_id,),
-            )
-            user_row = cur.fetchone()
-            display_name, gender, dob, province = user_row if user_row else ("User", None, None, None)
-
-            # Compute age
-            age = None
-            if dob:
-                today = date.today()
-                age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-
-            # Get LLM response
-            sca_output = await SCA.arun(
-                content=history_text,
-                display_name=display_name,
-                age=age,
-                gender=gender,
-                province=province,
+            sca_output = await SCA.arun_history(
+                chat_uuid,
+                history.lines,
+                on_delta=on_delta,
+                display_name=profile.display_name,
+                age=profile.age,
+                gender=profile.gender,
+                province=profile.province,
             )
-            reply = sca_output["answer"]
-            report = sca_output['report_done']
-            translation = sca_output['translation']
-
-            if translation and f"({translation})" in reply:
-                reply = reply.replace(f"({translation})", "").strip()
-            else:
-                reply = re.sub(r"\([^)]*\)", "", reply).strip()
+        except BaseException:
+            intake_state.cancel(intake_task)
+            raise
+        reply = sca_output["answer"]
+        report = sca_output['report_done']
+        translation = sca_output['translation']
+
+        if translation and f"({translation})" in reply:
+            reply = reply.replace(f"({translation})", "").strip()
+        else:
+            reply = re.sub(r"\([^)]*\)", "", reply).strip()
 
-            # Dedup safeguard
-            if history and reply.strip() == history[-1][1].strip():
-                reply += " (sanes pangulangan, punten diparios deui)"
+        # Dedup safeguard
+        if history and reply.strip() == history.last_content.strip():
+            reply += " (sanes pangulangan, punten diparios deui)"
 
-            needs_doctor_report = bool(report)
+        needs_doctor_report = bool(report)
+        parsed = None
+        if needs_doctor_report and intake_task:
+            parsed = await intake_task
+        else:
+            intake_state.cancel(intake_task)
 
-            # Insert bot reply
-            cur.execute(
+        # Insert bot reply
+        async with get_conn() as conn:
+            cur = await conn.execute(
                 """INSERT INTO chat_messages (chat_id, sender, content)
                    VALUES (%s,'bot',%s) RETURNING id, created_at""",
                 (chat_uuid, reply),
             )
-            bot_msg_id, bot_msg_ts = cur.fetchone()
-            conn.commit()
-
-            return {
-                "user_message": {
-                    "id": str(user_msg_id),
-                    "sender": "user",
-                    "content": content,
-                    "created_at": user_msg_ts
-                },
-                "bot_message": {
-                    "id": str(bot_msg_id),
-                    "sender": "bot",
-                    "content": reply,
-                    "created_at": bot_msg_ts
-                },
-                "needs_doctor_report": needs_doctor_report,
-                "history_text": history_text
-            }
+            bot_msg_id, bot_msg_ts = await cur.fetchone()
 
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cur.close()
-            conn.close()
+        return {
+            "user_message": {
+                "id": str(user_msg_id),
+                "sender": "user",
+                "content": content,
+                "created_at": user_msg_ts
+            },
+            "bot_message": {
+                "id": str(bot_msg_id),
+                "sender": "bot",
+                "content": reply,
+                "created_at": bot_msg_ts
+            },
+            "needs_doctor_report": needs_doctor_report,
+            "history_text": history_text,
+            "parsed": parsed
+        }
 
 
 async def get_user_from_websocket(websocket: WebSocket) -> Optional[str]:
@@ -545,7 +640,7 @@ async def get_user_from_websocket(websocket: WebSocket) -> Optional[str]:
     token = query_params.get("token")
 
     if token:
-        user_id = decode_jwt_token(token)
+        user_id = await decode_jwt_token(token)
         logger.debug(f"[get_user_from_websocket] token={token} -> user_id={user_id}")
         if user_id:
             return user_id
@@ -553,7 +648,7 @@ async def get_user_from_websocket(websocket: WebSocket) -> Optional[str]:
     # fallback to Authorization header
     auth_header = websocket.headers.get("authorization")
     if auth_header:
-        user_id = decode_jwt_token(auth_header)
+        user_id = await decode_jwt_token(auth_header)
         if user_id:
             return user_id
 
@@ -563,21 +658,15 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: str, data: dic
     """Handle incoming chat message via WebSocket (now requires user_id)"""
     content = data.get("content", "").strip()
     if not content:
-        await websocket.send_json({
+        await ws_manager.send_json(websocket, {
             "type": "error",
             "message": "Message content is required"
         })
         return
 
+    # Streams the reply to subscribers as it generates; the handlers below discard its draft
+    stream = BotStreamPublisher(chat_id)
     try:
-        # Verify user still has access
-        if not await verify_chat_access(user_id, chat_id):
-            await websocket.send_json({
-                "type": "error",
-                "message": "Access denied to this chat"
-            })
-            return
-
         # Send typing indicator
         await ws_manager.broadcast_to_chat(chat_id, {
             "type": "typing",
@@ -586,7 +675,21 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: str, data: dic
         }, exclude_websocket=websocket)
 
         # Process message ONCE
-        result = await process_chat_message_logic(user_id, chat_id, content)
+        try:
+            # Access is re-checked inside the same statement that stores the message
+            result = await process_chat_message_logic(user_id, chat_id, content, on_delta=stream)
+        except ChatAccessDenied:
+            await ws_manager.broadcast_to_chat(chat_id, {
+                "type": "typing",
+                "sender": "bot",
+                "is_typing": False
+            })
+            await ws_manager.send_json(websocket, {
+                "type": "error",
+                "message": "Access denied to this chat"
+            })
+            return
+        await stream.flush()
 
         # Stop typing indicator
         await ws_manager.broadcast_to_chat(chat_id, {
@@ -596,7 +699,7 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: str, data: dic
         })
 
         # Send confirmation + broadcast
-        await websocket.send_json({
+        await ws_manager.send_json(websocket, {
             "type": "message_sent",
             "message": {
                 "id": result["user_message"]["id"],
@@ -618,6 +721,7 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: str, data: dic
 
         await ws_manager.broadcast_to_chat(chat_id, {
             "type": "new_message",
+            "stream_id": stream.stream_id,
             "message": {
                 "id": result["bot_message"]["id"],
                 "sender": "bot",
@@ -628,19 +732,33 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: str, data: dic
 
         # Doctor report
         if result["needs_doctor_report"]:
-            asyncio.create_task(
-                process_doctor_report_with_websocket_notification(
-                    user_id, chat_id, result["history_text"]
-                )
-            )
+            await enqueue_report_job(user_id, chat_id, result["history_text"], parsed=result["parsed"])
             await ws_manager.send_to_user(user_id, chat_id, {
                 "type": "doctor_report_processing",
                 "message": "Your data is being processed by our doctor. You'll be notified when ready."
             })
 
+    except LLMOverloaded:
+        await stream.discard()
+        await ws_manager.broadcast_to_chat(chat_id, {
+            "type": "typing",
+            "sender": "bot",
+            "is_typing": False
+        })
+        await ws_manager.send_json(websocket, {
+            "type": "error",
+            "message": "The assistant is busy, please try again in a moment"
+        })
     except Exception as e:
         logger.error(f"Error processing WebSocket message: {str(e)}")
-        await websocket.send_json({
+        # A reply that failed mid-stream leaves a draft no new_message will replace
+        await stream.discard()
+        await ws_manager.broadcast_to_chat(chat_id, {
+            "type": "typing",
+            "sender": "bot",
+            "is_typing": False
+        })
+        await ws_manager.send_json(websocket, {
             "type": "error",
             "message": "Failed to process message"
         })
@@ -665,32 +783,10 @@ async def handle_websocket_auth(data: dict) -> Optional[str]:
         logger.warning("WebSocket auth message missing token")
         return None
 
-    user_id = decode_jwt_token(token)
+    user_id = await decode_jwt_token(token)
     if user_id:
         logger.info(f"WebSocket authenticated via message for user: {user_id}")
         return user_id
     else:
         logger.warning("WebSocket auth failed - invalid token")
         return None
-
-async def process_doctor_report_with_websocket_notification(user_id: str, chat_id: str, history_text: str):
-    """Process doctor report and notify via WebSocket when complete"""
-    try:
-
-        await process_doctor_report(user_id, chat_id, history_text)
-
-        await ws_manager.send_to_user(user_id, chat_id, {
-            "type": "doctor_report_ready",
-            "message": "Your doctor report is now available.",
-            "action": "reload_chat"
-        })
-
-        logger.info(f"Doctor report completed and user {user_id} notified via WebSocket")
-
-    except Exception as e:
-        logger.error(f"Doctor report processing error: {str(e)}")
-        await ws_manager.send_to_user(user_id, chat_id, {
-            "type": "doctor_report_error",
-            "message": "Failed to process doctor report. Please try again."
-        })
-
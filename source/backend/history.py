@@ -0,0 +1,205 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from psycopg import AsyncConnection
+from config import settings
+
+
+class ChatHistory:
+    """Rolling transcript of one chat, extended with only the rows added since the last sync."""
+
+    __slots__ = ("messages", "display_name", "_lines", "_text", "mark", "window", "recent", "touched")
+
+    def __init__(self, display_name: str, window: timedelta = timedelta(seconds=30)):
+        self.messages: List[Tuple[str, str]] = []  # (sender, content)
+        self.display_name = display_name
+        self._lines: List[str] = []
+        self._text: Optional[str] = ""
+        self.mark: Optional[datetime] = None  # created_at of the newest row seen
+        self.window = window
+        # Rows seen with created_at inside the window before ``mark``, to skip when re-read
+        self.recent: Dict[str, datetime] = {}
+        self.touched = time.monotonic()
+
+    def _render(self, sender: str, content: str) -> str:
+        prefix = self.display_name if sender == "user" else "Assistant"
+        return f"{prefix}: {content}\n"
+
+    def append(self, msg_id: str, sender: str, content: str, created_at: datetime):
+        self.messages.append((sender, content))
+        self._lines.append(self._render(sender, content))
+        self._text = None
+        self.recent[msg_id] = created_at
+        if self.mark is None or created_at > self.mark:
+            self.mark = created_at
+            floor = self.since
+            self.recent = {k: v for k, v in self.recent.items() if v >= floor}
+
+    @property
+    def since(self) -> Optional[datetime]:
+        """Lower bound for the next delta.
+
+        ``created_at`` is the start of the inserting transaction, so a row can
+        commit after a delta has read past its timestamp (the report insert,
+        a turn on another worker). Re-reading ``window`` before the newest row
+        seen picks such rows up; ``recent`` drops the ones already held.
+        """
+        return self.mark - self.window if self.mark is not None else None
+
+    def rename(self, display_name: str):
+        if display_name != self.display_name:
+            self.display_name = display_name
+            self._lines = [self._render(s, c) for s, c in self.messages]
+            self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._lines)
+        return self._text
+
+    @property
+    def lines(self) -> List[str]:
+        return self._lines
+
+    @property
+    def user_turns(self) -> int:
+        return sum(1 for sender, _ in self.messages if sender == "user")
+
+    @property
+    def last_content(self) -> Optional[str]:
+        return self.messages[-1][1] if self.messages else None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+
+class ChatHistoryCache:
+    """Per-process LRU of chat transcripts.
+
+    ``sync`` fetches only messages from shortly before the newest
+    ``created_at`` already held (``delta_window`` seconds), so a turn costs
+    one indexed delta query instead of re-reading and re-joining the whole
+    chat. Rows written by other workers or by the report pipeline are picked
+    up by the same delta, including ones that committed late.
+    """
+
+    def __init__(self, max_chats: int = 1000, idle_ttl: float = 3600.0, delta_window: float = 30.0):
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        self.delta_window = timedelta(seconds=delta_window)
+        self._chats: "OrderedDict[str, ChatHistory]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rows_loaded = 0
+
+    def _live(self, chat_id: str, now: float) -> Optional[ChatHistory]:
+        history = self._chats.get(chat_id)
+        if history is not None and now - history.touched > self.idle_ttl:
+            self._chats.pop(chat_id, None)
+            history = None
+        return history
+
+    def since(self, chat_id: str) -> Optional[datetime]:
+        """Where the next delta should start, or None if the whole chat must be read."""
+        history = self._live(chat_id, time.monotonic())
+        return history.since if history is not None else None
+
+    def merge(self, chat_id: str, display_name: str, since: Optional[datetime], rows) -> Optional[ChatHistory]:
+        """Apply rows fetched elsewhere (``created_at >= since``, or the whole chat when None).
+
+        Returns None if the cached transcript moved away from ``since`` in the
+        meantime (e.g. it was evicted); the caller should ``sync`` instead.
+        """
+        now = time.monotonic()
+        history = self._live(chat_id, now)
+        if since is None:
+            self.misses += 1
+            history = ChatHistory(display_name, self.delta_window)
+        elif history is None or history.since != since:
+            return None
+        else:
+            self.hits += 1
+            history.rename(display_name)
+        self._store(chat_id, history, rows, now)
+        return history
+
+    async def sync(self, conn: AsyncConnection, chat_id: str, display_name: str) -> ChatHistory:
+        now = time.monotonic()
+        history = self._live(chat_id, now)
+
+        if history is None:
+            self.misses += 1
+            history = ChatHistory(display_name, self.delta_window)
+            cur = await conn.execute(
+                """SELECT id, sender, content, created_at
+                   FROM chat_messages
+                   WHERE chat_id = %s
+                   ORDER BY created_at ASC, id ASC""",
+                (chat_id,),
+            )
+        else:
+            self.hits += 1
+            history.rename(display_name)
+            cur = await conn.execute(
+                """SELECT id, sender, content, created_at
+                   FROM chat_messages
+                   WHERE chat_id = %s AND created_at >= %s
+                   ORDER BY created_at ASC, id ASC""",
+                (chat_id, history.since),
+            )
+
+        self._store(chat_id, history, await cur.fetchall(), now)
+        return history
+
+    def _store(self, chat_id: str, history: ChatHistory, rows, now: float):
+        self.extend(history, rows)
+        history.touched = now
+        self._chats[chat_id] = history
+        self._chats.move_to_end(chat_id)
+        self._evict()
+
+    def extend(self, history: ChatHistory, rows):
+        for msg_id, sender, content, created_at in rows:
+            msg_id = str(msg_id)
+            if msg_id in history.recent:
+                continue
+            history.append(msg_id, sender, content, created_at)
+            self.rows_loaded += 1
+
+    def get(self, chat_id: str) -> Optional[ChatHistory]:
+        return self._chats.get(chat_id)
+
+    def invalidate(self, chat_id: str):
+        self._chats.pop(chat_id, None)
+
+    def clear(self):
+        self._chats.clear()
+
+    def _evict(self):
+        while len(self._chats) > self.max_chats:
+            chat_id, _ = self._chats.popitem(last=False)
+            self.evictions += 1
+            logger.debug(f"[history] evicted chat {chat_id}")
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self._chats),
+            "max_chats": self.max_chats,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rows_loaded": self.rows_loaded,
+        }
+
+
+history_cache = ChatHistoryCache(
+    max_chats=settings.HISTORY_CACHE_MAX_CHATS,
+    idle_ttl=settings.HISTORY_CACHE_IDLE_TTL,
+    delta_window=settings.HISTORY_DELTA_WINDOW,
+)
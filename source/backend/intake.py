@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+from psycopg.types.json import Jsonb
+
+from agents import SPA, LDA
+from utils import get_conn
+from config import settings
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IntakeStateStore:
+    """Per-chat structured intake (SPA parse, LDA title/language) in ``chat_intake_state``.
+
+    ``advance`` can run alongside an intake reply and record the parse and
+    language of the transcript so far; the report pipeline's ``report_parse``
+    and ``report_language`` then only call an agent when nothing stored
+    matches their transcript. Speculating costs a full-transcript parse, so
+    it only happens on the turns ``should_speculate`` picks, and the caller
+    cancels it when the reply does not make the report due.
+    """
+
+    def __init__(self, enabled: bool = True, min_turns: int = 4, every: int = 2):
+        self.enabled = enabled
+        self.min_turns = min_turns
+        self.every = max(1, every)
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.speculated = 0
+        self.cancelled = 0
+        self.parses = 0
+        self.detections = 0
+        self.parse_hits = 0
+        self.detect_hits = 0
+        self.errors = 0
+
+    async def _load(self, chat_id: str) -> Optional[tuple]:
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                "SELECT parsed, parsed_hash, tandlang, tandlang_hash FROM chat_intake_state WHERE chat_id = %s::uuid",
+                (chat_id,),
+            )
+            return await cur.fetchone()
+
+    async def _store_parse(self, chat_id: str, parsed: dict, digest: str, length: int):
+        async with get_conn() as conn:
+            await conn.execute(
+                """
+                INSERT INTO chat_intake_state (chat_id, parsed, parsed_hash, parsed_len)
+                VALUES (%s::uuid, %s, %s, %s)
+                ON CONFLICT (chat_id) DO UPDATE
+                   SET parsed = EXCLUDED.parsed, parsed_hash = EXCLUDED.parsed_hash,
+                       parsed_len = EXCLUDED.parsed_len, updated_at = now()
+                 WHERE chat_intake_state.parsed_len <= EXCLUDED.parsed_len
+                """,
+                (chat_id, Jsonb(parsed), digest, length),
+            )
+
+    async def _store_tandlang(self, chat_id: str, tandlang: dict, digest: str):
+        async with get_conn() as conn:
+            await conn.execute(
+                """
+                INSERT INTO chat_intake_state (chat_id, tandlang, tandlang_hash)
+                VALUES (%s::uuid, %s, %s)
+                ON CONFLICT (chat_id) DO UPDATE
+                   SET tandlang = EXCLUDED.tandlang, tandlang_hash = EXCLUDED.tandlang_hash,
+                       updated_at = now()
+                """,
+                (chat_id, Jsonb(tandlang), digest),
+            )
+
+    async def _parse(self, chat_id: str, history_text: str, digest: str) -> Optional[dict]:
+        parsed = await SPA.arun(content=history_text)
+        self.parses += 1
+        if parsed:
+            await self._store_parse(chat_id, parsed, digest, len(history_text))
+        return parsed
+
+    async def _detect(self, chat_id: str, history_text: str, digest: str, display_name: str) -> Optional[dict]:
+        tandlang = await LDA.arun(content=history_text, display_name=display_name)
+        self.detections += 1
+        if tandlang:
+            await self._store_tandlang(chat_id, tandlang, digest)
+        return tandlang
+
+    async def _resolve(
+        self, chat_id: str, history_text: str, display_name: str, parsed: Optional[dict] = None
+    ) -> Tuple[Optional[dict], Optional[dict]]:
+        digest = content_hash(history_text)
+        row = await self._load(chat_id)
+        stored_parsed, parsed_hash, tandlang, tandlang_hash = row if row else (None, None, None, None)
+
+        if parsed is None and stored_parsed is not None and parsed_hash == digest:
+            parsed = stored_parsed
+            self.parse_hits += 1
+        if tandlang is not None and tandlang_hash == digest:
+            self.detect_hits += 1
+        else:
+            tandlang = None
+
+        parse = self._parse(chat_id, history_text, digest) if parsed is None else None
+        detect = self._detect(chat_id, history_text, digest, display_name) if tandlang is None else None
+        results = await asyncio.gather(*(c for c in (parse, detect) if c is not None))
+        results = iter(results)
+        if parse is not None:
+            parsed = next(results)
+        if detect is not None:
+            tandlang = next(results)
+        return parsed, tandlang
+
+    async def advance(self, chat_id: str, history_text: str, display_name: str) -> Optional[dict]:
+        """Bring the chat's intake state up to ``history_text``; returns the parse (None on failure)."""
+        try:
+            parsed, _ = await self._resolve(chat_id, history_text, display_name)
+            return parsed
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"[intake] state update failed for chat {chat_id}: {e}")
+            return None
+
+    def should_speculate(self, user_turns: int) -> bool:
+        """Whether a turn with ``user_turns`` user messages is worth a speculative parse.
+
+        Reports are rarely due before ``min_turns``; after that every
+        ``every``-th turn is parsed, so a chat pays for a fraction of its turns
+        rather than all of them. Other turns leave the parse to the report job.
+        """
+        return (
+            self.enabled
+            and user_turns >= self.min_turns
+            and (user_turns - self.min_turns) % self.every == 0
+        )
+
+    def advance_in_background(self, chat_id: str, history_text: str, display_name: str) -> asyncio.Task:
+        """Start ``advance``; a still-running update of the same chat is superseded."""
+        previous = self._inflight.get(chat_id)
+        if previous is not None:
+            self.cancel(previous)
+        task = asyncio.create_task(self.advance(chat_id, history_text, display_name), name=f"intake-{chat_id}")
+        self._inflight[chat_id] = task
+        self.speculated += 1
+
+        def _done(t: asyncio.Task):
+            if self._inflight.get(chat_id) is t:
+                del self._inflight[chat_id]
+
+        task.add_done_callback(_done)
+        return task
+
+    def cancel(self, task: Optional[asyncio.Task]):
+        """Drop a speculative update whose result is not needed (no report due)."""
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    async def report_parse(self, chat_id: str, history_text: str, parsed: Optional[dict] = None) -> dict:
+        """Parse of ``history_text`` for the report: given, stored, or computed now."""
+        if parsed is None:
+            digest = content_hash(history_text)
+            row = await self._load(chat_id)
+            if row and row[0] is not None and row[1] == digest:
+                parsed = row[0]
+                self.parse_hits += 1
+            else:
+                parsed = await self._parse(chat_id, history_text, digest)
+        if not parsed:
+            raise RuntimeError("Intake parser returned no output")
+        # Copy: callers add fields, and a job payload is reused on retry
+        return dict(parsed)
+
+    async def report_language(self, chat_id: str, history_text: str, display_name: str) -> dict:
+        """Title/language of ``history_text`` for the report: stored for this transcript, or detected now.
+
+        LDA picks the dominant language of the whole conversation, so a
+        detection made on an earlier, shorter transcript is not reused.
+        """
+        digest = content_hash(history_text)
+        row = await self._load(chat_id)
+        if row and row[2] is not None and row[3] == digest:
+            self.detect_hits += 1
+            return dict(row[2])
+        return dict(await self._detect(chat_id, history_text, digest, display_name) or {})
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "speculated": self.speculated,
+            "cancelled": self.cancelled,
+            "parses": self.parses,
+            "detections": self.detections,
+            "parse_hits": self.parse_hits,
+            "detect_hits": self.detect_hits,
+            "errors": self.errors,
+        }
+
+
+intake_state = IntakeStateStore(
+    enabled=settings.INTAKE_SPECULATIVE_PARSE,
+    min_turns=settings.INTAKE_SPECULATE_MIN_TURNS,
+    every=settings.INTAKE_SPECULATE_EVERY,
+)
@@ -0,0 +1,123 @@
+import asyncio
+import random
+from typing import Optional
+
+from loguru import logger
+
+from config import settings
+from utils import get_conn
+
+_STATE = "empty_sessions"
+
+
+class SessionJanitor:
+    """Deletes chat sessions that stayed empty past a grace period.
+
+    Sessions are visited once, in ``(started_at, id)`` order from a cursor
+    kept in ``janitor_state``; a session that ever received a message is
+    never revisited. Each batch is one short transaction, and the state row
+    is claimed with ``SKIP LOCKED`` so only one worker cleans at a time.
+    """
+
+    def __init__(self, interval: float = 300.0, grace: float = 300.0, batch_size: int = 500):
+        self.interval = interval
+        self.grace = grace
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.scanned = 0
+        self.deleted = 0
+
+    async def _batch(self) -> Optional[int]:
+        """Process one batch; returns sessions scanned, or None if another worker holds the state."""
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """
+                WITH state AS (
+                    SELECT cursor_ts, cursor_id FROM janitor_state
+                     WHERE name = %(name)s
+                     FOR UPDATE SKIP LOCKED
+                ), batch AS (
+                    SELECT cs.id, cs.started_at
+                      FROM chat_sessions cs, state
+                     WHERE (cs.started_at, cs.id) > (state.cursor_ts, state.cursor_id)
+                       AND cs.started_at < now() - make_interval(secs => %(grace)s)
+                     ORDER BY cs.started_at, cs.id
+                     LIMIT %(limit)s
+                ), deleted AS (
+                    DELETE FROM chat_sessions d
+                     USING batch b
+                     WHERE d.id = b.id
+                       AND NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.chat_id = b.id)
+                    RETURNING d.id
+                ), advanced AS (
+                    UPDATE janitor_state
+                       SET cursor_ts = last.started_at, cursor_id = last.id, updated_at = now()
+                      FROM (SELECT started_at, id FROM batch ORDER BY started_at DESC, id DESC LIMIT 1) last
+                     WHERE name = %(name)s
+                    RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM state),
+                       (SELECT count(*) FROM batch),
+                       (SELECT count(*) FROM deleted)
+                """,
+                {"name": _STATE, "grace": self.grace, "limit": self.batch_size},
+            )
+            claimed, scanned, deleted = await cur.fetchone()
+        if not claimed:
+            return None
+        self.scanned += scanned
+        self.deleted += deleted
+        if deleted:
+            logger.debug(f"[janitor] deleted {deleted} empty sessions")
+        return scanned
+
+    async def run_once(self) -> int:
+        """Sweep until caught up with the grace cutoff; returns sessions deleted."""
+        before = self.deleted
+        while True:
+            scanned = await self._batch()
+            if scanned is None or scanned < self.batch_size:
+                break
+            await asyncio.sleep(0)
+        self.runs += 1
+        return self.deleted - before
+
+    async def run(self):
+        logger.info(f"[janitor] started (interval={self.interval}s, grace={self.grace}s)")
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"[janitor] sweep failed: {e}")
+            # Jitter so workers don't contend for the state row in lockstep
+            await asyncio.sleep(self.interval * random.uniform(0.8, 1.2))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="session-janitor")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "runs": self.runs,
+            "scanned": self.scanned,
+            "deleted": self.deleted,
+        }
+
+
+session_janitor = SessionJanitor(
+    interval=settings.JANITOR_INTERVAL,
+    grace=settings.EMPTY_SESSION_GRACE,
+    batch_size=settings.JANITOR_BATCH_SIZE,
+)
@@ -0,0 +1,366 @@
+import asyncio
+import os
+import random
+import socket
+from typing import Dict, Optional
+
+from loguru import logger
+from psycopg.types.json import Jsonb
+
+from agents import MDA
+from config import settings
+from utils import get_conn, connect_dedicated
+from .tasks import generate_doctor_report, report_timings
+from .wsocket import ws_manager, BotStreamPublisher
+
+REPORT_CHANNEL = "report_jobs"
+
+
+def _report_key(chat_id: str) -> str:
+    return f"doctor_report:{chat_id}"
+
+
+def _endpoint() -> str:
+    # Reports are bounded by the slowest model they call (MedGEMMA)
+    return MDA.base_url or "default"
+
+
+async def enqueue_report_job(
+    user_id: str, chat_id: str, history_text: str, parsed: Optional[dict] = None
+) -> Optional[str]:
+    """Queue the doctor report for a chat.
+
+    Idempotent per chat: while a job is queued, running or done, repeated
+    calls are no-ops; a job that exhausted its retries is re-armed with
+    the latest transcript. ``parsed`` is an SPA result already computed for
+    ``history_text``; the worker uses it instead of parsing again.
+    """
+    payload = {"history_text": history_text}
+    if parsed:
+        payload["parsed"] = parsed
+    async with get_conn() as conn:
+        cur = await conn.execute(
+            """
+            INSERT INTO report_jobs (chat_id, user_id, idempotency_key, endpoint, payload, max_attempts)
+            VALUES (%s::uuid, %s::uuid, %s, %s, %s, %s)
+            ON CONFLICT (idempotency_key) DO UPDATE
+               SET status = 'queued', attempts = 0, run_after = now(),
+                   payload = EXCLUDED.payload, last_error = NULL,
+                   locked_by = NULL, locked_at = NULL, finished_at = NULL, updated_at = now()
+             WHERE report_jobs.status = 'failed'
+            RETURNING id
+            """,
+            (
+                chat_id, user_id, _report_key(chat_id), _endpoint(),
+                Jsonb(payload), settings.REPORT_JOB_MAX_ATTEMPTS,
+            ),
+        )
+        row = await cur.fetchone()
+        if row:
+            await conn.execute(f"NOTIFY {REPORT_CHANNEL}")
+    if row:
+        logger.info(f"[jobs] queued doctor report {row[0]} for chat {chat_id}")
+        report_worker.wake()
+        return str(row[0])
+    logger.info(f"[jobs] doctor report for chat {chat_id} already queued or done")
+    return None
+
+
+async def get_report_job(chat_id: str, user_id: str) -> Optional[dict]:
+    async with get_conn() as conn:
+        cur = await conn.execute(
+            """
+            SELECT id, status, attempts, max_attempts, run_after, last_error,
+                   created_at, updated_at, finished_at
+            FROM report_jobs
+            WHERE idempotency_key = %s AND user_id = %s::uuid
+            """,
+            (_report_key(chat_id), user_id),
+        )
+        row = await cur.fetchone()
+    if not row:
+        return None
+    return {
+        "job_id": str(row[0]),
+        "status": row[1],
+        "attempts": row[2],
+        "max_attempts": row[3],
+        "next_attempt_at": row[4] if row[1] == "queued" else None,
+        "last_error": row[5],
+        "created_at": row[6],
+        "updated_at": row[7],
+        "finished_at": row[8],
+    }
+
+
+class ReportWorker:
+    """Claims report jobs from PostgreSQL and runs them with bounded concurrency.
+
+    Any number of workers (the API process and/or ``python -m backend.worker``)
+    can share the table: claims use ``FOR UPDATE SKIP LOCKED`` and are
+    serialised by an advisory lock so per-endpoint limits hold globally.
+    Failed jobs are retried with exponential backoff and jitter; jobs whose
+    worker died are put back once their lock is older than ``job_timeout``.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        endpoint_limit: int,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        poll_interval: float = 2.0,
+        job_timeout: float = 900.0,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+    ):
+        self.concurrency = concurrency
+        self.endpoint_limit = endpoint_limit
+        self.endpoint_limits = endpoint_limits or {}
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+        self.claimed = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.leases_lost = 0
+
+    def _limit_for(self, endpoint: str) -> int:
+        return self.endpoint_limits.get(endpoint, self.endpoint_limit)
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _reap_stale(self):
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """
+                UPDATE report_jobs
+                   SET status = 'queued', locked_by = NULL, locked_at = NULL,
+                       run_after = now(), updated_at = now(),
+                       last_error = 'worker lost'
+                 WHERE status = 'running'
+                   AND locked_at < now() - make_interval(secs => %s)
+                """,
+                (self.job_timeout * 2,),
+            )
+            if cur.rowcount:
+                logger.warning(f"[jobs] requeued {cur.rowcount} stale report jobs")
+
+    async def _claim(self) -> Optional[tuple]:
+        async with get_conn() as conn:
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (REPORT_CHANNEL,))
+            cur = await conn.execute(
+                "SELECT endpoint, count(*) FROM report_jobs WHERE status = 'running' GROUP BY endpoint"
+            )
+            busy = [ep for ep, n in await cur.fetchall() if n >= self._limit_for(ep)]
+            cur = await conn.execute(
+                """
+                UPDATE report_jobs
+                   SET status = 'running', attempts = attempts + 1,
+                       locked_by = %s, locked_at = now(), updated_at = now()
+                 WHERE id = (
+                       SELECT id FROM report_jobs
+                        WHERE status = 'queued' AND run_after <= now()
+                          AND NOT (endpoint = ANY(%s))
+                        ORDER BY run_after
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED)
+                RETURNING id, chat_id, user_id, payload, attempts, max_attempts
+                """,
+                (self.worker_id, busy),
+            )
+            return await cur.fetchone()
+
+    async def _complete(self, job_id, chat_id: str, report: str) -> tuple:
+        # Message insert and job completion commit together, so a crash
+        # between them can't produce a duplicate report on retry.
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """UPDATE report_jobs
+                      SET status = 'succeeded', finished_at = now(), updated_at = now(),
+                          locked_by = NULL, locked_at = NULL, last_error = NULL
+                    WHERE id = %s AND status = 'running' AND locked_by = %s
+                RETURNING id""",
+                (job_id, self.worker_id),
+            )
+            if not await cur.fetchone():
+                raise RuntimeError("job lease lost before completion")
+            cur = await conn.execute(
+                "INSERT INTO chat_messages (chat_id, sender, content) VALUES (%s,'bot',%s) RETURNING id, created_at",
+                (chat_id, report),
+            )
+            return await cur.fetchone()
+
+    async def _fail(self, job_id, attempts: int, max_attempts: int, error: str) -> Optional[bool]:
+        """Record a failed attempt; returns True if the job will be retried.
+
+        Returns None if this worker no longer holds the job (reaped as stale,
+        re-claimed or finished elsewhere), in which case nothing is written.
+        """
+        retry = attempts < max_attempts
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        delay = random.uniform(delay / 2, delay)
+        async with get_conn() as conn:
+            cur = await conn.execute(
+                """UPDATE report_jobs
+                      SET status = %s, last_error = %s, updated_at = now(),
+                          run_after = now() + make_interval(secs => %s),
+                          locked_by = NULL, locked_at = NULL,
+                          finished_at = CASE WHEN %s THEN NULL ELSE now() END
+                    WHERE id = %s AND status = 'running' AND locked_by = %s
+                RETURNING id""",
+                ("queued" if retry else "failed", error[:2000], delay, retry, job_id, self.worker_id),
+            )
+            if not await cur.fetchone():
+                return None
+        return retry
+
+    async def _run_job(self, job: tuple):
+        job_id, chat_id, user_id, payload, attempts, max_attempts = job
+        chat_id, user_id = str(chat_id), str(user_id)
+        logger.info(f"[jobs] running doctor report {job_id} for chat {chat_id} (attempt {attempts}/{max_attempts})")
+        # The final report is streamed to the chat while FRA writes it
+        stream = BotStreamPublisher(chat_id)
+        try:
+            report = await asyncio.wait_for(
+                generate_doctor_report(
+                    user_id, chat_id, payload["history_text"],
+                    parsed=payload.get("parsed"), on_delta=stream,
+                ),
+                timeout=self.job_timeout,
+            )
+            await stream.flush()
+            msg_id, msg_ts = await self._complete(job_id, chat_id, report)
+        except Exception as e:
+            await stream.discard()
+            error = str(e) or type(e).__name__
+            retry = await self._fail(job_id, attempts, max_attempts, error)
+            if retry is None:
+                self.leases_lost += 1
+                logger.warning(f"[jobs] report {job_id} failed after its lease was lost, leaving it to its new owner: {error}")
+            elif retry:
+                self.retried += 1
+                logger.warning(f"[jobs] report {job_id} failed, will retry: {error}")
+            else:
+                self.failed += 1
+                logger.error(f"[jobs] report {job_id} failed permanently: {error}")
+                await ws_manager.send_to_user(user_id, chat_id, {
+                    "type": "doctor_report_error",
+                    "message": "Failed to process doctor report. Please try again."
+                })
+            return
+
+        self.succeeded += 1
+        await ws_manager.broadcast_to_chat(chat_id, {
+            "type": "new_message",
+            "stream_id": stream.stream_id,
+            "message": {
+                "id": str(msg_id),
+                "sender": "bot",
+                "content": report,
+                "created_at": msg_ts.isoformat()
+            }
+        })
+        await ws_manager.send_to_user(user_id, chat_id, {
+            "type": "doctor_report_ready",
+            "message": "Your doctor report is now available.",
+            "action": "reload_chat"
+        })
+        logger.info(f"[jobs] doctor report {job_id} done for chat {chat_id}")
+
+    def _spawn(self, job: tuple):
+        task = asyncio.create_task(self._run_job(job))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        task.add_done_callback(lambda _: self.wake())
+
+    async def _listen(self):
+        """Wake the loop on NOTIFY from other processes that enqueue jobs."""
+        while True:
+            try:
+                async with await connect_dedicated() as conn:
+                    await conn.execute(f"LISTEN {REPORT_CHANNEL}")
+                    async for _ in conn.notifies():
+                        self.wake()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[jobs] LISTEN connection lost: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        listener = asyncio.create_task(self._listen())
+        last_reap = 0.0
+        loop = asyncio.get_running_loop()
+        logger.info(f"[jobs] report worker {self.worker_id} started (concurrency={self.concurrency})")
+        try:
+            while True:
+                self._wake.clear()
+                try:
+                    if loop.time() - last_reap > self.job_timeout:
+                        await self._reap_stale()
+                        last_reap = loop.time()
+                    while len(self._running) < self.concurrency:
+                        job = await self._claim()
+                        if not job:
+                            break
+                        self.claimed += 1
+                        self._spawn(job)
+                except Exception as e:
+                    logger.error(f"[jobs] claim loop error: {e}")
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listener.cancel()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="report-worker")
+
+    async def stop(self, drain_timeout: float = 30.0):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            # Unfinished jobs are picked up again once their lock goes stale
+            await asyncio.wait(self._running, timeout=drain_timeout)
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "claimed": self.claimed,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "leases_lost": self.leases_lost,
+            "stages": report_timings.stats(),
+        }
+
+
+report_worker = ReportWorker(
+    concurrency=settings.REPORT_WORKER_CONCURRENCY,
+    endpoint_limit=settings.REPORT_ENDPOINT_CONCURRENCY,
+    endpoint_limits=settings.REPORT_ENDPOINT_LIMITS,
+    poll_interval=settings.REPORT_POLL_INTERVAL,
+    job_timeout=settings.REPORT_JOB_TIMEOUT,
+    backoff_base=settings.REPORT_RETRY_BACKOFF_BASE,
+    backoff_max=settings.REPORT_RETRY_BACKOFF_MAX,
+)
@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple, Optional, Tuple
+
+from psycopg import AsyncConnection
+from config import settings
+
+
+class Profile(NamedTuple):
+    display_name: str
+    gender: Optional[str]
+    date_of_birth: Optional[date]
+    province: Optional[str]
+
+    @property
+    def age(self) -> Optional[int]:
+        dob = self.date_of_birth
+        if not dob:
+            return None
+        today = date.today()
+        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+ANONYMOUS = Profile("User", None, None, None)
+
+
+class ProfileCache:
+    """Per-process TTL/LRU of the profile fields the agents are prompted with.
+
+    Every chat turn needs the sender's name, gender, age and province, which
+    change rarely. Updates made through this process invalidate the entry
+    immediately; updates made by other workers are seen once ``ttl`` lapses.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Profile, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[Profile]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user_id: str, profile: Profile):
+        if self.ttl <= 0:
+            return
+        self._entries[user_id] = (profile, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def load(self, conn: AsyncConnection, user_id: str) -> Profile:
+        """Cached profile, reading ``users`` on a miss; unknown users get ``ANONYMOUS``."""
+        profile = self.get(user_id)
+        if profile is not None:
+            return profile
+        cur = await conn.execute(
+            "SELECT display_name, gender, date_of_birth, province FROM users WHERE id=%s::uuid",
+            (user_id,),
+        )
+        row = await cur.fetchone()
+        if not row:
+            return ANONYMOUS
+        profile = Profile(*row)
+        self.put(user_id, profile)
+        return profile
+
+    def invalidate(self, user_id: str):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+profile_cache = ProfileCache(
+    max_size=settings.PROFILE_CACHE_MAX_SIZE,
+    ttl=settings.PROFILE_CACHE_TTL,
+)
@@ -1,13 +1,30 @@
 import asyncio
 from datetime import date
-from utils import get_conn, format_user_prompt
+from typing import Awaitable, Callable, Optional
+from utils import get_conn, format_user_prompt, StageGraph, StageTimings
 from loguru import logger
-from .wsocket import ws_manager
-from agents import MDA, SPA, FRA, LDA
-from tools import NearestFacilityFinder
+from agents import MDA, FRA
+from tools import NearestFacilityFinder, GeoCache, FacilityIndex
+from config import settings
 from prompts import DOCTOR_PROMPT_TEMPLATE, FINAL_REPORT_TEMPLATE
+from .intake import intake_state
 
-nearest_place = NearestFacilityFinder()
+geo_cache = GeoCache(
+    settings.GEO_CACHE_PATH or None,
+    max_entries=settings.GEO_CACHE_MAX_ENTRIES,
+    memory_entries=settings.GEO_CACHE_MEMORY_ENTRIES,
+)
+facility_index = FacilityIndex.load(settings.FACILITY_INDEX_PATH) if settings.FACILITY_INDEX_PATH else None
+if facility_index is not None:
+    logger.info(f"Loaded offline facility index: {facility_index.stats()}")
+nearest_place = NearestFacilityFinder(
+    cache=geo_cache,
+    index=facility_index,
+    offline=settings.FACILITY_OFFLINE,
+    geocode_ttl=settings.GEOCODE_CACHE_TTL,
+    places_ttl=settings.PLACES_CACHE_TTL,
+    empty_ttl=settings.GEO_EMPTY_CACHE_TTL,
+)
 
 map_lang = {
     "id-id" : "bahasa indonesia",
@@ -15,62 +32,86 @@ map_lang = {
     "id-jv" : "javanese"
 }
 
-async def process_doctor_report(user_id: str, chat_uuid: str, history_text: str):
-    conn = get_conn(); cur = conn.cursor()
-    try:
-        cur.execute("SELECT gender, date_of_birth, address_line1, city, display_name FROM users WHERE id=%s::uuid", (user_id,))
-        user_data = cur.fetchone()
+# Per-stage latency of every report run, for /stats
+report_timings = StageTimings()
+
+async def generate_doctor_report(
+    user_id: str,
+    chat_uuid: str,
+    history_text: str,
+    parsed: Optional[dict] = None,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """Run the parse -> doctor -> final report agents and return the report text.
+
+    Stages start as soon as their inputs exist: the parse and the profile
+    read start together, facility lookup and language detection run while
+    MDA generates, and only FRA waits on everything. The parse and language
+    come from the chat's intake state when it already covers
+    ``history_text`` (or from ``parsed``), so usually only MDA and FRA are
+    called. FRA text is pushed to ``on_delta`` as it generates.
+    """
+    graph = StageGraph("doctor_report", report_timings)
+
+    async def profile():
+        async with get_conn() as conn:
+            cur = await conn.execute("SELECT gender, date_of_birth, address_line1, city, display_name FROM users WHERE id=%s::uuid", (user_id,))
+            user_data = await cur.fetchone()
         gender, dob, address, city, display_name = user_data if user_data else (None, None, None, None, None)
         age = None
         if dob:
             today = date.today()
             age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+        return {"gender": gender, "age": age, "address": f"{address}, {city}", "display_name": display_name}
 
-        address_combined = f"{address}, {city}"
+    async def parse():
+        return await intake_state.report_parse(chat_uuid, history_text, parsed)
 
-        apotek, hospital, tandlang, parsed = await asyncio.gather(
-            nearest_place.search(facility_type="apotek", radius_m="16000", limit=2, address=address_combined),
-            nearest_place.search(facility_type="hospital", radius_m="16000", limit=2, address=address_combined),
-            LDA.arun(content=history_text, display_name=display_name),
-            SPA.arun(content=history_text)
+    async def facilities(profile):
+        apotek, hospital = await asyncio.gather(
+            nearest_place.search(facility_type="apotek", radius_m="16000", limit=2, address=profile["address"]),
+            nearest_place.search(facility_type="hospital", radius_m="16000", limit=2, address=profile["address"]),
         )
-
         if apotek or hospital:
             parts = []
             if apotek:
                 parts.append("\n".join(apotek).strip())
             if hospital:
                 parts.append("\n".join(hospital).strip())
-            combined = "\n".join(parts)
-        else:
-            combined = "apotek atau rumah sakit terdekat tidak dapat ditemukan"
-
-        title = tandlang.get("title", None)
-        language = tandlang.get("language", None)
-        lang = map_lang.get(language, "unknown")
+            return "\n".join(parts)
+        return "apotek atau rumah sakit terdekat tidak dapat ditemukan"
 
-        parsed["gender"], parsed["age"] = gender, age
+    async def language(profile):
+        tandlang = await intake_state.report_language(chat_uuid, history_text, profile["display_name"])
+        return map_lang.get(tandlang.get("language", None), "unknown")
 
-        doctor_prompt = format_user_prompt(DOCTOR_PROMPT_TEMPLATE, parsed)
+    async def doctor(parse, profile):
+        parse["gender"], parse["age"] = profile["gender"], profile["age"]
+        doctor_prompt = format_user_prompt(DOCTOR_PROMPT_TEMPLATE, parse)
         doctor_process = await MDA.arun(content=doctor_prompt)
+        if not doctor_process:
+            raise RuntimeError("Doctor agent returned no output")
+        return doctor_process
 
-        doctor_process['display_name'], doctor_process['lang'], doctor_process['hospital'] = display_name, lang, combined
-        final_report_prompt = format_user_prompt(FINAL_REPORT_TEMPLATE, doctor_process)
-        final_report = await FRA.arun(content=final_report_prompt)
+    async def final(doctor, language, facilities, profile):
+        doctor['display_name'], doctor['lang'], doctor['hospital'] = profile["display_name"], language, facilities
+        final_report_prompt = format_user_prompt(FINAL_REPORT_TEMPLATE, doctor)
+        if on_delta is None:
+            return await FRA.arun(content=final_report_prompt)
 
-        cur.execute("""INSERT INTO chat_messages (chat_id, sender, content)
-                       VALUES (%s,'bot',%s)""",
-                    (chat_uuid, final_report))
-        conn.commit()
+        async def relay(text: str):
+            graph.mark("first_delta")
+            await on_delta(text)
+        return await FRA.arun_stream(relay, content=final_report_prompt)
 
-        await ws_manager.broadcast_to_chat(chat_uuid, {
-            "chat_id": chat_uuid,
-            "sender": "bot",
-            "content": final_report
-        })
+    graph.add("profile", profile)
+    graph.add("parse", parse)
+    graph.add("facilities", facilities, deps=["profile"])
+    graph.add("language", language, deps=["profile"])
+    graph.add("doctor", doctor, deps=["parse", "profile"])
+    graph.add("final", final, deps=["doctor", "language", "facilities", "profile"])
 
-        logger.info(f"Inserted + pushed doctor result for chat {chat_uuid}")
-    except Exception as e:
-        logger.error(f"Doctor pipeline failed: {str(e)}")
-    finally:
-        cur.close(); conn.close()
+    final_report = (await graph.run())["final"]
+    if not final_report:
+        raise RuntimeError("Final report agent returned no output")
+    return final_report
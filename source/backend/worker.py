@@ -0,0 +1,48 @@
+"""Standalone doctor report worker.
+
+Run one or more of these next to the API so report generation does not
+compete with request handling:
+
+    python -m backend.worker
+
+Set REPORT_WORKER_IN_PROCESS=false on the API once dedicated workers run.
+"""
+import asyncio
+import signal
+
+from loguru import logger
+
+from agents import open_llm_clients, close_llm_clients
+from utils import open_pool, close_pool, blocking_executor
+from .jobs import report_worker
+from .janitor import session_janitor
+from config import settings
+from .tasks import geo_cache, nearest_place
+
+
+async def main():
+    asyncio.get_running_loop().set_default_executor(blocking_executor.pool)
+    await open_pool()
+    open_llm_clients()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    report_worker.start()
+    if settings.JANITOR_ENABLED:
+        session_janitor.start()
+    await stop.wait()
+    logger.info("Stopping report worker...")
+    await session_janitor.stop()
+    await report_worker.stop()
+    await close_llm_clients()
+    await nearest_place.close()
+    geo_cache.close()
+    await close_pool()
+    blocking_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
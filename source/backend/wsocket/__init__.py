@@ -1,3 +1,6 @@
-from .ws_manager import ws_manager
+from .ws_manager import ws_manager, ConnectionManager
+from .backplane import Backplane, InMemoryBackplane, PostgresBackplane
+from .stream import BotStreamPublisher
 
-__all__ = ["ws_manager"]
\ No newline at end of file
+__all__ = ["ws_manager", "ConnectionManager", "Backplane", "InMemoryBackplane", "PostgresBackplane",
+           "BotStreamPublisher"]
\ No newline at end of file
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from loguru import logger
+
+from utils import get_conn, connect_dedicated
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """Fans WebSocket messages out to every worker process.
+
+    ``ConnectionManager`` delivers to its own sockets directly and publishes
+    an envelope here; each other node receives it through the handler passed
+    to ``start`` and delivers to the sockets it holds. Envelopes a node
+    published itself are dropped on receipt.
+    """
+
+    def __init__(self):
+        self.node_id = uuid.uuid4().hex
+        self._handler: Optional[Handler] = None
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    @abstractmethod
+    async def publish(self, envelope: dict):
+        """Send ``envelope`` to every other node."""
+
+    async def _dispatch(self, envelope: dict):
+        if envelope.get("o") == self.node_id or self._handler is None:
+            return
+        self.received += 1
+        try:
+            await self._handler(envelope)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[backplane] delivery failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "type": type(self).__name__,
+            "node_id": self.node_id,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+class InMemoryBackplane(Backplane):
+    """Process-local stand-in: managers sharing a ``hub`` name behave like separate workers."""
+
+    _hubs: Dict[str, Set["InMemoryBackplane"]] = {}
+
+    def __init__(self, hub: str = "default"):
+        super().__init__()
+        self.hub = hub
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self._hubs.setdefault(self.hub, set()).add(self)
+
+    async def stop(self):
+        self._hubs.get(self.hub, set()).discard(self)
+        await super().stop()
+
+    async def publish(self, envelope: dict):
+        # Round-trip through JSON so tests see exactly what would cross the wire
+        raw = json.dumps({**envelope, "o": self.node_id}, default=str)
+        self.published += 1
+        for peer in list(self._hubs.get(self.hub, ())):
+            await peer._dispatch(json.loads(raw))
+
+
+class PostgresBackplane(Backplane):
+    """LISTEN/NOTIFY backplane on the application database.
+
+    NOTIFY payloads are capped at 8000 bytes, so larger envelopes (e.g. a
+    full doctor report) are written to ``ws_outbox`` and only their id is
+    sent; receivers read the row back through the pool.
+    """
+
+    MAX_NOTIFY_BYTES = 7900
+
+    def __init__(self, channel: str = "ws_fanout", outbox_ttl: float = 300.0, reconnect_delay: float = 2.0):
+        super().__init__()
+        self.channel = channel
+        self.outbox_ttl = outbox_ttl
+        self.reconnect_delay = reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.spilled = 0
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(), name="ws-backplane")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+    async def publish(self, envelope: dict):
+        payload = json.dumps({**envelope, "o": self.node_id}, separators=(",", ":"), default=str)
+        async with get_conn() as conn:
+            if len(payload.encode("utf-8")) > self.MAX_NOTIFY_BYTES:
+                cur = await conn.execute(
+                    "INSERT INTO ws_outbox (payload) VALUES (%s) RETURNING id", (payload,)
+                )
+                (ref,) = await cur.fetchone()
+                self.spilled += 1
+                if self.spilled % 100 == 1:
+                    await conn.execute(
+                        "DELETE FROM ws_outbox WHERE created_at < now() - make_interval(secs => %s)",
+                        (self.outbox_ttl,),
+                    )
+                payload = json.dumps({"ref": ref, "o": self.node_id})
+            await conn.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        self.published += 1
+
+    async def _resolve(self, envelope: dict) -> Optional[dict]:
+        if "ref" not in envelope:
+            return envelope
+        # The LISTEN connection is busy inside notifies(), so read through the pool
+        async with get_conn() as conn:
+            cur = await conn.execute("SELECT payload FROM ws_outbox WHERE id = %s", (envelope["ref"],))
+            row = await cur.fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def _listen(self):
+        while True:
+            try:
+                async with await connect_dedicated() as conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    self.connected = True
+                    logger.info(f"[backplane] listening on {self.channel} as {self.node_id}")
+                    async for note in conn.notifies():
+                        try:
+                            envelope = json.loads(note.payload)
+                            if envelope.get("o") == self.node_id:
+                                continue
+                            envelope = await self._resolve(envelope)
+                        except Exception as e:
+                            self.errors += 1
+                            logger.error(f"[backplane] bad notification: {e}")
+                            continue
+                        if envelope is not None:
+                            await self._dispatch(envelope)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[backplane] LISTEN connection lost: {e}")
+            finally:
+                self.connected = False
+            await asyncio.sleep(self.reconnect_delay)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({"channel": self.channel, "connected": self.connected, "spilled": self.spilled})
+        return stats
+
+
+def create_backplane(kind: Optional[str], channel: str = "ws_fanout") -> Optional[Backplane]:
+    """Backplane for ``settings.WS_BACKPLANE`` ("postgres", "memory" or "none")."""
+    kind = (kind or "none").lower()
+    if kind == "postgres":
+        return PostgresBackplane(channel=channel)
+    if kind == "memory":
+        return InMemoryBackplane()
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown WS_BACKPLANE: {kind}")
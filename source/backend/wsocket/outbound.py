@@ -0,0 +1,110 @@
+import asyncio
+from typing import Callable, Optional
+
+from fastapi import WebSocket
+from loguru import logger
+
+_CLOSE = object()  # sentinel: flush what is queued, then stop
+
+# Close tasks outlive their Outbound (on_dead drops it), so hold them here
+_closing: set = set()
+
+
+class Outbound:
+    """Bounded send queue with its own sender task for one WebSocket.
+
+    Broadcasting only enqueues pre-serialised text, so a slow or stalled
+    client never holds up the other subscribers. Each send is bounded by
+    ``send_timeout``; when the queue is full the ``policy`` decides whether
+    the oldest queued message is dropped ("drop_oldest") or the socket is
+    closed so the client reconnects and reloads ("disconnect").
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        chat_id: str,
+        user_id: Optional[str],
+        on_dead: Callable[["Outbound", str], None],
+        max_queue: int = 256,
+        send_timeout: float = 5.0,
+        policy: str = "disconnect",
+    ):
+        self.websocket = websocket
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.send_timeout = send_timeout
+        self.policy = policy
+        self._on_dead = on_dead
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self._task = asyncio.create_task(self._run(), name=f"ws-send-{chat_id}")
+        self.closed = False
+
+        self.sent = 0
+        self.dropped = 0
+        self.timeouts = 0
+
+    def offer(self, text: str) -> bool:
+        """Queue ``text`` without blocking; returns False if the connection is unusable."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            self._queue.put_nowait(text)
+            return True
+        self._fail("slow consumer")
+        return False
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                return
+            try:
+                await asyncio.wait_for(self.websocket.send_text(item), timeout=self.send_timeout)
+                self.sent += 1
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._fail("send timed out")
+                return
+            except Exception as e:
+                self._fail(str(e) or type(e).__name__)
+                return
+
+    def _fail(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        logger.warning(f"Dropping WebSocket in chat {self.chat_id}: {reason}")
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._on_dead(self, reason)
+        task = asyncio.create_task(self._close_socket())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+    async def _close_socket(self):
+        try:
+            # 1013 = try again later; the client reconnects and reloads the chat
+            await asyncio.wait_for(self.websocket.close(code=1013), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop after flushing what is already queued (normal disconnect)."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._queue.put_nowait(_CLOSE)
+        except asyncio.QueueFull:
+            self._task.cancel()
@@ -0,0 +1,50 @@
+import time
+import uuid
+from typing import List
+
+from .ws_manager import ws_manager
+
+
+class BotStreamPublisher:
+    """Relays streamed reply text to a chat's sockets as ``bot_delta`` messages.
+
+    Tokens are coalesced for ``interval`` seconds so a fast model does not
+    produce one WebSocket frame per token. Call ``flush`` once generation
+    ends; the persisted reply then arrives as ``new_message`` carrying the
+    same ``stream_id`` so clients can swap the draft for the final text.
+    """
+
+    def __init__(self, chat_id: str, interval: float = 0.05):
+        self.chat_id = chat_id
+        self.stream_id = str(uuid.uuid4())
+        self.interval = interval
+        self._pending: List[str] = []
+        self._last_flush = 0.0
+        self.started = False  # anything broadcast yet
+
+    async def __call__(self, delta: str):
+        self._pending.append(delta)
+        if time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._last_flush = time.monotonic()
+        self.started = True
+        await ws_manager.broadcast_to_chat(self.chat_id, {
+            "type": "bot_delta",
+            "stream_id": self.stream_id,
+            "delta": text
+        })
+
+    async def discard(self):
+        """Tell clients to drop the draft, e.g. when generation failed and will be retried."""
+        self._pending.clear()
+        if self.started:
+            await ws_manager.broadcast_to_chat(self.chat_id, {
+                "type": "bot_stream_discard",
+                "stream_id": self.stream_id
+            })
@@ -1,47 +1,205 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from loguru import logger
 import asyncio
 import json
+import random
+from config import settings
+from .backplane import Backplane, create_backplane
+from .outbound import Outbound
+
+# High-rate frames whose loss only costs a draft or an indicator; the persisted
+# message that follows a stream carries the full text.
+TRANSIENT_TYPES = ("bot_delta", "typing")
+
+
+def _coalesce(held: List[dict], message: dict):
+    """Add a transient frame to ``held``, merging it into the one it supersedes."""
+    if message.get("type") == "bot_delta":
+        for prev in reversed(held):
+            if prev.get("type") == "bot_delta" and prev.get("stream_id") == message.get("stream_id"):
+                prev["delta"] += message.get("delta", "")
+                return
+    elif message.get("type") == "typing":
+        for i, prev in enumerate(held):
+            if prev.get("type") == "typing" and prev.get("user_id") == message.get("user_id"):
+                del held[i]
+                break
+    held.append(dict(message))
+
+
+def encode_message(message: dict) -> str:
+    """Serialise once per message, the same way Starlette's send_json does per socket"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        self.user_connections: Dict[str, Dict[str, WebSocket]] = {}  # user_id -> {chat_id: websocket}
+    def __init__(
+        self,
+        backplane: Optional[Backplane] = None,
+        send_timeout: float = 5.0,
+        send_queue_size: int = 256,
+        slow_consumer_policy: str = "disconnect",
+        heartbeat_interval: float = 30.0,
+        heartbeat_jitter: float = 0.2,
+        transient_interval: float = 0.5,
+    ):
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.user_connections: Dict[str, Dict[str, Set[WebSocket]]] = {}  # user_id -> {chat_id: {websocket}}
+        # Reverse index: websocket -> (user_id, chat_id), so removal never scans
+        self.connection_index: Dict[WebSocket, Tuple[Optional[str], str]] = {}
+        # Carries broadcasts to sockets held by other worker processes
+        self.backplane = backplane
+        # Transient frames bound for other workers are batched per chat for this long
+        # (one publish per chat per interval instead of one per frame); 0 keeps them local
+        self.transient_interval = transient_interval
+        self._held: Dict[str, List[dict]] = {}
+        self._held_flush: Dict[str, asyncio.Task] = {}
+        # Per-socket outbound queues; sends never block the broadcaster
+        self.outbound: Dict[WebSocket, Outbound] = {}
+        self.send_timeout = send_timeout
+        self.send_queue_size = send_queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_jitter = heartbeat_jitter
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._retired = {"sent": 0, "dropped": 0, "timeouts": 0}
+        self.counters = {
+            "connects": 0,
+            "disconnects": 0,
+            "dropped_connections": 0,
+            "heartbeats": 0,
+            "pings_sent": 0,
+            "reaped": 0,
+            "transient_local_only": 0,
+            "transient_batched": 0,
+        }
+
+    async def start(self):
+        if self.backplane:
+            await self.backplane.start(self._on_backplane_message)
+        if self.heartbeat_interval > 0 and (self._heartbeat_task is None or self._heartbeat_task.done()):
+            self._heartbeat_task = asyncio.create_task(self._heartbeat(), name="ws-heartbeat")
+
+    async def stop(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        for task in list(self._held_flush.values()):
+            task.cancel()
+        self._held_flush.clear()
+        self._held.clear()
+        if self.backplane:
+            await self.backplane.stop()
+
+    async def _publish(self, envelope: dict):
+        if not self.backplane:
+            return
+        try:
+            await self.backplane.publish(envelope)
+        except Exception as e:
+            logger.error(f"Failed to publish to WebSocket backplane: {str(e)}")
+
+    async def _publish_chat(self, chat_id: str, message: dict):
+        if not self.backplane:
+            return
+        if message.get("type") not in TRANSIENT_TYPES:
+            # Anything held for the chat goes first, so remote clients see frames in order
+            await self._flush_held(chat_id)
+            await self._publish({"k": "chat", "c": chat_id, "m": message})
+            return
+        if self.transient_interval <= 0:
+            self.counters["transient_local_only"] += 1
+            return
+        _coalesce(self._held.setdefault(chat_id, []), message)
+        self.counters["transient_batched"] += 1
+        if chat_id not in self._held_flush:
+            self._held_flush[chat_id] = asyncio.create_task(self._flush_later(chat_id), name=f"ws-held-{chat_id}")
+
+    async def _flush_later(self, chat_id: str):
+        try:
+            await asyncio.sleep(self.transient_interval)
+        finally:
+            self._held_flush.pop(chat_id, None)
+        await self._flush_held(chat_id)
+
+    async def _flush_held(self, chat_id: str):
+        held = self._held.pop(chat_id, None)
+        if held:
+            await self._publish({"k": "chat", "c": chat_id, "ms": held})
+
+    async def _on_backplane_message(self, envelope: dict):
+        """Deliver a message published by another worker to the sockets held here"""
+        if envelope.get("k") == "chat" and "ms" in envelope:
+            for message in envelope["ms"]:
+                await self._broadcast_local(envelope["c"], message)
+        elif envelope.get("k") == "chat":
+            await self._broadcast_local(envelope["c"], envelope["m"])
+        elif envelope.get("k") == "user":
+            await self._send_local(envelope["u"], envelope["c"], envelope["m"])
 
     async def connect(self, chat_id: str, websocket: WebSocket, user_id: Optional[str] = None):
         """Connect a WebSocket to a specific chat"""
         await websocket.accept()
+        self._register(chat_id, websocket, user_id)
+        self._open_outbound(chat_id, websocket, user_id)
+        self.counters["connects"] += 1
 
-        # Add to chat connections
-        self.active_connections.setdefault(chat_id, []).append(websocket)
+        logger.info(f"WebSocket connected to chat {chat_id}" + (f" for user {user_id}" if user_id else ""))
 
-        # Track user connections if user_id provided
+    def identify(self, websocket: WebSocket, user_id: str):
+        """Attach an authenticated user to an already accepted socket"""
+        entry = self.connection_index.get(websocket)
+        if entry is None:
+            return
+        old_user, chat_id = entry
+        if old_user == user_id:
+            return
+        self._unregister(websocket)
+        self._register(chat_id, websocket, user_id)
+        outbound = self.outbound.get(websocket)
+        if outbound:
+            outbound.user_id = user_id
+
+    def _register(self, chat_id: str, websocket: WebSocket, user_id: Optional[str]):
+        self.active_connections.setdefault(chat_id, set()).add(websocket)
         if user_id:
-            self.user_connections.setdefault(user_id, {})[chat_id] = websocket
+            self.user_connections.setdefault(user_id, {}).setdefault(chat_id, set()).add(websocket)
+        self.connection_index[websocket] = (user_id, chat_id)
 
-        logger.info(f"WebSocket connected to chat {chat_id}" + (f" for user {user_id}" if user_id else ""))
+    def _unregister(self, websocket: WebSocket) -> bool:
+        entry = self.connection_index.pop(websocket, None)
+        if entry is None:
+            return False
+        user_id, chat_id = entry
+
+        chat_sockets = self.active_connections.get(chat_id)
+        if chat_sockets is not None:
+            chat_sockets.discard(websocket)
+            if not chat_sockets:
+                del self.active_connections[chat_id]
+
+        if user_id:
+            user_chats = self.user_connections.get(user_id)
+            if user_chats is not None:
+                sockets = user_chats.get(chat_id)
+                if sockets is not None:
+                    sockets.discard(websocket)
+                    if not sockets:
+                        del user_chats[chat_id]
+                if not user_chats:
+                    del self.user_connections[user_id]
+        return True
 
     def disconnect(self, chat_id: str, websocket: WebSocket, user_id: Optional[str] = None):
         """Disconnect a WebSocket from a chat"""
         try:
-            # Remove from chat connections
-            if chat_id in self.active_connections:
-                if websocket in self.active_connections[chat_id]:
-                    self.active_connections[chat_id].remove(websocket)
-
-                # Clean up empty chat connection list
-                if not self.active_connections[chat_id]:
-                    del self.active_connections[chat_id]
-
-            # Remove from user connections
-            if user_id and user_id in self.user_connections:
-                if chat_id in self.user_connections[user_id]:
-                    del self.user_connections[user_id][chat_id]
-
-                # Clean up empty user connection dict
-                if not self.user_connections[user_id]:
-                    del self.user_connections[user_id]
+            if self._unregister(websocket):
+                self.counters["disconnects"] += 1
+            self._close_outbound(websocket)
 
             logger.info(f"WebSocket disconnected from chat {chat_id}" + (f" for user {user_id}" if user_id else ""))
 
@@ -49,47 +207,89 @@ class ConnectionManager:
             logger.error(f"Error during WebSocket disconnect: {str(e)}")
 
     async def broadcast_to_chat(self, chat_id: str, message: dict, exclude_websocket: Optional[WebSocket] = None):
-        """Broadcast message to all connections in a specific chat"""
+        """Broadcast message to all connections in a specific chat, on every worker"""
+        await self._broadcast_local(chat_id, message, exclude_websocket)
+        await self._publish_chat(chat_id, message)
+
+    async def _broadcast_local(self, chat_id: str, message: dict, exclude_websocket: Optional[WebSocket] = None):
         if chat_id not in self.active_connections:
             return
 
-        # Create a copy of the list to avoid modification during iteration
-        connections = self.active_connections[chat_id][:]
-        dead_connections = []
-
-        for websocket in connections:
+        text = encode_message(message)
+        # Copy: a full queue can drop the connection while we iterate
+        for websocket in list(self.active_connections[chat_id]):
             if websocket == exclude_websocket:
                 continue
+            self._offer(websocket, text)
 
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.warning(f"Failed to send message to WebSocket in chat {chat_id}: {str(e)}")
-                dead_connections.append(websocket)
+    async def send_to_user(self, user_id: str, chat_id: str, message: dict):
+        """Send message to a specific user in a specific chat, on every worker.
 
-        # Clean up dead connections
-        for dead_ws in dead_connections:
-            self._remove_dead_connection(chat_id, dead_ws)
+        Returns True if a socket on this worker received it.
+        """
+        delivered = await self._send_local(user_id, chat_id, message)
+        await self._publish({"k": "user", "u": user_id, "c": chat_id, "m": message})
+        return delivered
 
-    async def send_to_user(self, user_id: str, chat_id: str, message: dict):
-        """Send message to a specific user in a specific chat"""
-        if user_id not in self.user_connections:
+    async def _send_local(self, user_id: str, chat_id: str, message: dict) -> bool:
+        sockets = self.user_connections.get(user_id, {}).get(chat_id)
+        if not sockets:
             return False
 
-        if chat_id not in self.user_connections[user_id]:
-            return False
+        text = encode_message(message)
+        delivered = False
+        for websocket in list(sockets):
+            delivered = self._offer(websocket, text) or delivered
+        return delivered
 
-        websocket = self.user_connections[user_id][chat_id]
+    async def send_json(self, websocket: WebSocket, message: dict) -> bool:
+        """Reply on one socket, in order with anything already queued for it"""
+        if websocket in self.outbound:
+            return self._offer(websocket, encode_message(message))
         try:
             await websocket.send_json(message)
             return True
         except Exception as e:
-            logger.warning(f"Failed to send message to user {user_id} in chat {chat_id}: {str(e)}")
-            self._remove_dead_connection(chat_id, websocket, user_id)
+            logger.warning(f"Failed to send message to WebSocket: {str(e)}")
             return False
 
+    def _offer(self, websocket: WebSocket, text: str) -> bool:
+        outbound = self.outbound.get(websocket)
+        return outbound.offer(text) if outbound else False
+
+    def _open_outbound(self, chat_id: str, websocket: WebSocket, user_id: Optional[str]):
+        outbound = self.outbound.get(websocket)
+        if outbound and not outbound.closed:
+            outbound.user_id = user_id
+            return
+        self.outbound[websocket] = Outbound(
+            websocket, chat_id, user_id,
+            on_dead=self._on_outbound_dead,
+            max_queue=self.send_queue_size,
+            send_timeout=self.send_timeout,
+            policy=self.slow_consumer_policy,
+        )
+
+    def _close_outbound(self, websocket: WebSocket):
+        outbound = self.outbound.pop(websocket, None)
+        if outbound:
+            outbound.close()
+            self._retire(outbound)
+
+    def _retire(self, outbound: Outbound):
+        self._retired["sent"] += outbound.sent
+        self._retired["dropped"] += outbound.dropped
+        self._retired["timeouts"] += outbound.timeouts
+
+    def _on_outbound_dead(self, outbound: Outbound, reason: str):
+        self.counters["dropped_connections"] += 1
+        if self.outbound.get(outbound.websocket) is outbound:
+            del self.outbound[outbound.websocket]
+            self._retire(outbound)
+        self._remove_dead_connection(outbound.chat_id, outbound.websocket)
+
     async def broadcast_to_user_chats(self, user_id: str, message: dict):
-        """Broadcast message to all chats where user is connected"""
+        """Broadcast message to all chats where user is connected on this worker"""
         if user_id not in self.user_connections:
             return
 
@@ -98,12 +298,12 @@ class ConnectionManager:
             await self.send_to_user(user_id, chat_id, message)
 
     def has_connections(self, chat_id: str) -> bool:
-        """Check if a chat has any active connections"""
-        return chat_id in self.active_connections and len(self.active_connections[chat_id]) > 0
+        """Check if a chat has any active connections on this worker"""
+        return bool(self.active_connections.get(chat_id))
 
     def get_connection_count(self, chat_id: str) -> int:
         """Get number of active connections for a chat"""
-        return len(self.active_connections.get(chat_id, []))
+        return len(self.active_connections.get(chat_id, ()))
 
     def get_active_chats(self) -> List[str]:
         """Get list of chat IDs with active connections"""
@@ -116,56 +316,52 @@ class ConnectionManager:
     def _remove_dead_connection(self, chat_id: str, websocket: WebSocket, user_id: Optional[str] = None):
         """Internal method to remove a dead connection"""
         try:
-            # Remove from chat connections
-            if chat_id in self.active_connections:
-                if websocket in self.active_connections[chat_id]:
-                    self.active_connections[chat_id].remove(websocket)
-
-                if not self.active_connections[chat_id]:
-                    del self.active_connections[chat_id]
-
-            # Remove from user connections if user_id known
-            if user_id and user_id in self.user_connections:
-                if chat_id in self.user_connections[user_id]:
-                    del self.user_connections[user_id][chat_id]
-
-                if not self.user_connections[user_id]:
-                    del self.user_connections[user_id]
-            else:
-                # If user_id not provided, search through all users
-                for uid, chats in list(self.user_connections.items()):
-                    for cid, ws in list(chats.items()):
-                        if ws == websocket and cid == chat_id:
-                            del chats[cid]
-                            if not chats:
-                                del self.user_connections[uid]
-                            break
-
+            if self._unregister(websocket):
+                self.counters["reaped"] += 1
+                logger.info(f"Reaped dead WebSocket in chat {chat_id}")
         except Exception as e:
             logger.error(f"Error removing dead connection: {str(e)}")
 
     async def ping_connections(self):
-        """Ping all connections to check if they're alive (run this periodically)"""
-        all_connections = []
-
-        # Collect all connections
-        for chat_id, connections in self.active_connections.items():
-            for ws in connections:
-                all_connections.append((chat_id, ws))
-
-        # Ping each connection
-        for chat_id, websocket in all_connections:
+        """Ping all connections to check if they're alive (run this periodically).
+
+        Pings go through each socket's queue, so a dead or stalled socket is
+        reaped by its own sender task without delaying the others.
+        """
+        text = encode_message({"type": "ping"})
+        for websocket in list(self.outbound):
+            if self._offer(websocket, text):
+                self.counters["pings_sent"] += 1
+
+    async def _heartbeat(self):
+        """Ping every socket each interval, jittered so workers don't ping in lockstep"""
+        while True:
+            spread = self.heartbeat_interval * self.heartbeat_jitter
+            await asyncio.sleep(self.heartbeat_interval + random.uniform(-spread, spread))
             try:
-                await websocket.send_json({"type": "ping"})
+                await self.ping_connections()
+                self.counters["heartbeats"] += 1
             except Exception as e:
-                logger.warning(f"Connection dead during ping in chat {chat_id}: {str(e)}")
-                self._remove_dead_connection(chat_id, websocket)
+                logger.error(f"Error in connection heartbeat: {str(e)}")
 
     def get_stats(self) -> dict:
         """Get connection statistics"""
-        total_connections = sum(len(connections) for connections in self.active_connections.values())
+        live = list(self.outbound.values())
         return {
-            "total_connections": total_connections,
+            "backplane": self.backplane.stats() if self.backplane else None,
+            "outbound": {
+                "policy": self.slow_consumer_policy,
+                "queued": sum(o._queue.qsize() for o in live),
+                "sent": self._retired["sent"] + sum(o.sent for o in live),
+                "dropped_messages": self._retired["dropped"] + sum(o.dropped for o in live),
+                "send_timeouts": self._retired["timeouts"] + sum(o.timeouts for o in live),
+            },
+            "heartbeat": {
+                "interval": self.heartbeat_interval,
+                "running": bool(self._heartbeat_task and not self._heartbeat_task.done()),
+            },
+            **self.counters,
+            "total_connections": len(self.connection_index),
             "active_chats": len(self.active_connections),
             "connected_users": len(self.user_connections),
             "chats_with_connections": {
@@ -176,18 +372,12 @@ class ConnectionManager:
 
 
 # Global instance
-ws_manager = ConnectionManager()
-
-# Optional: Background task to clean up dead connections
-async def cleanup_dead_connections():
-    """Background task to periodically clean up dead connections"""
-    while True:
-        try:
-            await ws_manager.ping_connections()
-            await asyncio.sleep(30)
-        except Exception as e:
-            logger.error(f"Error in connection cleanup task: {str(e)}")
-            await asyncio.sleep(60)
-
-
-# asyncio.create_task(cleanup_dead_connections())
+ws_manager = ConnectionManager(
+    backplane=create_backplane(settings.WS_BACKPLANE, channel=settings.WS_BACKPLANE_CHANNEL),
+    send_timeout=settings.WS_SEND_TIMEOUT,
+    send_queue_size=settings.WS_SEND_QUEUE_SIZE,
+    slow_consumer_policy=settings.WS_SLOW_CONSUMER_POLICY,
+    heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL,
+    heartbeat_jitter=settings.WS_HEARTBEAT_JITTER,
+    transient_interval=settings.WS_BACKPLANE_TRANSIENT_INTERVAL,
+)
@@ -2,7 +2,7 @@ from dotenv import load_dotenv
 import os
 from pathlib import Path
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 from loguru import logger
 
 # Load .env file
@@ -23,6 +23,124 @@ class Settings(BaseSettings):
     DATABASE_HOST: Optional[str] = None
     DATABASE_PORT: Optional[int] = None
 
+    # Connection pool
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 20
+    DB_POOL_ACQUIRE_TIMEOUT: float = 10.0
+    DB_POOL_MAX_WAITING: int = 0  # 0 = unbounded
+    DB_POOL_MAX_IDLE: float = 300.0
+    DB_POOL_MAX_LIFETIME: float = 3600.0
+
+    # Off-loop execution of blocking work
+    BLOCKING_POOL_SIZE: int = 8
+    BLOCKING_QUEUE_LIMIT: int = 64
+    LOOP_LAG_INTERVAL: float = 0.5
+    LOOP_LAG_THRESHOLD_MS: float = 100.0
+
+    # Session token cache (per process)
+    TOKEN_CACHE_MAX_SIZE: int = 10_000
+    TOKEN_CACHE_TTL: float = 60.0
+
+    # Conversation history cache (per process)
+    HISTORY_CACHE_MAX_CHATS: int = 1000
+    HISTORY_CACHE_IDLE_TTL: float = 3600.0
+    HISTORY_DELTA_WINDOW: float = 30.0  # seconds re-read before the newest row, for rows that commit late
+
+    # Sender profile cache (per process); other workers' edits show up after the TTL
+    PROFILE_CACHE_MAX_SIZE: int = 10_000
+    PROFILE_CACHE_TTL: float = 300.0
+
+    # Intake agent context window
+    INTAKE_RECENT_TURNS: int = 12
+    INTAKE_HISTORY_TOKEN_BUDGET: int = 3000
+    INTAKE_SUMMARY_FOLD_CHUNK: int = 6
+    CHARS_PER_TOKEN: float = 4.0
+    # Parse the transcript (backend/intake.py) alongside the reply on some turns, so a report
+    # due on that turn starts from it; cancelled when the reply does not make the report due
+    INTAKE_SPECULATIVE_PARSE: bool = True
+    INTAKE_SPECULATE_MIN_TURNS: int = 4  # first user turn (after the opening message) that may speculate
+    INTAKE_SPECULATE_EVERY: int = 2      # then every n-th user turn
+
+    # Shared LLM HTTP clients
+    LLM_HTTP2: bool = True
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+
+    # Admission control per LLM base_url (agents/limiter.py); intake turns are served before report stages
+    LLM_ENDPOINT_CONCURRENCY: int = 8
+    LLM_ENDPOINT_LIMITS: Dict[str, int] = {}  # base_url -> in-flight cap
+    LLM_QUEUE_LIMIT: int = 32
+    LLM_SHED_RETRY_AFTER: float = 5.0
+
+    # Per-endpoint circuit breakers and per-call routing (agents/router.py)
+    LLM_BREAKER_WINDOW: int = 20          # recent calls considered
+    LLM_BREAKER_MIN_CALLS: int = 5
+    LLM_BREAKER_FAILURE_RATE: float = 0.5
+    LLM_BREAKER_COOLDOWN: float = 30.0    # seconds open before half-open probing
+    LLM_BREAKER_PROBES: int = 1
+    LLM_ROUTER_LATENCY_RATIO: float = 2.0  # prefer the fallback when the primary is this much slower per token; 0 = never
+    LLM_ROUTER_LATENCY_MAX_AGE: float = 120.0  # seconds; older samples are ignored, so the primary is retried
+
+    # LLM retries: one budget per logical request, shared by fallbacks and format retries
+    LLM_RETRY_MAX_ATTEMPTS: int = 4      # model calls per request, across endpoints
+    LLM_RETRY_BASE_DELAY: float = 0.5    # backoff is uniform in [0, min(max, base * 2^n)]
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_REQUEST_DEADLINE: float = 300.0  # seconds; caps each attempt's timeout too
+
+    # LLM response cache (agents/response_cache.py); agents opt out with cache="off"
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_SIZE: int = 2000
+    LLM_CACHE_TTL: float = 3600.0
+
+    # Keyset pagination
+    CHAT_MESSAGES_PAGE_SIZE: int = 100
+    CHAT_LIST_PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 500
+
+    # Empty chat session cleanup
+    JANITOR_ENABLED: bool = True
+    JANITOR_INTERVAL: float = 300.0
+    JANITOR_BATCH_SIZE: int = 500
+    EMPTY_SESSION_GRACE: float = 300.0  # sessions without messages older than this are deleted
+
+    # Per-chat message serialisation
+    CHAT_LOCK_DISTRIBUTED: bool = False  # PostgreSQL advisory locks; enable when running several workers
+    CHAT_LOCK_TIMEOUT: float = 120.0
+    CHAT_LOCK_POOL_SIZE: int = 10  # dedicated connections holding advisory locks, separate from the DB pool
+
+    # Doctor report job queue
+    REPORT_WORKER_IN_PROCESS: bool = True  # also run a worker inside the API process
+    REPORT_WORKER_CONCURRENCY: int = 2
+    REPORT_ENDPOINT_CONCURRENCY: int = 2   # running jobs per model endpoint, across all workers
+    REPORT_ENDPOINT_LIMITS: Dict[str, int] = {}
+    REPORT_POLL_INTERVAL: float = 2.0
+    REPORT_JOB_TIMEOUT: float = 900.0
+    REPORT_JOB_MAX_ATTEMPTS: int = 5
+    REPORT_RETRY_BACKOFF_BASE: float = 5.0
+    REPORT_RETRY_BACKOFF_MAX: float = 300.0
+
+    # Geocoding / nearby facility cache (SQLite file shared by workers on a host)
+    GEO_CACHE_PATH: Optional[str] = "geo_cache.sqlite3"  # empty/None keeps it in memory only
+    GEO_CACHE_MAX_ENTRIES: int = 50_000
+    GEO_CACHE_MEMORY_ENTRIES: int = 2048
+    GEOCODE_CACHE_TTL: float = 30 * 86400.0
+    PLACES_CACHE_TTL: float = 7 * 86400.0
+    GEO_EMPTY_CACHE_TTL: float = 3600.0
+    FACILITY_INDEX_PATH: Optional[str] = None  # built with `python -m tools.facility_index build`
+    FACILITY_OFFLINE: bool = False             # never call Nominatim/Overpass (needs the index)
+
+    # WebSocket fan-out across worker processes: "postgres" (LISTEN/NOTIFY), "memory" or "none".
+    # Use "postgres" with several API workers or a report worker outside the API process.
+    WS_BACKPLANE: str = "none"
+    WS_BACKPLANE_CHANNEL: str = "ws_fanout"
+    WS_BACKPLANE_TRANSIENT_INTERVAL: float = 0.5  # batch bot_delta/typing per chat for other workers; 0 = local only
+    WS_SEND_TIMEOUT: float = 5.0
+    WS_SEND_QUEUE_SIZE: int = 256               # per socket
+    WS_SLOW_CONSUMER_POLICY: str = "disconnect"  # or "drop_oldest"
+    WS_HEARTBEAT_INTERVAL: float = 30.0          # 0 disables the ping/reap loop
+    WS_HEARTBEAT_JITTER: float = 0.2
+
     # API keys
     SEALION_API_KEY: Optional[str] = None
 
@@ -14,6 +14,8 @@ export default function Chat() {
   const [connectionStatus, setConnectionStatus] = useState("disconnected");
   const [typing, setTyping] = useState({ isTyping: false, sender: null });
   const [useWebSocket, setUseWebSocket] = useState(true);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [chatsCursor, setChatsCursor] = useState(null);
 
   const listRef = useRef(null);
   const wsRef = useRef(null);
@@ -34,6 +36,7 @@ export default function Chat() {
         // FIX: Use correct endpoint for getting chat list
         const { data } = await api.get("/chat/list");
         setChats(data.chats || []);
+        setChatsCursor(data.next_cursor || null);
       } catch (e) {
         console.error("Failed to fetch chats:", e);
       }
@@ -167,10 +170,14 @@ export default function Chat() {
 
       case "new_message":
         setMessages(prev => {
-          const exists = prev.some(m => m.id === data.message.id);
-          if (exists) return prev;
-
-          return [...prev, {
+          // Drop the streamed draft this message finalises
+          const base = data.stream_id
+            ? prev.filter(m => m.id !== `stream_${data.stream_id}`)
+            : prev;
+          const exists = base.some(m => m.id === data.message.id);
+          if (exists) return base;
+
+          return [...base, {
             ...data.message,
             created_at: data.message.created_at
           }];
@@ -178,6 +185,31 @@ export default function Chat() {
         scrollToBottom();
         break;
 
+      case "bot_delta":
+        setTyping({ isTyping: false, sender: null });
+        setMessages(prev => {
+          const draftId = `stream_${data.stream_id}`;
+          const index = prev.findIndex(m => m.id === draftId);
+          if (index === -1) {
+            return [...prev, {
+              id: draftId,
+              sender: "bot",
+              content: data.delta,
+              created_at: new Date().toISOString()
+            }];
+          }
+          const updated = [...prev];
+          updated[index] = { ...updated[index], content: updated[index].content + data.delta };
+          return updated;
+        });
+        scrollToBottom();
+        break;
+
+      case "bot_stream_discard":
+        // Generation failed partway; a retry streams under a new id
+        setMessages(prev => prev.filter(m => m.id !== `stream_${data.stream_id}`));
+        break;
+
       case "message_sent":
         setMessages(prev => {
           const updated = [...prev];
@@ -292,11 +324,34 @@ export default function Chat() {
       setChatId(id);
       localStorage.setItem("chat_id", id);
       setMessages(data.messages || []);
+      setOlderCursor(data.has_more ? data.cursors.before : null);
     } catch (e) {
       console.error("Failed to load chat:", e);
     }
   }
 
+  async function loadOlderMessages() {
+    if (!chatId || !olderCursor) return;
+    try {
+      const { data } = await api.get(`/chat/${chatId}`, { params: { before: olderCursor } });
+      setMessages((m) => [...(data.messages || []), ...m]);
+      setOlderCursor(data.has_more ? data.cursors.before : null);
+    } catch (e) {
+      console.error("Failed to load earlier messages:", e);
+    }
+  }
+
+  async function loadMoreChats() {
+    if (!chatsCursor) return;
+    try {
+      const { data } = await api.get("/chat/list", { params: { before: chatsCursor } });
+      setChats((c) => [...c, ...(data.chats || [])]);
+      setChatsCursor(data.next_cursor || null);
+    } catch (e) {
+      console.error("Failed to load more chats:", e);
+    }
+  }
+
   async function send() {
     if (!input.trim() || sending) return;
 
@@ -345,10 +400,12 @@ export default function Chat() {
         localStorage.setItem("chat_id", data.chat_id);
         setChatId(data.chat_id);
         setMessages(data.messages || []);
+        setOlderCursor(null);
 
         try {
           const { data: chatsData } = await api.get("/chat/list");
           setChats(chatsData.chats || []);
+          setChatsCursor(chatsData.next_cursor || null);
         } catch (e) {
           console.warn("Failed to refresh chat list:", e);
         }
@@ -380,6 +437,7 @@ export default function Chat() {
         try {
           const { data: chatsData } = await api.get("/chat/list");
           setChats(chatsData.chats || []);
+          setChatsCursor(chatsData.next_cursor || null);
         } catch (e) {
           console.warn("Failed to refresh chat list:", e);
         }
@@ -404,9 +462,11 @@ export default function Chat() {
           setChatId(data.chat_id);
           localStorage.setItem("chat_id", data.chat_id);
           setMessages(data.messages || []);
+          setOlderCursor(null);
 
           const { data: chatsData } = await api.get("/chat/list");
           setChats(chatsData.chats || []);
+          setChatsCursor(chatsData.next_cursor || null);
 
         } catch (retryError) {
           console.error("Failed to create new chat during retry:", retryError);
@@ -439,6 +499,7 @@ export default function Chat() {
 
       setChatId(data.chat_id);
       setMessages(data.messages || []);
+      setOlderCursor(null);
       localStorage.setItem("chat_id", data.chat_id);
 
       if (useWebSocket) {
@@ -449,6 +510,7 @@ export default function Chat() {
 
       const { data: chatsData } = await api.get("/chat/list");
       setChats(chatsData.chats || []);
+      setChatsCursor(chatsData.next_cursor || null);
 
       console.log("New chat created:", data.chat_id);
     } catch (error) {
@@ -463,7 +525,9 @@ export default function Chat() {
     localStorage.removeItem("chat_id");
     setChatId("");
     setMessages([]);
+    setOlderCursor(null);
     setChats([]);
+    setChatsCursor(null);
 
     // Disconnect from old WebSocket
     disconnectWebSocket();
@@ -522,6 +586,11 @@ export default function Chat() {
               {c.topic || `Chat ${c.chat_id.slice(0, 6)}`}
             </button>
           ))}
+          {chatsCursor && (
+            <button onClick={loadMoreChats} className="w-full px-4 py-2 text-xs text-gray-400 hover:text-white">
+              Load more
+            </button>
+          )}
         </div>
         <div className="p-4 space-y-2 border-t border-white/10">
           <label className="flex items-center text-xs text-gray-400">
@@ -577,6 +646,13 @@ export default function Chat() {
                 Kesehatan anda adalah prioritas kami.
               </div>
             )}
+            {olderCursor && (
+              <div className="text-center">
+                <button onClick={loadOlderMessages} className="text-xs text-gray-400 hover:text-white">
+                  Load earlier messages
+                </button>
+              </div>
+            )}
             {messages.map((m) => (
               <div key={m.id} className={`flex ${m.sender === "user" ? "justify-end" : "justify-start"}`}>
                 <div
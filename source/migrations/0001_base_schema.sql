@@ -0,0 +1,57 @@
+-- Core tables the API reads and writes. Everything is IF NOT EXISTS so an
+-- existing database adopts the migration history without changes.
+
+CREATE EXTENSION IF NOT EXISTS pgcrypto;  -- gen_random_uuid(), digest()
+
+CREATE TABLE IF NOT EXISTS users (
+    id             uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    email          text NOT NULL,
+    display_name   text NOT NULL,
+    password_hash  text NOT NULL,
+    status         text NOT NULL DEFAULT 'active',
+    locale         text NOT NULL DEFAULT 'id-ID',
+    date_of_birth  date,
+    address_line1  text,
+    address_line2  text,
+    city           text,
+    province       text,
+    postal_code    text,
+    gender         text,
+    created_at     timestamptz NOT NULL DEFAULT now(),
+    updated_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_uq ON users (email);
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+    id                  uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id             uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    session_token_hash  bytea NOT NULL,
+    created_at          timestamptz NOT NULL DEFAULT now(),
+    expires_at          timestamptz NOT NULL,
+    revoked_at          timestamptz
+);
+
+-- decode_jwt_token / logout: lookup by sha256(token)
+CREATE UNIQUE INDEX IF NOT EXISTS user_sessions_token_hash_uq
+    ON user_sessions (session_token_hash);
+CREATE INDEX IF NOT EXISTS user_sessions_user_id_idx
+    ON user_sessions (user_id);
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id     uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    topic       text,
+    started_at  timestamptz NOT NULL DEFAULT now(),
+    ended_at    timestamptz
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    chat_id     uuid NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    sender      text NOT NULL CHECK (sender IN ('user', 'bot', 'system')),
+    content     text NOT NULL,
+    created_at  timestamptz NOT NULL DEFAULT now()
+);
+
+-- Per-chat reads are ordered by (created_at, id); the composite index is in 0004.
@@ -0,0 +1,38 @@
+-- Durable queue for the doctor report pipeline (backend/jobs.py).
+-- One job per chat (idempotency_key); workers claim with FOR UPDATE SKIP LOCKED.
+
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id               uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    chat_id          uuid NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    user_id          uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key  text NOT NULL,
+    endpoint         text NOT NULL,
+    payload          jsonb NOT NULL DEFAULT '{}'::jsonb,
+    status           text NOT NULL DEFAULT 'queued'
+                     CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    attempts         integer NOT NULL DEFAULT 0,
+    max_attempts     integer NOT NULL DEFAULT 5,
+    run_after        timestamptz NOT NULL DEFAULT now(),
+    locked_by        text,
+    locked_at        timestamptz,
+    last_error       text,
+    created_at       timestamptz NOT NULL DEFAULT now(),
+    updated_at       timestamptz NOT NULL DEFAULT now(),
+    finished_at      timestamptz
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS report_jobs_idempotency_key_uq
+    ON report_jobs (idempotency_key);
+
+-- claim path: queued jobs whose backoff has elapsed
+CREATE INDEX IF NOT EXISTS report_jobs_ready_idx
+    ON report_jobs (run_after)
+    WHERE status = 'queued';
+
+-- per-endpoint running counts and stale-lock reaping
+CREATE INDEX IF NOT EXISTS report_jobs_running_idx
+    ON report_jobs (endpoint, locked_at)
+    WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS report_jobs_chat_idx
+    ON report_jobs (chat_id, created_at DESC);
@@ -0,0 +1,12 @@
+-- Overflow for WebSocket backplane messages larger than a NOTIFY payload
+-- (backend/wsocket/backplane.py). Rows are only read right after the NOTIFY
+-- and pruned by publishers after a few minutes.
+
+CREATE TABLE IF NOT EXISTS ws_outbox (
+    id          bigserial PRIMARY KEY,
+    payload     text NOT NULL,
+    created_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ws_outbox_created_at_idx
+    ON ws_outbox (created_at);
@@ -0,0 +1,8 @@
+-- Keyset pagination on (created_at, id) for GET /chat/{chat_id} and GET /chat/list.
+-- Also serves the history cache's delta query (chat_id = ? AND created_at >= ?).
+
+CREATE INDEX IF NOT EXISTS chat_messages_chat_created_id_idx
+    ON chat_messages (chat_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS chat_sessions_user_started_id_idx
+    ON chat_sessions (user_id, started_at DESC, id DESC);
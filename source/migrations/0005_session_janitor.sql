@@ -0,0 +1,17 @@
+-- Background cleanup of chat sessions that never got a message (backend/janitor.py).
+-- The janitor walks chat_sessions in (started_at, id) order from a persisted
+-- cursor, so each session is examined once instead of anti-joining the whole
+-- table on every /chat/list request.
+
+CREATE TABLE IF NOT EXISTS janitor_state (
+    name        text PRIMARY KEY,
+    cursor_ts   timestamptz NOT NULL DEFAULT '-infinity',
+    cursor_id   uuid NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    updated_at  timestamptz NOT NULL DEFAULT now()
+);
+
+INSERT INTO janitor_state (name) VALUES ('empty_sessions')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS chat_sessions_started_id_idx
+    ON chat_sessions (started_at, id);
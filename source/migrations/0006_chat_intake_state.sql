@@ -0,0 +1,14 @@
+-- Structured intake kept per chat (backend/intake.py) so the doctor report
+-- starts from the parse and language detection already done during the chat.
+-- Each output records the sha256 of the transcript it was computed from;
+-- parsed_len (transcript length) keeps a late write from replacing a newer parse.
+
+CREATE TABLE IF NOT EXISTS chat_intake_state (
+    chat_id        uuid PRIMARY KEY REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    parsed         jsonb,
+    parsed_hash    text,
+    parsed_len     integer NOT NULL DEFAULT 0,
+    tandlang       jsonb,
+    tandlang_hash  text,
+    updated_at     timestamptz NOT NULL DEFAULT now()
+);
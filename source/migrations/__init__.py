@@ -0,0 +1,114 @@
+"""Versioned SQL migrations.
+
+Files are named ``NNNN_description.sql`` and applied in order, each in its
+own transaction, by ``python -m migrations``. Applied versions are recorded
+in ``schema_migrations`` together with a checksum so edits to an already
+applied file are reported instead of silently ignored.
+"""
+import hashlib
+import re
+from pathlib import Path
+from typing import List, NamedTuple
+
+from loguru import logger
+from psycopg import AsyncConnection
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent
+_FILENAME = re.compile(r"^(\d{4})_([\w-]+)\.sql$")
+_LOCK_KEY = "schema_migrations"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    found = []
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILENAME.match(path.name)
+        if not match:
+            logger.warning(f"[migrations] ignoring {path.name}: expected NNNN_name.sql")
+            continue
+        found.append(Migration(int(match.group(1)), match.group(2), path))
+    versions = [m.version for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers")
+    return found
+
+
+async def _ensure_table(conn: AsyncConnection):
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+               version     integer PRIMARY KEY,
+               name        text NOT NULL,
+               checksum    text NOT NULL,
+               applied_at  timestamptz NOT NULL DEFAULT now())"""
+    )
+    await conn.commit()
+
+
+async def applied(conn: AsyncConnection) -> dict:
+    await _ensure_table(conn)
+    cur = await conn.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    rows = await cur.fetchall()
+    await conn.commit()
+    return {r[0]: r for r in rows}
+
+
+async def migrate(conn: AsyncConnection, target: int = None) -> List[Migration]:
+    """Apply pending migrations up to ``target``; returns what was applied.
+
+    A session advisory lock keeps concurrent deploys from racing each other.
+    """
+    await conn.execute("SELECT pg_advisory_lock(hashtext(%s))", (_LOCK_KEY,))
+    await conn.commit()
+    try:
+        done = await applied(conn)
+        ran = []
+        for m in discover():
+            if target is not None and m.version > target:
+                break
+            if m.version in done:
+                if done[m.version][2] != m.checksum:
+                    logger.warning(f"[migrations] {m.path.name} changed after it was applied")
+                continue
+            logger.info(f"[migrations] applying {m.path.name}")
+            try:
+                await conn.execute(m.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (m.version, m.name, m.checksum),
+                )
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                logger.error(f"[migrations] {m.path.name} failed; rolled back")
+                raise
+            ran.append(m)
+        return ran
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock(hashtext(%s))", (_LOCK_KEY,))
+        await conn.commit()
+
+
+async def status(conn: AsyncConnection) -> List[dict]:
+    done = await applied(conn)
+    return [
+        {
+            "version": m.version,
+            "name": m.name,
+            "applied_at": done[m.version][3] if m.version in done else None,
+            "modified": m.version in done and done[m.version][2] != m.checksum,
+        }
+        for m in discover()
+    ]
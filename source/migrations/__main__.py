@@ -0,0 +1,63 @@
+"""python -m migrations [up|status|explain]
+
+    up       apply pending migrations (default)
+    status   list migrations and whether they are applied
+    explain  EXPLAIN ANALYZE the hot-path queries; exits 1 on regressions
+"""
+import argparse
+import asyncio
+import sys
+
+from utils import connect_dedicated
+from . import migrate, status
+from .explain import explain_all
+
+
+def _build_cli() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog="python -m migrations", description="Database schema migrations.")
+    sub = ap.add_subparsers(dest="cmd")
+    up = sub.add_parser("up", help="Apply pending migrations")
+    up.add_argument("--target", type=int, help="Stop after this version")
+    sub.add_parser("status", help="Show applied and pending migrations")
+    ex = sub.add_parser("explain", help="EXPLAIN ANALYZE the canonical hot-path queries")
+    ex.add_argument("--min-rows", type=int, default=10_000, help="Flag seq scans on tables at least this big")
+    ex.add_argument("--max-ms", type=float, default=50.0, help="Flag queries slower than this")
+    ex.add_argument("--chat-id")
+    ex.add_argument("--user-id")
+    return ap.parse_args()
+
+
+async def main() -> int:
+    args = _build_cli()
+    conn = await connect_dedicated(autocommit=False)
+    try:
+        if args.cmd == "status":
+            for row in await status(conn):
+                state = "applied " + row["applied_at"].isoformat() if row["applied_at"] else "pending"
+                flag = "  (modified since applied)" if row["modified"] else ""
+                print(f"{row['version']:04d}_{row['name']:<28} {state}{flag}")
+            return 0
+
+        if args.cmd == "explain":
+            sample = None
+            if args.chat_id and args.user_id:
+                sample = {"chat_id": args.chat_id, "user_id": args.user_id, "token": args.chat_id}
+            results = await explain_all(conn, min_rows=args.min_rows, max_ms=args.max_ms, sample=sample)
+            failed = 0
+            for r in results:
+                mark = "FAIL" if r["problems"] else "ok  "
+                failed += bool(r["problems"])
+                print(f"{mark} {r['query']:<28} {r['execution_ms']:>9.3f}ms  {r['root']:<16} {', '.join(r['indexes']) or '-'}")
+                for p in r["problems"]:
+                    print(f"       - {p}")
+            return 1 if failed else 0
+
+        ran = await migrate(conn, target=getattr(args, "target", None))
+        print(f"Applied {len(ran)} migration(s)" + (": " + ", ".join(m.path.name for m in ran) if ran else ""))
+        return 0
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,135 @@
+"""EXPLAIN ANALYZE the hot-path queries and flag plan regressions.
+
+Each canonical query mirrors one the API runs per request. Plans are
+executed inside a transaction that is always rolled back. A query is
+reported as a regression when it sequentially scans a table holding more
+than ``min_rows`` rows, or runs longer than ``max_ms``.
+"""
+import json
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from psycopg import AsyncConnection
+
+# name -> (sql, parameter names filled from the sample row)
+CANONICAL_QUERIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "session_token_lookup": (
+        """SELECT user_id, EXTRACT(EPOCH FROM (expires_at - now()))
+           FROM user_sessions
+           WHERE session_token_hash = digest(%s, 'sha256')
+             AND revoked_at IS NULL AND expires_at > now()
+           LIMIT 1""",
+        ("token",),
+    ),
+    "chat_ownership": (
+        "SELECT 1 FROM chat_sessions WHERE id=%s::uuid AND user_id=%s::uuid",
+        ("chat_id", "user_id"),
+    ),
+    "chat_list_page": (
+        """SELECT id, topic, started_at, ended_at
+           FROM chat_sessions
+           WHERE user_id=%s::uuid
+           ORDER BY started_at DESC, id DESC
+           LIMIT 51""",
+        ("user_id",),
+    ),
+    "chat_messages_latest_page": (
+        """SELECT id, sender, content, created_at
+           FROM chat_messages
+           WHERE chat_id=%s
+           ORDER BY created_at DESC, id DESC
+           LIMIT 101""",
+        ("chat_id",),
+    ),
+    "chat_history_delta": (
+        """SELECT id, sender, content, created_at
+           FROM chat_messages
+           WHERE chat_id = %s AND created_at >= now() - interval '1 hour'
+           ORDER BY created_at ASC, id ASC""",
+        ("chat_id",),
+    ),
+    "user_profile": (
+        "SELECT display_name, gender, date_of_birth, province FROM users WHERE id=%s::uuid",
+        ("user_id",),
+    ),
+    "report_job_claim": (
+        """SELECT id FROM report_jobs
+           WHERE status = 'queued' AND run_after <= now()
+           ORDER BY run_after
+           LIMIT 1
+           FOR UPDATE SKIP LOCKED""",
+        (),
+    ),
+    "janitor_empty_sessions": (
+        """SELECT cs.id FROM chat_sessions cs
+           WHERE (cs.started_at, cs.id) > ('-infinity'::timestamptz, '00000000-0000-0000-0000-000000000000'::uuid)
+             AND cs.started_at < now() - interval '5 minutes'
+             AND NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.chat_id = cs.id)
+           ORDER BY cs.started_at, cs.id
+           LIMIT 500""",
+        (),
+    ),
+}
+
+
+async def _sample(conn: AsyncConnection) -> Dict[str, str]:
+    """The busiest chat and its owner, so plans reflect the worst realistic case."""
+    cur = await conn.execute(
+        """SELECT s.id, s.user_id
+           FROM chat_sessions s
+           JOIN LATERAL (SELECT count(*) AS n FROM chat_messages m WHERE m.chat_id = s.id) c ON true
+           ORDER BY c.n DESC
+           LIMIT 1"""
+    )
+    row = await cur.fetchone()
+    chat_id, user_id = (str(row[0]), str(row[1])) if row else (str(uuid.uuid4()), str(uuid.uuid4()))
+    return {"chat_id": chat_id, "user_id": user_id, "token": str(uuid.uuid4())}
+
+
+def _walk(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+async def _table_rows(conn: AsyncConnection) -> Dict[str, float]:
+    cur = await conn.execute(
+        "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+    )
+    return {name: rows for name, rows in await cur.fetchall()}
+
+
+async def explain_all(
+    conn: AsyncConnection,
+    min_rows: int = 10_000,
+    max_ms: float = 50.0,
+    sample: Optional[Dict[str, str]] = None,
+) -> List[dict]:
+    sample = sample or await _sample(conn)
+    table_rows = await _table_rows(conn)
+    results = []
+    for name, (sql, params) in CANONICAL_QUERIES.items():
+        try:
+            cur = await conn.execute(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, tuple(sample[p] for p in params)
+            )
+            raw = (await cur.fetchone())[0]
+        finally:
+            await conn.rollback()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        problems = []
+        for node in _walk(plan["Plan"]):
+            rel = node.get("Relation Name")
+            if node.get("Node Type") == "Seq Scan" and table_rows.get(rel, 0) >= min_rows:
+                problems.append(f"seq scan on {rel} (~{int(table_rows[rel])} rows)")
+        if plan["Execution Time"] > max_ms:
+            problems.append(f"{plan['Execution Time']:.1f}ms > {max_ms}ms")
+        results.append({
+            "query": name,
+            "execution_ms": round(plan["Execution Time"], 3),
+            "planning_ms": round(plan["Planning Time"], 3),
+            "root": plan["Plan"]["Node Type"],
+            "indexes": sorted({n["Index Name"] for n in _walk(plan["Plan"]) if "Index Name" in n}),
+            "problems": problems,
+        })
+    return results
@@ -1,3 +1,5 @@
 from .nearest_hospital import NearestFacilityFinder
+from .geo_cache import GeoCache
+from .facility_index import FacilityIndex
 
-__all__ = ["NearestFacilityFinder"]
\ No newline at end of file
+__all__ = ["NearestFacilityFinder", "GeoCache", "FacilityIndex"]
\ No newline at end of file
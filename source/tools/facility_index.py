@@ -0,0 +1,373 @@
+"""Offline spatial index of hospitals and pharmacies built from an OSM extract.
+
+Build once from a GeoJSON export (``osmium export``, overpass-turbo) or,
+with ``pyosmium`` installed, straight from a ``.osm.pbf``:
+
+    python -m tools.facility_index build indonesia.geojson -o facilities.npz
+    python -m tools.facility_index query facilities.npz --lat -6.2 --lon 106.8 --type hospital
+
+The index also keeps a small gazetteer of named places (``place=city|town|...``)
+so addresses can be resolved without Nominatim.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KINDS = ("hospital", "apotek")
+
+# Most specific place wins when an address names several
+PLACE_RANK = {
+    "neighbourhood": 7, "quarter": 7, "hamlet": 7,
+    "suburb": 6, "village": 6,
+    "town": 5, "municipality": 5,
+    "city": 4,
+    "county": 3, "district": 3,
+    "state": 2, "province": 2,
+}
+_MAX_NGRAM = 4
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def classify(tags: Dict[str, str]) -> Optional[str]:
+    """Facility kind for a set of OSM tags, matching the Overpass query filters."""
+    amenity, healthcare = tags.get("amenity"), tags.get("healthcare")
+    if amenity == "hospital" or healthcare == "hospital":
+        return "hospital"
+    if amenity == "pharmacy" or healthcare == "pharmacy" or tags.get("shop") == "chemist":
+        return "apotek"
+    return None
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorised great-circle distance from one origin to many points."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _centroid(geometry: dict) -> Optional[Tuple[float, float]]:
+    """(lat, lon) of a GeoJSON geometry; the vertex mean is close enough for buildings."""
+    if not geometry:
+        return None
+    coords = geometry.get("coordinates")
+    if geometry.get("type") == "Point":
+        return float(coords[1]), float(coords[0])
+    flat: List[Tuple[float, float]] = []
+
+    def walk(c):
+        if c and isinstance(c[0], (int, float)):
+            flat.append((float(c[0]), float(c[1])))
+        else:
+            for part in c or ():
+                walk(part)
+
+    walk(coords)
+    if not flat:
+        return None
+    return sum(p[1] for p in flat) / len(flat), sum(p[0] for p in flat) / len(flat)
+
+
+# ---- readers -----------------------------------------------------------------
+def iter_geojson(path: str) -> Iterator[Tuple[str, float, float, Dict[str, str]]]:
+    """Yield ``(osm_id, lat, lon, tags)`` from a GeoJSON FeatureCollection."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for feature in data.get("features", []):
+        props = feature.get("properties") or {}
+        tags = props.get("tags") if isinstance(props.get("tags"), dict) else props
+        tags = {k: v for k, v in tags.items() if isinstance(v, str)}
+        point = _centroid(feature.get("geometry"))
+        if point is None:
+            continue
+        osm_id = str(props.get("@id") or props.get("id") or feature.get("id") or "")
+        yield osm_id, point[0], point[1], tags
+
+
+def iter_pbf(path: str) -> Iterator[Tuple[str, float, float, Dict[str, str]]]:
+    """Yield facilities and places from an ``.osm.pbf`` (needs ``pyosmium``)."""
+    try:
+        import osmium
+    except ImportError as e:
+        raise RuntimeError("Reading .pbf extracts requires 'pip install osmium'") from e
+
+    found: List[Tuple[str, float, float, Dict[str, str]]] = []
+
+    class Handler(osmium.SimpleHandler):
+        def _keep(self, tags) -> Optional[Dict[str, str]]:
+            t = {tag.k: tag.v for tag in tags}
+            if classify(t) or (t.get("place") in PLACE_RANK and t.get("name")):
+                return t
+            return None
+
+        def node(self, n):
+            t = self._keep(n.tags)
+            if t is not None:
+                found.append((f"node/{n.id}", n.location.lat, n.location.lon, t))
+
+        def way(self, w):
+            t = self._keep(w.tags)
+            if t is None:
+                return
+            pts = [(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()]
+            if pts:
+                found.append((
+                    f"way/{w.id}",
+                    sum(p[0] for p in pts) / len(pts),
+                    sum(p[1] for p in pts) / len(pts),
+                    t,
+                ))
+
+    Handler().apply_file(path, locations=True)
+    return iter(found)
+
+
+# ---- index -------------------------------------------------------------------
+class FacilityIndex:
+    """In-memory grid index answering nearest-facility queries without network calls.
+
+    Points are bucketed per kind into ``cell_deg`` x ``cell_deg`` cells; a query
+    gathers the cells covering its radius and ranks the candidates with a
+    single vectorised haversine pass.
+    """
+
+    def __init__(
+        self,
+        facilities: Dict[str, np.ndarray],
+        places: Optional[Dict[str, np.ndarray]] = None,
+        *,
+        cell_deg: float = 0.05,
+    ) -> None:
+        self.cell_deg = cell_deg
+        self.lat = facilities["lat"].astype(np.float64)
+        self.lon = facilities["lon"].astype(np.float64)
+        self.kind = facilities["kind"].astype(np.int8)
+        self.ids = facilities["id"]
+        self.names = facilities["name"]
+        self.addresses = facilities["address"]
+        self.tags = facilities["tags"]
+
+        self._cells: Dict[int, Dict[Tuple[int, int], np.ndarray]] = {}
+        cy = np.floor(self.lat / cell_deg).astype(np.int64)
+        cx = np.floor(self.lon / cell_deg).astype(np.int64)
+        for k in range(len(KINDS)):
+            buckets: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+            for i in np.flatnonzero(self.kind == k):
+                buckets[(int(cy[i]), int(cx[i]))].append(int(i))
+            self._cells[k] = {c: np.asarray(ix, dtype=np.int64) for c, ix in buckets.items()}
+
+        places = places or {}
+        self._gazetteer: Dict[str, List[Tuple[int, float, float, str]]] = defaultdict(list)
+        for name, lat, lon, rank in zip(
+            places.get("name", ()), places.get("lat", ()), places.get("lon", ()), places.get("rank", ())
+        ):
+            key = " ".join(_tokens(str(name)))
+            if key:
+                self._gazetteer[key].append((int(rank), float(lat), float(lon), str(name)))
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ---- building ------------------------------------------------------------
+    @classmethod
+    def from_elements(
+        cls, elements: Iterable[Tuple[str, float, float, Dict[str, str]]], *, cell_deg: float = 0.05
+    ) -> "FacilityIndex":
+        fac: Dict[str, list] = defaultdict(list)
+        plc: Dict[str, list] = defaultdict(list)
+        seen = set()
+        for osm_id, lat, lon, tags in elements:
+            kind = classify(tags)
+            if kind is not None:
+                if osm_id and osm_id in seen:
+                    continue
+                seen.add(osm_id)
+                fac["id"].append(osm_id)
+                fac["lat"].append(lat)
+                fac["lon"].append(lon)
+                fac["kind"].append(KINDS.index(kind))
+                fac["name"].append(tags.get("name") or tags.get("official_name") or tags.get("operator") or "Unnamed")
+                fac["address"].append(", ".join(v for k, v in tags.items() if k.startswith("addr:")))
+                fac["tags"].append(json.dumps(tags, ensure_ascii=False))
+            place = tags.get("place")
+            if place in PLACE_RANK and tags.get("name"):
+                plc["name"].append(tags["name"])
+                plc["lat"].append(lat)
+                plc["lon"].append(lon)
+                plc["rank"].append(PLACE_RANK[place])
+
+        facilities = {
+            "lat": np.asarray(fac["lat"], dtype=np.float64),
+            "lon": np.asarray(fac["lon"], dtype=np.float64),
+            "kind": np.asarray(fac["kind"], dtype=np.int8),
+            "id": np.asarray(fac["id"], dtype=str),
+            "name": np.asarray(fac["name"], dtype=str),
+            "address": np.asarray(fac["address"], dtype=str),
+            "tags": np.asarray(fac["tags"], dtype=str),
+        }
+        places = {
+            "name": np.asarray(plc["name"], dtype=str),
+            "lat": np.asarray(plc["lat"], dtype=np.float64),
+            "lon": np.asarray(plc["lon"], dtype=np.float64),
+            "rank": np.asarray(plc["rank"], dtype=np.int8),
+        }
+        return cls(facilities, places, cell_deg=cell_deg)
+
+    @classmethod
+    def build(cls, path: str, *, cell_deg: float = 0.05) -> "FacilityIndex":
+        reader = iter_pbf if path.endswith(".pbf") else iter_geojson
+        return cls.from_elements(reader(path), cell_deg=cell_deg)
+
+    def save(self, path: str) -> None:
+        names, lats, lons, ranks = [], [], [], []
+        for entries in self._gazetteer.values():
+            for rank, lat, lon, name in entries:
+                names.append(name)
+                lats.append(lat)
+                lons.append(lon)
+                ranks.append(rank)
+        np.savez_compressed(
+            path,
+            lat=self.lat, lon=self.lon, kind=self.kind, id=self.ids,
+            name=self.names, address=self.addresses, tags=self.tags,
+            place_name=np.asarray(names, dtype=str),
+            place_lat=np.asarray(lats, dtype=np.float64),
+            place_lon=np.asarray(lons, dtype=np.float64),
+            place_rank=np.asarray(ranks, dtype=np.int8),
+            cell_deg=np.asarray(self.cell_deg),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "FacilityIndex":
+        with np.load(path, allow_pickle=False) as data:
+            facilities = {k: data[k] for k in ("lat", "lon", "kind", "id", "name", "address", "tags")}
+            places = {k: data[f"place_{k}"] for k in ("name", "lat", "lon", "rank")}
+            cell_deg = float(data["cell_deg"])
+        return cls(facilities, places, cell_deg=cell_deg)
+
+    # ---- queries -------------------------------------------------------------
+    def _candidates(self, kind: int, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        dlat = radius_m / 111_320.0
+        dlon = radius_m / (111_320.0 * max(math.cos(math.radians(lat)), 1e-6))
+        cells = self._cells.get(kind, {})
+        y0, y1 = math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg)
+        x0, x1 = math.floor((lon - dlon) / self.cell_deg), math.floor((lon + dlon) / self.cell_deg)
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > len(cells):
+            # Radius spans more cells than are populated: scan the populated ones
+            parts = [ix for (cy, cx), ix in cells.items() if y0 <= cy <= y1 and x0 <= cx <= x1]
+        else:
+            parts = [cells[(cy, cx)] for cy in range(y0, y1 + 1) for cx in range(x0, x1 + 1) if (cy, cx) in cells]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def nearest(self, lat: float, lon: float, facility_type: str, *, radius_m: float = 5000, k: int = 5) -> List[Dict]:
+        """Up to ``k`` facilities within ``radius_m`` of the origin, closest first."""
+        kind = KINDS.index(facility_type)
+        idx = self._candidates(kind, lat, lon, radius_m)
+        if idx.size == 0 or k <= 0:
+            return []
+        dist = haversine_km(lat, lon, self.lat[idx], self.lon[idx])
+        inside = dist <= radius_m / 1000.0
+        idx, dist = idx[inside], dist[inside]
+        if idx.size > k:
+            top = np.argpartition(dist, k - 1)[:k]
+            idx, dist = idx[top], dist[top]
+        order = np.argsort(dist, kind="stable")
+        return [
+            {
+                "id": str(self.ids[i]),
+                "name": str(self.names[i]),
+                "lat": float(self.lat[i]),
+                "lon": float(self.lon[i]),
+                "address": str(self.addresses[i]),
+                "tags": json.loads(self.tags[i]),
+                "distance_km": round(float(d), 3),
+            }
+            for i, d in zip(idx[order], dist[order])
+        ]
+
+    def geocode(self, address: str) -> Optional[Tuple[float, float, str]]:
+        """Resolve an address to the most specific gazetteer place it mentions."""
+        toks = _tokens(address or "")
+        best: Optional[Tuple[int, int, float, float, str]] = None
+        for n in range(min(_MAX_NGRAM, len(toks)), 0, -1):
+            for i in range(len(toks) - n + 1):
+                for rank, lat, lon, name in self._gazetteer.get(" ".join(toks[i:i + n]), ()):
+                    cand = (rank, n, lat, lon, name)
+                    if best is None or cand[:2] > best[:2]:
+                        best = cand
+        if best is None:
+            return None
+        return best[2], best[3], best[4]
+
+    def stats(self) -> dict:
+        return {
+            "facilities": {kind: int((self.kind == i).sum()) for i, kind in enumerate(KINDS)},
+            "places": sum(len(v) for v in self._gazetteer.values()),
+            "cell_deg": self.cell_deg,
+        }
+
+
+# ---- CLI ---------------------------------------------------------------------
+def _build_cli() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Build or query the offline facility index.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="Import a GeoJSON or .osm.pbf extract")
+    b.add_argument("source")
+    b.add_argument("-o", "--output", default="facilities.npz")
+    b.add_argument("--cell-deg", type=float, default=0.05)
+
+    q = sub.add_parser("query", help="Nearest facilities around a point or address")
+    q.add_argument("index")
+    q.add_argument("--type", choices=list(KINDS), default="hospital")
+    q.add_argument("--lat", type=float)
+    q.add_argument("--lon", type=float)
+    q.add_argument("--address")
+    q.add_argument("--radius", type=int, default=5000)
+    q.add_argument("--limit", type=int, default=5)
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = _build_cli()
+    if args.cmd == "build":
+        started = time.perf_counter()
+        index = FacilityIndex.build(args.source, cell_deg=args.cell_deg)
+        index.save(args.output)
+        print(f"Indexed {index.stats()} in {time.perf_counter() - started:.1f}s -> {args.output}")
+        return
+
+    index = FacilityIndex.load(args.index)
+    lat, lon = args.lat, args.lon
+    if args.address:
+        hit = index.geocode(args.address)
+        if hit is None:
+            print("Address not found in gazetteer", file=sys.stderr)
+            sys.exit(1)
+        lat, lon, display = hit
+        print(f"Resolved to {display} ({lat:.5f}, {lon:.5f})")
+    if lat is None or lon is None:
+        print("Provide --lat/--lon or --address", file=sys.stderr)
+        sys.exit(1)
+    started = time.perf_counter()
+    results = index.nearest(lat, lon, args.type, radius_m=args.radius, k=args.limit)
+    elapsed_us = (time.perf_counter() - started) * 1e6
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"{len(results)} results in {elapsed_us:.0f}us", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
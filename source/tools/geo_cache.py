@@ -0,0 +1,201 @@
+from __future__ import annotations
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _LeaderCancelled(Exception):
+    """The caller doing a coalesced fetch was cancelled before it finished."""
+
+
+class GeoCache:
+    """Two-level TTL cache for geocoding and place lookups.
+
+    Entries live in a small in-memory LRU backed by an optional SQLite file,
+    so results survive restarts and are shared by every worker on the host.
+    ``get_or_fetch`` is single-flight: concurrent callers asking for the same
+    key (e.g. the hospital and apotek searches for one address) wait on a
+    single upstream request instead of each issuing their own.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        *,
+        max_entries: int = 50_000,
+        memory_entries: int = 2048,
+        prune_every: int = 200,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.prune_every = prune_every
+
+        self._mem: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.errors = 0
+
+    # ---- storage -------------------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS geo_cache (
+                       kind TEXT NOT NULL,
+                       key TEXT NOT NULL,
+                       value TEXT NOT NULL,
+                       expires_at REAL NOT NULL,
+                       PRIMARY KEY (kind, key))"""
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS geo_cache_expires ON geo_cache (expires_at)")
+            self._db = db
+        return self._db
+
+    def _db_get(self, kind: str, key: str) -> Optional[Tuple[float, Any]]:
+        with self._db_lock:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM geo_cache WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        if not row or row[1] <= time.time():
+            return None
+        return row[1], json.loads(row[0])
+
+    def _db_put(self, kind: str, key: str, value: Any, expires_at: float) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._db_lock:
+            db = self._conn()
+            db.execute(
+                "INSERT OR REPLACE INTO geo_cache (kind, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (kind, key, payload, expires_at),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                db.execute("DELETE FROM geo_cache WHERE expires_at <= ?", (time.time(),))
+                db.execute(
+                    """DELETE FROM geo_cache WHERE rowid IN (
+                           SELECT rowid FROM geo_cache ORDER BY expires_at
+                           LIMIT max(0, (SELECT count(*) FROM geo_cache) - ?))""",
+                    (self.max_entries,),
+                )
+
+    def _mem_get(self, k: Tuple[str, str]) -> Optional[Tuple[float, Any]]:
+        entry = self._mem.get(k)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._mem.pop(k, None)
+            return None
+        self._mem.move_to_end(k)
+        return entry
+
+    def _mem_put(self, k: Tuple[str, str], entry: Tuple[float, Any]) -> None:
+        self._mem[k] = entry
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    # ---- public API ----------------------------------------------------------
+    async def get(self, kind: str, key: str) -> Tuple[bool, Any]:
+        k = (kind, key)
+        entry = self._mem_get(k)
+        if entry is None and self.path:
+            try:
+                entry = await asyncio.to_thread(self._db_get, kind, key)
+            except sqlite3.Error:
+                self.errors += 1
+            if entry is not None:
+                self._mem_put(k, entry)
+        if entry is None:
+            return False, None
+        return True, entry[1]
+
+    async def put(self, kind: str, key: str, value: Any, ttl: float) -> None:
+        expires_at = time.time() + ttl
+        self._mem_put((kind, key), (expires_at, value))
+        if self.path:
+            try:
+                await asyncio.to_thread(self._db_put, kind, key, value, expires_at)
+            except sqlite3.Error:
+                self.errors += 1  # the in-memory copy still serves this process
+
+    async def get_or_fetch(
+        self,
+        kind: str,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        *,
+        ttl: float,
+        empty_ttl: float | None = None,
+    ) -> Tuple[Any, bool]:
+        """Return ``(value, fetched)``; ``fetched`` is True only for the caller that hit the network.
+
+        Empty results (``None``/``[]``) are cached for ``empty_ttl`` so a bad
+        address doesn't retry upstream every time but recovers sooner.
+        """
+        hit, value = await self.get(kind, key)
+        if hit:
+            self.hits += 1
+            return value, False
+
+        k = (kind, key)
+        while (pending := self._inflight.get(k)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending), False
+            except _LeaderCancelled:
+                continue  # its caller went away; this one still wants the answer
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[k] = future
+        try:
+            self.fetches += 1
+            value = await fetch()
+            empty = value is None or value == [] or value == {}
+            ttl_ = (empty_ttl if empty_ttl is not None else ttl) if empty else ttl
+            if ttl_ > 0:
+                await self.put(kind, key, value, ttl_)
+            future.set_result(value)
+            return value, True
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(k, None)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "path": self.path,
+            "memory_entries": len(self._mem),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "fetches": self.fetches,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
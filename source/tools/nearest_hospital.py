@@ -4,13 +4,23 @@ import json
 import os
 import sys
 import asyncio
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
 
 import aiohttp
 
+from .geo_cache import GeoCache
+
+if TYPE_CHECKING:
+    from .facility_index import FacilityIndex
+
 
 class NearestFacilityFinder:
-    """Find nearby facilities (hospital/apotek) using OSM (Nominatim + Overpass)."""
+    """Find nearby facilities (hospital/apotek) using OSM (Nominatim + Overpass).
+
+    With a local ``FacilityIndex`` the place lookup runs in-process; with
+    ``offline=True`` addresses are resolved from the index gazetteer too and
+    no public OSM service is contacted.
+    """
 
     NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
     OVERPASS_URL = "https://overpass-api.de/api/interpreter"
@@ -26,6 +36,13 @@ class NearestFacilityFinder:
         nominatim_url: str | None = None,
         overpass_url: str | None = None,
         session: aiohttp.ClientSession | None = None,
+        cache: GeoCache | None = None,
+        geocode_ttl: float = 30 * 86400,
+        places_ttl: float = 7 * 86400,
+        empty_ttl: float = 3600,
+        origin_precision: int = 3,
+        index: FacilityIndex | None = None,
+        offline: bool = False,
     ) -> None:
         self.contact_email = contact_email or os.getenv("OSM_CONTACT", "contact@example.com")
         self.lang = lang
@@ -35,6 +52,13 @@ class NearestFacilityFinder:
         self.nominatim_url = nominatim_url or self.NOMINATIM_URL
         self.overpass_url = overpass_url or self.OVERPASS_URL
         self._session: aiohttp.ClientSession | None = session
+        self.cache = cache
+        self.geocode_ttl = geocode_ttl
+        self.places_ttl = places_ttl
+        self.empty_ttl = empty_ttl
+        self.origin_precision = origin_precision  # 3 decimals ~ 110 m
+        self.index = index
+        self.offline = offline
 
     # ---- utilities -----------------------------------------------------------
     def _user_agent(self) -> str:
@@ -69,6 +93,60 @@ class NearestFacilityFinder:
         state: Optional[str] = None,
         country: Optional[str] = None,
         postalcode: Optional[str] = None,
+    ) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+        result, _ = await self._geocode(
+            address=address, street=street, city=city, state=state,
+            country=country, postalcode=postalcode
+        )
+        return result
+
+    async def _geocode(self, **addr) -> Tuple[Tuple[Optional[float], Optional[float], Optional[str]], bool]:
+        """Geocode through the cache; the flag says whether Nominatim was actually called."""
+        if self.offline:
+            return self._geocode_local(**addr), False
+        try:
+            if self.cache is None:
+                result, fetched = await self._geocode_remote(**addr), True
+            else:
+                key = json.dumps(
+                    {"lang": self.lang, **{k: " ".join(v.lower().split()) for k, v in addr.items() if v}},
+                    sort_keys=True, ensure_ascii=False,
+                )
+                # Misses are stored as [] so they get the short empty_ttl
+                value, fetched = await self.cache.get_or_fetch(
+                    "geocode", key,
+                    lambda: self._geocode_remote_cacheable(**addr),
+                    ttl=self.geocode_ttl, empty_ttl=self.empty_ttl,
+                )
+                result = tuple(value) if value else (None, None, None)
+        except Exception:
+            if self.index is None:
+                raise
+            result, fetched = (None, None, None), True
+        if result[0] is None and self.index is not None:
+            return self._geocode_local(**addr), fetched
+        return result, fetched
+
+    def _geocode_local(self, **addr) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+        if self.index is None:
+            return None, None, None
+        hit = self.index.geocode(self._addr_label(**{k: addr.get(k) for k in (
+            "address", "street", "city", "state", "country", "postalcode")}))
+        return hit if hit else (None, None, None)
+
+    async def _geocode_remote_cacheable(self, **addr) -> list:
+        lat, lon, display = await self._geocode_remote(**addr)
+        return [lat, lon, display] if lat is not None and lon is not None else []
+
+    async def _geocode_remote(
+        self,
+        *,
+        address: Optional[str] = None,
+        street: Optional[str] = None,
+        city: Optional[str] = None,
+        state: Optional[str] = None,
+        country: Optional[str] = None,
+        postalcode: Optional[str] = None,
     ) -> Tuple[Optional[float], Optional[float], Optional[str]]:
         params = {
             "format": "jsonv2",
@@ -138,6 +216,40 @@ class NearestFacilityFinder:
         return f"[out:json][timeout:25];({body});out center tags;"
 
     async def query_places(self, lat: float, lon: float, radius_m: int, facility_type: str) -> List[Dict]:
+        places, _ = await self._query_places(lat, lon, radius_m, facility_type)
+        return places
+
+    async def _query_places(
+        self, lat: float, lon: float, radius_m: int, facility_type: str,
+        pause: float = 0.0, limit: Optional[int] = None,
+    ) -> Tuple[List[Dict], bool]:
+        """Places around a rounded origin, so nearby addresses share one Overpass result.
+
+        ``pause`` is slept only when Overpass is actually called.
+        """
+        radius_m, ft = int(radius_m), self._normalize_type(facility_type)
+        if self.index is not None:
+            k = len(self.index) if limit is None else limit
+            return self.index.nearest(lat, lon, ft, radius_m=radius_m, k=k), False
+
+        async def fetch(qlat: float, qlon: float) -> List[Dict]:
+            if pause > 0:
+                await asyncio.sleep(pause)
+            return await self._query_places_remote(qlat, qlon, radius_m, ft)
+
+        if self.cache is None:
+            return await fetch(lat, lon), True
+        rlat, rlon = round(lat, self.origin_precision), round(lon, self.origin_precision)
+        key = f"{ft}:{radius_m}:{rlat}:{rlon}"
+        places, fetched = await self.cache.get_or_fetch(
+            "places", key,
+            lambda: fetch(rlat, rlon),
+            ttl=self.places_ttl, empty_ttl=self.empty_ttl,
+        )
+        # Callers annotate the dicts (distance_km, kind); don't mutate the cached copies
+        return [dict(p) for p in places], fetched
+
+    async def _query_places_remote(self, lat: float, lon: float, radius_m: int, facility_type: str) -> List[Dict]:
         q = self.build_overpass_query(lat, lon, radius_m, facility_type)
         async with self._get_session().post(self.overpass_url, data=q.encode("utf-8"), timeout=self.overpass_timeout) as r:
             data = await r.json()
@@ -209,7 +321,7 @@ class NearestFacilityFinder:
         country: Optional[str] = None,
         postalcode: Optional[str] = None,
     ) -> List[str]:
-        lat, lon, display = await self.geocode(
+        (lat, lon, display), geocoded = await self._geocode(
             address=address, street=street, city=city, state=state,
             country=country, postalcode=postalcode
         )
@@ -218,10 +330,9 @@ class NearestFacilityFinder:
         if not lat or not lon:
             return []
 
-        if self.polite_sleep > 0:
-            await asyncio.sleep(self.polite_sleep)
-
-        places = await self.query_places(lat, lon, radius_m, facility_type)
+        # Space out back-to-back OSM requests only; cache hits skip the sleep
+        pause = self.polite_sleep if geocoded else 0.0
+        places, _ = await self._query_places(lat, lon, radius_m, facility_type, pause=pause, limit=max(0, limit))
         for p in places:
             p["distance_km"] = round(self.haversine_km(lat, lon, p["lat"], p["lon"]), 3)
             p["kind"] = self._normalize_type(facility_type)
@@ -1,5 +1,13 @@
-from .db import get_conn, get_cursor
+from .db import get_conn, get_cursor, open_pool, close_pool, get_pool_stats, connect_dedicated
+from .executor import run_blocking, blocking_executor, loop_monitor
+from .token_cache import token_cache
 from .deps import require_user, validate_uuid, decode_jwt_token
 from .helper import format_user_prompt
+from .locks import KeyedLock
+from .pagination import encode_cursor, decode_cursor
+from .stages import StageGraph, StageTimings
 
-__all__ = ["get_conn", "get_cursor", "require_user", "validate_uuid", "format_user_prompt", "decode_jwt_token"]
\ No newline at end of file
+__all__ = ["get_conn", "get_cursor", "open_pool", "close_pool", "get_pool_stats", "connect_dedicated",
+           "run_blocking", "blocking_executor", "loop_monitor", "token_cache",
+           "require_user", "validate_uuid", "format_user_prompt", "decode_jwt_token",
+           "KeyedLock", "encode_cursor", "decode_cursor", "StageGraph", "StageTimings"]
\ No newline at end of file
@@ -1,16 +1,80 @@
-import psycopg2
-import psycopg2.extras
-import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 from config import settings
 
-def get_conn():
-    return psycopg2.connect(
+
+def _conninfo() -> str:
+    return make_conninfo(
         dbname=settings.DATABASE_NAME,
         user=settings.DATABASE_USER,
         password=settings.DATABASE_PASS,
         host=settings.DATABASE_HOST,
-        port=settings.DATABASE_PORT
+        port=settings.DATABASE_PORT,
     )
 
-def get_cursor(conn):
-    return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+# Shared by every router, dependency and background task in the process.
+# Opened in the app startup hook (or lazily by the first caller) and closed on shutdown.
+pool = AsyncConnectionPool(
+    conninfo=_conninfo(),
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    timeout=settings.DB_POOL_ACQUIRE_TIMEOUT,
+    max_idle=settings.DB_POOL_MAX_IDLE,
+    max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+    max_waiting=settings.DB_POOL_MAX_WAITING,
+    check=AsyncConnectionPool.check_connection,
+    name="caras-db",
+    open=False,
+)
+
+
+async def open_pool():
+    if pool.closed:
+        await pool.open(wait=True, timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+        logger.info(
+            f"DB pool opened (min={settings.DB_POOL_MIN_SIZE}, max={settings.DB_POOL_MAX_SIZE})"
+        )
+
+
+async def close_pool():
+    if not pool.closed:
+        await pool.close()
+        logger.info("DB pool closed")
+
+
+@asynccontextmanager
+async def get_conn(timeout: Optional[float] = None) -> AsyncIterator[AsyncConnection]:
+    """Borrow a pooled connection.
+
+    The transaction is committed when the block exits cleanly and rolled back
+    on error; the connection goes back to the pool either way.
+    """
+    if pool.closed:
+        await open_pool()
+    async with pool.connection(timeout=timeout) as conn:
+        yield conn
+
+
+async def connect_dedicated(autocommit: bool = True) -> AsyncConnection:
+    """Open a connection outside the pool, for long-lived LISTEN or session-lock holders."""
+    return await AsyncConnection.connect(_conninfo(), autocommit=autocommit)
+
+
+def get_cursor(conn: AsyncConnection):
+    return conn.cursor(row_factory=dict_row)
+
+
+def get_pool_stats() -> dict:
+    """Pool metrics (sizes, waiting clients, acquire errors/timeouts, usage counters)."""
+    if pool.closed:
+        return {"closed": True}
+    stats = pool.get_stats()
+    stats["closed"] = False
+    return stats
@@ -3,6 +3,7 @@ from uuid import UUID
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .db import get_conn
+from .token_cache import token_cache
 from loguru import logger
 import jwt
 from datetime import datetime, timezone
@@ -11,9 +12,9 @@ from typing import Optional
 
 security = HTTPBearer()
 
-def require_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UUID:
+async def require_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UUID:
     token = credentials.credentials
-    user_id = decode_jwt_token(token)
+    user_id = await decode_jwt_token(token)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     return user_id
@@ -25,7 +26,7 @@ def validate_uuid(chat_id: str):
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid chat_id")
 
-def decode_jwt_token(token: str) -> Optional[str]:
+async def decode_jwt_token(token: str) -> Optional[str]:
     """Decode either session UUID token or JWT token, return user_id"""
     if token.startswith("Bearer "):
         token = token[7:]
@@ -33,11 +34,13 @@ def decode_jwt_token(token: str) -> Optional[str]:
     # Case 1: session token (UUID-like)
     try:
         uuid.UUID(token)  # ensure it's valid UUID format
-        conn = get_conn(); cur = conn.cursor()
-        try:
-            cur.execute(
+        cached = token_cache.get(token)
+        if cached:
+            return cached
+        async with get_conn() as conn:
+            cur = await conn.execute(
                 """
-                SELECT user_id
+                SELECT user_id, EXTRACT(EPOCH FROM (expires_at - now()))
                 FROM user_sessions
                 WHERE session_token_hash = digest(%s, 'sha256')
                   AND revoked_at IS NULL
@@ -46,12 +49,11 @@ def decode_jwt_token(token: str) -> Optional[str]:
                 """,
                 (token,),
             )
-            row = cur.fetchone()
+            row = await cur.fetchone()
             if row:
                 logger.debug(f"[decode_jwt_token] Found user_id={row[0]} for session token")
+                token_cache.put(token, str(row[0]), expires_in=float(row[1]))
                 return str(row[0])   # ✅ return immediately
-        finally:
-            cur.close(); conn.close()
     except ValueError:
         # not a UUID, fall through to JWT
         pass
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from loguru import logger
+from config import settings
+
+T = TypeVar("T")
+
+
+class BlockingExecutor:
+    """Bounded thread pool for blocking work (bcrypt, CPU-heavy parsing, sync drivers).
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` wait
+    behind them; further callers are back-pressured on an asyncio semaphore
+    instead of piling up inside the executor's unbounded work queue.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="caras-blocking")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.total_wait_s = 0.0
+        self.total_run_s = 0.0
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        return self._pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        return self._slots
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        def _call():
+            started = time.perf_counter()
+            with self._lock:
+                self.total_wait_s += started - queued_at
+                self.queued -= 1
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.total_run_s += time.perf_counter() - started
+
+        async with self._get_slots():
+            try:
+                result = await loop.run_in_executor(self._pool, _call)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait_s / done * 1000, 3) if done else 0.0,
+            "avg_run_ms": round(self.total_run_s / done * 1000, 3) if done else 0.0,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class LoopLagMonitor:
+    """Periodically measures how late the event loop wakes up.
+
+    A sleep of ``interval`` that returns much later means something held the
+    loop; anything over ``threshold_ms`` is logged and counted.
+    """
+
+    def __init__(self, interval: float, threshold_ms: float):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self._task: Optional[asyncio.Task] = None
+
+        self.samples = 0
+        self.blocked = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - expected) * 1000)
+            self.samples += 1
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms > self.threshold_ms:
+                self.blocked += 1
+                logger.warning(f"Event loop blocked for {lag_ms:.1f}ms (threshold {self.threshold_ms:.0f}ms)")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "samples": self.samples,
+            "blocked": self.blocked,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+        }
+
+
+blocking_executor = BlockingExecutor(
+    max_workers=settings.BLOCKING_POOL_SIZE,
+    max_queue=settings.BLOCKING_QUEUE_LIMIT,
+)
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL,
+    threshold_ms=settings.LOOP_LAG_THRESHOLD_MS,
+)
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable on the shared bounded pool and await its result."""
+    return await blocking_executor.run(fn, *args, **kwargs)
+
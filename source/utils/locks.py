@@ -0,0 +1,135 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from loguru import logger
+from psycopg_pool import AsyncConnectionPool
+
+from .db import _conninfo
+
+
+class _Entry:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refs = 0  # holders + waiters
+
+
+class KeyedLock:
+    """Per-key mutual exclusion that only keeps entries for keys in use.
+
+    Each key's ``asyncio.Lock`` is reference counted and dropped when the
+    last holder or waiter leaves, so the registry stays as small as the
+    number of chats being processed right now. With ``distributed=True``
+    the holder also takes a PostgreSQL session advisory lock on the key,
+    serialising the same key across worker processes; the local lock
+    ensures each process has at most one connection waiting per key.
+
+    Advisory locks are held on connections from a small pool of their own
+    (``pool_size``), never the shared one: the locked section borrows shared
+    connections itself, and lock holders must not be able to exhaust them.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        distributed: bool = False,
+        acquire_timeout: Optional[float] = None,
+        pool_size: int = 10,
+    ):
+        self.namespace = namespace
+        self.distributed = distributed
+        self.acquire_timeout = acquire_timeout
+        self.pool_size = pool_size
+        self._entries: Dict[str, _Entry] = {}
+        self._pool: Optional[AsyncConnectionPool] = None
+
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        if entry.lock.locked():
+            self.contended += 1
+        entry.refs += 1
+        try:
+            async with entry.lock:
+                self.acquired += 1
+                if self.distributed:
+                    async with self._advisory(key):
+                        yield
+                else:
+                    yield
+        finally:
+            entry.refs -= 1
+            if entry.refs == 0 and self._entries.get(key) is entry:
+                del self._entries[key]
+
+    async def _lock_pool(self) -> AsyncConnectionPool:
+        if self._pool is None:
+            self._pool = AsyncConnectionPool(
+                conninfo=_conninfo(),
+                min_size=1,
+                max_size=self.pool_size,
+                timeout=self.acquire_timeout or 30.0,
+                check=AsyncConnectionPool.check_connection,
+                name=f"{self.namespace}-locks",
+                open=False,
+            )
+        if self._pool.closed:
+            await self._pool.open()
+            logger.info(f"[locks] {self.namespace} lock pool opened (max={self.pool_size})")
+        return self._pool
+
+    async def close(self):
+        if self._pool is not None and not self._pool.closed:
+            await self._pool.close()
+
+    @asynccontextmanager
+    async def _advisory(self, key: str) -> AsyncIterator[None]:
+        # Session-level lock: committed right away so the connection is not
+        # left idle in a transaction while the caller works.
+        pool = await self._lock_pool()
+        async with pool.connection() as conn:
+            try:
+                if self.acquire_timeout:
+                    await conn.execute(
+                        "SELECT set_config('lock_timeout', %s, true)",
+                        (f"{int(self.acquire_timeout * 1000)}ms",),
+                    )
+                await conn.execute(
+                    "SELECT pg_advisory_lock(hashtext(%s), hashtext(%s))", (self.namespace, key)
+                )
+                await conn.commit()
+            except Exception as e:
+                if getattr(e, "sqlstate", None) == "55P03":  # lock_not_available
+                    self.timeouts += 1
+                    raise TimeoutError(f"Timed out waiting for {self.namespace} lock on {key}") from e
+                raise
+            try:
+                yield
+            finally:
+                try:
+                    await conn.execute(
+                        "SELECT pg_advisory_unlock(hashtext(%s), hashtext(%s))", (self.namespace, key)
+                    )
+                except Exception as e:
+                    # A connection that may still hold the lock must not go back to the pool
+                    logger.error(f"[locks] failed to release {self.namespace} lock on {key}: {e}")
+                    await conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "namespace": self.namespace,
+            "distributed": self.distributed,
+            "keys": len(self._entries),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "timeouts": self.timeouts,
+            "lock_pool": self._pool.get_stats() if self._pool is not None and not self._pool.closed else None,
+        }
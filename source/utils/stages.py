@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+StageFn = Callable[..., Awaitable[Any]]
+
+
+class StageTimings:
+    """Running per-stage latency totals across pipeline runs."""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self.last: Dict[str, Any] = {}
+
+    def record(self, run: Dict[str, Any], ok: bool):
+        self.runs += 1
+        self.failures += not ok
+        self.last = run
+        for name, duration in list(run["stages"].items()) + [("total", run["total"])] + list(run["marks"].items()):
+            agg = self._stages.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            agg["count"] += 1
+            agg["total"] += duration
+            agg["max"] = max(agg["max"], duration)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "avg_s": {k: round(v["total"] / v["count"], 3) for k, v in self._stages.items()},
+            "max_s": {k: round(v["max"], 3) for k, v in self._stages.items()},
+            "last": self.last,
+        }
+
+
+class StageGraph:
+    """Runs named async stages, each as soon as the stages it depends on finish.
+
+    A stage function receives its dependencies' results as keyword arguments.
+    Stages must be added after their dependencies, which keeps the graph
+    acyclic. If any stage fails the rest are cancelled and the error is
+    raised from ``run``. ``mark`` records a point in time (e.g. first output
+    shown to the user) alongside the stage durations.
+    """
+
+    def __init__(self, name: str, timings: Optional[StageTimings] = None):
+        self.name = name
+        self.timings = timings
+        self._stages: Dict[str, Tuple[StageFn, Tuple[str, ...]]] = {}
+        self._durations: Dict[str, float] = {}
+        self._starts: Dict[str, float] = {}
+        self._marks: Dict[str, float] = {}
+        self._t0 = 0.0
+
+    def add(self, name: str, fn: StageFn, deps: Iterable[str] = ()):
+        deps = tuple(deps)
+        unknown = [d for d in deps if d not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages {unknown}")
+        self._stages[name] = (fn, deps)
+
+    def mark(self, label: str):
+        self._marks.setdefault(label, time.monotonic() - self._t0)
+
+    async def _run_stage(self, name: str, tasks: Dict[str, asyncio.Task]) -> Any:
+        fn, deps = self._stages[name]
+        inputs = dict(zip(deps, await asyncio.gather(*(tasks[d] for d in deps))))
+        start = time.monotonic()
+        self._starts[name] = start - self._t0
+        try:
+            return await fn(**inputs)
+        finally:
+            self._durations[name] = time.monotonic() - start
+
+    async def run(self) -> Dict[str, Any]:
+        self._t0 = time.monotonic()
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(self._run_stage(name, tasks), name=f"{self.name}:{name}")
+        ok = False
+        try:
+            await asyncio.gather(*tasks.values())
+            ok = True
+            return {name: task.result() for name, task in tasks.items()}
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self._report(ok)
+
+    def _report(self, ok: bool):
+        run = {
+            "total": round(time.monotonic() - self._t0, 3),
+            "stages": {k: round(v, 3) for k, v in self._durations.items()},
+            "started_at": {k: round(v, 3) for k, v in self._starts.items()},
+            "marks": {k: round(v, 3) for k, v in self._marks.items()},
+        }
+        if self.timings is not None:
+            self.timings.record(run, ok)
+        timeline = ", ".join(
+            f"{k} {self._durations[k]:.2f}s@{self._starts[k]:.2f}" for k in self._starts if k in self._durations
+        )
+        marks = "".join(f", {k}@{v:.2f}" for k, v in self._marks.items())
+        logger.info(f"[stages] {self.name} {'done' if ok else 'failed'} in {run['total']:.2f}s: {timeline}{marks}")
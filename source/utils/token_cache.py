@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from config import settings
+
+
+class TokenCache:
+    """In-process TTL/LRU cache of session token -> user_id.
+
+    Entries are keyed by the SHA-256 of the token (the raw token is never
+    kept) and live for ``ttl`` seconds or until the session's own
+    ``expires_at``, whichever comes first. Revocations made through this
+    process are applied immediately via ``invalidate``/``invalidate_user``;
+    revocations made elsewhere are picked up once the TTL lapses.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[str]:
+        k = self.key(token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_id, expires = entry
+            if expires <= now:
+                self._drop(k)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(k)
+            self.hits += 1
+            return user_id
+
+    def put(self, token: str, user_id: str, expires_in: Optional[float] = None):
+        """Cache ``user_id`` for ``token``; ``expires_in`` is the session's remaining lifetime in seconds."""
+        lifetime = self.ttl if expires_in is None else min(self.ttl, expires_in)
+        if lifetime <= 0:
+            return
+        k = self.key(token)
+        with self._lock:
+            if k in self._entries:
+                self._drop(k)
+            self._entries[k] = (user_id, time.monotonic() + lifetime)
+            self._by_user.setdefault(user_id, set()).add(k)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, token: str):
+        with self._lock:
+            if self._drop(self.key(token)):
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            for k in list(self._by_user.get(user_id, ())):
+                if self._drop(k):
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, k: str) -> bool:
+        entry = self._entries.pop(k, None)
+        if entry is None:
+            return False
+        keys = self._by_user.get(entry[0])
+        if keys is not None:
+            keys.discard(k)
+            if not keys:
+                del self._by_user[entry[0]]
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL,
+)